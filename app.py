@@ -1,17 +1,29 @@
-import os
 import streamlit as st
-import requests
-import json
-import re
-import uuid
-import random
 import time
-import csv
-import io
-import html  # for HTML escaping
+import uuid
+
+from quiz_engine import (
+    EXAM_TRACKS, complete_question, get_track_config, needs_details, take_from_bank, take_from_pack
+)
+from prefetch import PrefetchBuffer, replenish
+from question_bank import get_bank, BANK_LOW_WATER
+from question_pack import get_pack
+from question_pool import get_pool
+from dedup import SeenQuestions
+from history import FACETS, SessionHistory
+from mock_exam import MockExam, discard_checkpoint
+from progress_store import get_progress_store
+from numeric_questions import take_numeric
+from scheduler import ADAPTIVE, LEVELS, AdaptiveScheduler
+import metrics
+from export import csv_export, parquet_export
+from sanitize import safe_inline, rendered
 
 st.set_page_config(page_title="OpSynergy PM & Agile Exam Hub", layout="centered")
 
+# Prometheus endpoint/file, when METRICS_PORT or METRICS_FILE is set; runs once per process
+metrics.start_exporters()
+
 # ---------- Styles ----------
 st.markdown("""
 <style>
@@ -70,41 +82,12 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # ---------- Helpers ----------
-def _strip_wrapped_emphasis(s: str) -> str:
-    s = re.sub(r'_(.+?)_', r'\1', s)
-    s = re.sub(r'\*(.+?)\*', r'\1', s)
-    return s
-
-def _break_inline_emphasis(s: str) -> str:
-    s = re.sub(r'(?<=\w)_(?=\w)', ' ', s)
-    s = re.sub(r'(?<=\w)\*(?=\w)', ' ', s)
-    return s
-
-def safe_inline(text: str) -> str:
-    s = str(text)
-    s = _strip_wrapped_emphasis(s)
-    s = _break_inline_emphasis(s)
-    s = html.escape(s, quote=False)
-    s = s.replace('$', '&#36;')
-    return s
-
-def safe_plain(text: str) -> str:
-    s = str(text)
-    s = _strip_wrapped_emphasis(s)
-    s = _break_inline_emphasis(s)
-    s = s.replace('$', '$\u200B')
-    return s
-
-def sanitize_explanation(raw_text: str) -> str:
-    if not isinstance(raw_text, str):
-        raw_text = str(raw_text)
-    txt = re.sub(r'(?i)\bthe\s+correct\s+answer\s+is\s+[A-D]\b[:.\s-]*', '', txt := raw_text)
-    txt = re.sub(r'(?i)\b(answer|option)\s+[A-D]\s+(is|was)\s+correct[:.\s-]*', '', txt)
-    txt = re.sub(r'\s+', ' ', txt).strip()
-    return txt
-
 # Stable query param helpers
 def set_view(view: str):
+    if view == "review":
+        # Answers from the last moments may still be queued: have the writer commit them now rather
+        # than at the end of its interval, without holding up the click
+        get_progress_store().flush(timeout=0)
     st.query_params["view"] = view
     st.rerun()
 
@@ -115,20 +98,36 @@ def get_view() -> str:
     return val or "quiz"
 
 def reset_session():
+    # A mock exam left running stops building, and its checkpoint goes, so the new session can't resume it
+    if "mock_exam" in st.session_state:
+        if st.session_state.mock_exam is not None:
+            st.session_state.mock_exam.discard()
+        exam_id = st.query_params.pop("exam", None)
+        if exam_id:
+            discard_checkpoint(exam_id)
     keys_defaults = {
         "question_data": None,
         "show_result": False,
         "score": 0,
         "total": 0,
         "question_start": None,
-        "history": [],
+        "history": SessionHistory(),
+        "seen_ids": SeenQuestions(),
         "generate_request": False,
+        "awaiting_question": False,
+        "generation_error": None,
+        "review_page": 1,
+        "scheduler": AdaptiveScheduler(),
+        "adaptive_pick": None,
+        "mock_exam": None,
     }
     for k, v in keys_defaults.items():
         st.session_state[k] = v
     # Do not pre-select any exam or answer
     st.session_state.pop("exam_track", None)
     st.session_state.pop("selected_answer", None)
+    for facet in FACETS:
+        st.session_state.pop(f"review_{facet}", None)
 
 # ---------- Banner ----------
 # ---------- Banner ----------
@@ -156,269 +155,439 @@ ss = st.session_state
 if "question_data" not in ss:
     reset_session()
 
-# ---------- LLM plumbing ----------
-def shuffle_answers(data: dict) -> dict:
-    choices = data.get("choices", {}) or {}
-    correct_letter = data.get("correct")
-    rationales = data.get("rationales", {}) or {}
-
-    original_items = list(choices.items())
-    random.shuffle(original_items)
-
-    new_labels = ["A", "B", "C", "D"]
-    new_choices, new_rationales = {}, {}
-    new_correct_letter = "A"
-
-    for i, (old_label, text) in enumerate(original_items):
-        nl = new_labels[i]
-        new_choices[nl] = text
-        new_rationales[nl] = rationales.get(old_label, "")
-        if old_label == correct_letter:
-            new_correct_letter = nl
-
-    data["choices"] = new_choices
-    data["rationales"] = new_rationales
-    data["correct"] = new_correct_letter
-    return data
-
-def _post_groq(body):
-    url = "https://api.groq.com/openai/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {os.getenv('GROQ_API_KEY')}",
-        "Content-Type": "application/json"
-    }
-    resp = requests.post(url, headers=headers, json=body, timeout=60)
-    if resp.status_code != 200:
-        raise RuntimeError(f"{resp.status_code} {resp.reason} | {resp.text}")
-    return resp.json()["choices"][0]["message"]["content"]
-
-def call_groq(prompt):
-    preferred = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
-    fallbacks = ["llama-3.1-8b-instant"]
-    try:
-        body = {"model": preferred, "messages": [{"role": "user", "content": prompt}], "temperature": 0.9}
-        return _post_groq(body)
-    except Exception as e_primary:
-        last_err = e_primary
-        for fb in fallbacks:
-            try:
-                body = {"model": fb, "messages": [{"role": "user", "content": prompt}], "temperature": 0.9}
-                return _post_groq(body)
-            except Exception as e_fb:
-                last_err = e_fb
-        raise last_err
-
-def difficulty_instructions(level: str) -> str:
-    if level == "Easy":
-        return ("Prefer foundational knowledge, definitions, and straightforward scenarios. "
-                "Avoid deep ambiguity. One clearly best answer.")
-    if level == "Hard":
-        return ("Use complex, realistic scenarios with competing constraints and multiple plausible options. "
-                "Require judgment to select the best right answer. Distractors must be strong.")
-    return ("Use situational questions with moderate complexity that test application of concepts, "
-            "stakeholder analysis, sequencing, and change control without excess ambiguity.")
-
-# ---------- Exam configs ----------
-EXAM_TRACKS = {
-    "PMP": {
-        "display": "PMP",
-        "topic_label": "Topic",
-        "topic_placeholder": "Type a PMP topic (or leave blank for random)",
-        "default_categories": [
-            "Project Integration Management",
-            "Project Scope Management",
-            "Project Schedule Management",
-            "Critical Path analysis",
-            "Project Cost Management",
-            "Earned Value Management",
-            "Project Quality Management",
-            "Project Resource Management",
-            "Project Communications Management",
-            "Project Risk Management",
-            "Project Procurement Management",
-            "Project Stakeholder Management",
-            "Agile and Hybrid approaches",
-            "Change control",
-            "Leadership and team development",
-            "Conflict resolution",
-            "Governance and compliance"
-        ],
-        "prompt_variants": [
-            "Generate a PMP exam-style scenario question from the domain: {selected}.",
-            "Write a realistic PMP scenario-based question focused on: {selected}.",
-            "Create a unique PMP exam question related to: {selected}."
-        ],
-        "scope_rule": "The scenario must align ONLY with PMP content and the selected domain."
-    },
-    "CAPM": {
-        "display": "CAPM",
-        "topic_label": "Topic",
-        "topic_placeholder": "Type a CAPM topic (or leave blank for random)",
-        "default_categories": [
-            "Project Integration Management fundamentals",
-            "Project Scope Management fundamentals",
-            "Project Schedule Management fundamentals",
-            "Project Cost Management fundamentals",
-            "Project Quality Management fundamentals",
-            "Project Resource Management fundamentals",
-            "Project Communications Management fundamentals",
-            "Project Risk Management fundamentals",
-            "Project Procurement Management fundamentals",
-            "Project Stakeholder Management fundamentals",
-            "Work Breakdown Structure concepts",
-            "Requirements and scope baseline",
-            "Schedule basics and sequencing",
-            "Cost baseline and budgeting basics",
-            "Quality assurance versus quality control",
-            "Risk register basics and responses",
-            "Change control fundamentals",
-            "Issue management fundamentals",
-            "Basic governance and roles",
-            "Agile and Hybrid fundamentals"
-        ],
-        "prompt_variants": [
-            "Generate a CAPM exam-style question focused on: {selected}.",
-            "Write a CAPM knowledge check question about: {selected}.",
-            "Create a CAPM practice question related to: {selected}."
-        ],
-        "scope_rule": "The question must align ONLY with CAPM-level concepts and the selected topic."
-    },
-    "DASM": {
-        "display": "DASM",
-        "topic_label": "Focus Area",
-        "topic_placeholder": "Type a Scrum or Disciplined Agile focus area (or leave blank for random)",
-        "default_categories": [
-            "Scrum roles, events, and artifacts",
-            "Sprint Planning, Daily Scrum, Sprint Review, Sprint Retrospective",
-            "Backlog refinement and prioritization",
-            "Definition of Done and acceptance criteria",
-            "Servant leadership behaviors",
-            "Facilitation and coaching techniques",
-            "Impediment removal and escalation",
-            "Team norms and working agreements",
-            "Agile estimation such as story points and relative sizing",
-            "Flow concepts and limiting work in progress",
-            "Disciplined Agile mindset and principles",
-            "Choosing and tailoring an approach based on context",
-            "Agile metrics such as velocity and cycle time",
-            "Conflict resolution in Agile teams"
-        ],
-        "prompt_variants": [
-            "Generate a Scrum and Disciplined Agile question focused on: {selected}.",
-            "Write a scenario-based question for a Scrum Master candidate about: {selected}.",
-            "Create a knowledge check question aligned to Scrum and Disciplined Agile on: {selected}."
-        ],
-        "scope_rule": "The scenario must align ONLY with Scrum and Disciplined Agile content and the selected focus area."
-    },
-    "PMI-ACP": {
-        "display": "PMI-ACP",
-        "topic_label": "Domain",
-        "topic_placeholder": "Type a PMI-ACP domain or technique (or leave blank for random)",
-        "default_categories": [
-            "Agile principles and mindset",
-            "Value-driven delivery",
-            "Stakeholder engagement in Agile",
-            "Adaptive planning",
-            "Problem detection and resolution",
-            "Continuous improvement",
-            "Agile project estimation",
-            "Risk management in Agile environments",
-            "Team performance and collaboration",
-            "Agile coaching and facilitation",
-            "Scaling Agile considerations",
-            "Hybrid delivery considerations",
-            "Agile metrics and information radiators"
-        ],
-        "prompt_variants": [
-            "Generate a PMI-ACP style scenario question focused on: {selected}.",
-            "Write a realistic Agile scenario question aligned to PMI-ACP on: {selected}.",
-            "Create a PMI-ACP exam-style question related to: {selected}."
-        ],
-        "scope_rule": "The scenario must align ONLY with PMI-ACP and Agile practices relevant to the selected domain."
-    }
-}
-
-def get_track_config(track_key: str) -> dict:
-    return EXAM_TRACKS.get(track_key, EXAM_TRACKS["PMP"])
-
-# ---------- Prompt generation ----------
-def generate_prompt(track_key: str, topic: str, level: str) -> str:
-    cfg = get_track_config(track_key)
-    random_id = str(uuid.uuid4())
-
-    categories = cfg["default_categories"]
-    selected = topic.strip() if topic and topic.strip() else random.choice(categories)
-    topic_prompt = random.choice(cfg["prompt_variants"]).format(selected=selected)
-
-    return f"""
-Before generating the question, avoid repetitive structures such as 'You are a project manager and you have a problem.'
-Vary scenario type, tone, setting, and narrative style.
-
-Exam track: {cfg["display"]}
-{topic_prompt}
-Difficulty guidance: {difficulty_instructions(level)}
-
-Return ONLY valid JSON in this schema:
-{{
-  "question": "Your question here",
-  "choices": {{
-    "A": "Option A",
-    "B": "Option B",
-    "C": "Option C",
-    "D": "Option D"
-  }},
-  "correct": "B",
-  "explanation": "Reasoning only. Do not mention which option is correct.",
-  "rationales": {{
-    "A": "Reason for A.",
-    "B": "Reason for B.",
-    "C": "Reason for C.",
-    "D": "Reason for D."
-  }}
-}}
-
-Rules:
-- 'correct' must be A, B, C, or D.
-- Explanation must NOT refer to the correct letter.
-- {cfg["scope_rule"]}
-- The scenario must align ONLY with the selected domain or focus area: {selected}.
-- Make the structure different from previous typical exam questions.
-
-Session: {random_id}
-"""
-
-def parse_question(raw_text):
-    text = re.sub(r"```(?:json)?|```", "", raw_text).strip()
-    m = re.search(r"\{.*\}", text, re.DOTALL)
-    if not m:
-        raise ValueError("Failed to extract JSON")
-    data = json.loads(m.group())
-    data.setdefault("rationales", {"A": "", "B": "", "C": "", "D": ""})
-    return shuffle_answers(data)
+# Map the prebuilt question pack, if there is one, once per server process
+get_pack()
+
+def get_prefetch_buffer() -> PrefetchBuffer:
+    if "prefetch" not in ss:
+        ss.prefetch = PrefetchBuffer()
+    return ss.prefetch
+
+def running_low(selected_exam: str, category: str, difficulty: str) -> bool:
+    """True when neither the question pack nor the bank has BANK_LOW_WATER unseen questions left for a selection."""
+    pack = get_pack()
+    # A lower bound on the pack's unseen questions, without matching seen ids against it
+    if pack is not None and pack.count(selected_exam, category, difficulty) - len(ss.seen_ids) >= BANK_LOW_WATER:
+        return False
+    return get_bank().count_unseen(selected_exam, category, difficulty, ss.seen_ids.ids) < BANK_LOW_WATER
+
+# ---------- Progress ----------
+def get_learner() -> str:
+    """Anonymous id for this learner's stored progress, kept in the URL so a bookmark brings it back."""
+    learner = st.query_params.get("learner")
+    if not learner:
+        learner = st.query_params["learner"] = uuid.uuid4().hex[:12]
+    return learner
+
+def record_answer(entry: dict):
+    ss.history.append(entry)
+    # Queued for the progress store's writer thread; nothing here waits on disk
+    get_progress_store().record(get_learner(), entry)
+
+def progress_dashboard(learner: str):
+    store = get_progress_store()
+    overall = store.summary(learner)
+    if not overall["answered"]:
+        return
+    st.markdown("#### All-time progress")
+    st.markdown(
+        f"- Questions answered: {overall['answered']}  •  Accuracy: {overall['accuracy']}%"
+        + (f"  •  Average response time: {overall['avg_time']} seconds" if overall["avg_time"] is not None else "")
+    )
+    weak = store.weak_areas(learner)
+    if weak:
+        st.markdown(
+            "- Weak areas: " + ", ".join(f"{safe_inline(t['topic'])} ({t['accuracy']}%)" for t in weak),
+            unsafe_allow_html=True
+        )
+    st.dataframe(
+        store.accuracy_by_topic(learner),
+        column_config={
+            "topic": "Topic", "answered": "Answered", "correct": "Correct",
+            "accuracy": st.column_config.NumberColumn("Accuracy", format="%.1f%%"),
+            "avg_time": st.column_config.NumberColumn("Avg. time", format="%.1f s"),
+        },
+        hide_index=True
+    )
+
+# ---------- Adaptive selection ----------
+def resolve_selection(selected_exam: str, topic: str, difficulty: str) -> tuple:
+    """(topic, difficulty) to generate for, with the blank/Adaptive parts chosen by the session's scheduler."""
+    if topic.strip() and difficulty != ADAPTIVE:
+        return topic, difficulty
+    asked = (selected_exam, topic.strip(), difficulty)
+    pick = ss.get("adaptive_pick")
+    # Re-plan only for a new question or changed controls, so polling keeps one selection
+    if pick is None or pick[0] != asked or ss.get("generate_request"):
+        category, level = ss.scheduler.next_pick(selected_exam, topic, None if difficulty == ADAPTIVE else difficulty)
+        pick = ss.adaptive_pick = (asked, category, level)
+    return pick[1], pick[2]
+
+def keep_pick(selected_exam: str, topic: str, difficulty: str, qd: dict, level: str):
+    """Make a buffered question's own category and level the current pick, so it is shown and scored as what it is."""
+    if topic.strip() and difficulty != ADAPTIVE:
+        return
+    ss.adaptive_pick = ((selected_exam, topic.strip(), difficulty), qd.get("category") or topic.strip(), level)
+
+def upcoming_pick(selected_exam: str, topic: str, difficulty: str) -> tuple:
+    """(topic, difficulty) the next question will be generated for: the scheduler's pre-sampled next pick."""
+    if topic.strip() and difficulty != ADAPTIVE:
+        return topic, difficulty
+    return ss.scheduler.predict(selected_exam, topic, None if difficulty == ADAPTIVE else difficulty, k=1)[0]
+
+def prewarm(selected_exam: str, topic: str, difficulty: str):
+    """Refill the bank for the scheduler's likely next picks while the learner reads the explanation."""
+    if topic.strip() and difficulty != ADAPTIVE:
+        return
+    level = None if difficulty == ADAPTIVE else difficulty
+    for category, next_level in ss.scheduler.predict(selected_exam, topic, level):
+        if running_low(selected_exam, category, next_level):
+            replenish(selected_exam, category, next_level)
+
+# ---------- Review helpers ----------
+REVIEW_PAGE_SIZE = 10
+# History entries name the exam by its display label
+TRACK_BY_DISPLAY = {cfg["display"]: key for key, cfg in EXAM_TRACKS.items()}
+
+def _reset_review_page():
+    ss.review_page = 1
+
+def _turn_review_page(step: int):
+    ss.review_page = ss.get("review_page", 1) + step
+
+def review_filter(label: str, facet: str, history: SessionHistory):
+    counts = history.wrong_facets[facet]
+    choice = st.selectbox(
+        label, ["All"] + sorted(counts), key=f"review_{facet}",
+        format_func=lambda v: v if v == "All" else f"{v} ({counts[v]})",
+        on_change=_reset_review_page
+    )
+    return None if choice == "All" else choice
+
+def render_wrong_answer(number: int, history: SessionHistory, i: int):
+    h = history.entry(i)
+    if needs_details(h) and h.get("exam") in TRACK_BY_DISPLAY:
+        # Answered before its explanation arrived: pick it up if it has since, asking again if it failed
+        complete_question(h, TRACK_BY_DISPLAY[h["exam"]], h["difficulty"], timeout=0)
+        if not needs_details(h):
+            history.fill_details(i, h)
+    # Spilled answers come back without their HTML; only this page's entries get re-rendered
+    hr = rendered(h)
+    lis = "".join(f"<li>{L}. {hr['choices'][L]}</li>" for L in ["A", "B", "C", "D"])
+    st.markdown(
+        f"<strong class='qtext tex2jax_ignore mathjax_ignore'>{number}. {hr['question']}</strong>"
+        f"<ul>{lis}</ul>"
+        f"<div>Exam: <strong>{safe_inline(h.get('exam',''))}</strong></div>"
+        f"<div>Your answer: <strong>{safe_inline(h['chosen'])}</strong></div>"
+        f"<div>Correct answer: <strong>{safe_inline(h['correct'])}</strong></div>",
+        unsafe_allow_html=True
+    )
+
+    if needs_details(h):
+        st.caption("The explanation for this question is not available yet.")
+    else:
+        st.info(f"Explanation: {hr['explanation']}")
+
+    with st.expander("Why each incorrect option was not the best"):
+        items = []
+        for L in ["A", "B", "C", "D"]:
+            if L == h["correct"]:
+                continue
+            items.append(f"<li>{L}. {hr['rationales'].get(L, '')}</li>")
+        st.markdown(f"<ul>{''.join(items)}</ul>", unsafe_allow_html=True)
+    st.markdown("---")
+
+@st.fragment
+def review_wrong_answers(history: SessionHistory):
+    """One filtered page of wrong answers; only the entries on the page are loaded and rendered.
+
+    Filtering and paging rerun just this list, not the summary or the download buttons around it.
+    """
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        exam = review_filter("Exam", "exam", history)
+    with c2:
+        topic = review_filter("Topic", "topic", history)
+    with c3:
+        level = review_filter("Difficulty", "difficulty", history)
+
+    matching = history.wrong_matching(exam=exam, topic=topic, difficulty=level)
+    pages = max(1, -(-len(matching) // REVIEW_PAGE_SIZE))
+    page = min(max(ss.get("review_page", 1), 1), pages)
+    ss.review_page = page
+    first = (page - 1) * REVIEW_PAGE_SIZE
+
+    if not matching:
+        st.info("No incorrect answers match these filters.")
+        return
+    for offset, i in enumerate(matching[first:first + REVIEW_PAGE_SIZE]):
+        render_wrong_answer(first + offset + 1, history, i)
+
+    prev_col, info_col, next_col = st.columns([1, 2, 1])
+    with prev_col:
+        st.button("Previous", disabled=page <= 1, on_click=_turn_review_page, args=(-1,), key="review_prev")
+    with info_col:
+        st.markdown(
+            f"<div class='muted'>Page {page} of {pages} • {len(matching)} incorrect answers</div>",
+            unsafe_allow_html=True
+        )
+    with next_col:
+        st.button("Next", disabled=page >= pages, on_click=_turn_review_page, args=(1,), key="review_next")
+
+# ---------- Mock exam ----------
+def get_mock_exam():
+    """The session's exam; after a reload the checkpoint named in the URL is picked up again."""
+    exam = ss.get("mock_exam")
+    exam_id = st.query_params.get("exam")
+    if exam is None and exam_id:
+        exam = ss.mock_exam = MockExam.resume(exam_id)
+    return exam
+
+def start_mock_exam(selected_exam: str, difficulty: str):
+    # A full paper is built up front, so Adaptive runs at the middle level
+    level = difficulty if difficulty in LEVELS else "Moderate"
+    exam = ss.mock_exam = MockExam(selected_exam, level, exclude=ss.seen_ids.ids).start()
+    ss.exam_slot = None
+    st.query_params["exam"] = exam.id
+    set_view("exam")
+
+def finish_mock_exam(exam: MockExam):
+    # One wait for every explanation still on its way, not one per question
+    with st.spinner("Collecting explanations..."):
+        entries = exam.history_entries(get_track_config(exam.track_key)["display"])
+    for entry in entries:
+        ss.seen_ids.add(entry)
+        ss.scheduler.observe(exam.track_key, entry["topic"], entry["difficulty"], entry["is_correct"], entry["time_sec"])
+        record_answer(entry)
+        ss.total += 1
+        ss.score += entry["is_correct"]
+    exam.discard()
+    ss.mock_exam = None
+    st.query_params.pop("exam", None)
+    set_view("review")
+
+@st.fragment(run_every=0.5)
+def exam_pending_panel(exam: MockExam, i: int):
+    if exam.questions[i] is not None or i in exam.failed:
+        st.rerun()
+    st.markdown(
+        f"<div class='muted'>Preparing question {i + 1}... ({exam.ready} of {len(exam)} ready)</div>",
+        unsafe_allow_html=True
+    )
+    if exam.last_error:
+        st.caption(f"Building questions failed, retrying: {exam.last_error}")
+
+def _answer_exam_question(exam: MockExam, i: int):
+    # A callback runs before the panel does, so the panel draws the next question straight away
+    exam.answer(i, ss[f"exam_q_{i}"][0], round(time.time() - ss.exam_question_start, 1))
+    ss.pop(f"exam_q_{i}", None)
+
+@st.fragment
+def exam_question_panel(exam: MockExam):
+    """Progress and the current question; answering moves on without rerunning the page."""
+    i, q = exam.current()
+    position = len(exam) if exam.done else i + 1
+    st.progress(position / len(exam), text=f"Question {position} of {len(exam)} • {exam.ready} ready")
+    if exam.failed:
+        st.warning(f"{len(exam.failed)} questions could not be built and will be skipped."
+                   + (f" Last error: {exam.last_error}" if exam.last_error else ""))
+
+    if exam.done:
+        st.success("You have reached the end of the exam.")
+    elif q is None:
+        # Later questions are still being generated; the panel reruns the page once this one is in
+        exam_pending_panel(exam, i)
+    else:
+        if ss.get("exam_slot") != i:
+            ss.exam_slot = i
+            ss.exam_question_start = time.time()
+        qr = rendered(q)
+        st.markdown(
+            f"<h3 class='qtext tex2jax_ignore mathjax_ignore'>{qr['question']}</h3>",
+            unsafe_allow_html=True
+        )
+        st.markdown(
+            f"<div class='muted'>Topic: {safe_inline(q.get('category') or exam.categories[i])} "
+            f"• Difficulty: {safe_inline(exam.level)}</div>",
+            unsafe_allow_html=True
+        )
+        chosen = st.radio(
+            "Choose your answer:",
+            options=[(L, qr["labels"][L]) for L in q["choices"]],
+            format_func=lambda x: f"{x[0]}. {x[1]}",
+            index=None,
+            key=f"exam_q_{i}"
+        )
+        # No feedback until the end, as on the real exam
+        st.button("Next", disabled=chosen is None, on_click=_answer_exam_question, args=(exam, i), key="exam_next")
 
 # ---------- Safe generation pattern ----------
 def request_generation():
     ss.generate_request = True
     st.rerun()
 
-def run_generation_now(selected_exam: str, topic: str, difficulty: str):
-    try:
-        with st.spinner("Generating..."):
-            prompt = generate_prompt(selected_exam, topic, difficulty)
-            raw_output = call_groq(prompt)
-            qd = parse_question(raw_output)
+def serve_question(qd: dict, selected_exam: str, difficulty: str):
+    ss.seen_ids.add(qd)
+
+    # Top up this bucket in the background before the learner exhausts it
+    category = qd.get("category", "")
+    if running_low(selected_exam, category, difficulty):
+        replenish(selected_exam, category, difficulty)
 
-            ss.question_data = qd
-            ss.show_result = False
-            ss.question_start = time.time()
+    ss.question_data = qd
+    ss.show_result = False
+    ss.awaiting_question = False
+    ss.question_start = time.time()
 
-            # IMPORTANT: clear widget key safely (do NOT assign after widget exists)
-            ss.pop("selected_answer", None)
+    # IMPORTANT: clear widget key safely (do NOT assign after widget exists)
+    ss.pop("selected_answer", None)
+
+def run_generation_now(selected_exam: str, topic: str, difficulty: str, asked_topic: str, asked_difficulty: str):
+    try:
+        # Arithmetic topics (earned value, critical path) are mostly built locally, without the LLM;
+        # otherwise serve a prefetched question, then one another session generated recently, then one from
+        # the prebuilt pack, then one from the bank
+        buf = get_prefetch_buffer()
+        qd = take_numeric(topic, difficulty)
+        if qd is None:
+            # The buffer holds questions for the selection as asked; one for the current pick comes first
+            taken = buf.pop(selected_exam, asked_topic, asked_difficulty, ss.seen_ids, prefer=(topic, difficulty))
+            if taken is not None:
+                qd, difficulty = taken
+                keep_pick(selected_exam, asked_topic, asked_difficulty, qd, difficulty)
+        if qd is None:
+            qd = get_pool().take(selected_exam, topic, difficulty, ss.seen_ids)
+        if qd is None:
+            qd = take_from_pack(selected_exam, topic, difficulty, ss.seen_ids)
+        if qd is None:
+            qd = take_from_bank(selected_exam, topic, difficulty, ss.seen_ids)
+        if qd is None:
+            # Never block the script thread on the LLM: start the job and let
+            # pending_question_panel pick the result up on a later rerun
+            buf.request_now(selected_exam, asked_topic, asked_difficulty, pick=(topic, difficulty))
+            ss.question_data = None
+            ss.awaiting_question = True
+            return
+        serve_question(qd, selected_exam, difficulty)
 
     except Exception as e:
         st.error("Sorry, something went wrong generating the question.")
         st.caption(f"{e}")
 
+@st.fragment(run_every=0.5)
+def pending_question_panel(selected_exam: str, topic: str, difficulty: str, asked_topic: str, asked_difficulty: str):
+    buf = get_prefetch_buffer()
+    try:
+        taken = buf.poll(selected_exam, asked_topic, asked_difficulty, ss.seen_ids, pick=(topic, difficulty))
+    except Exception as e:
+        ss.awaiting_question = False
+        ss.generation_error = str(e)
+        st.rerun()
+    if taken is not None:
+        qd, level = taken
+        keep_pick(selected_exam, asked_topic, asked_difficulty, qd, level)
+        serve_question(qd, selected_exam, level)
+        st.rerun()
+
+    # Show the stem token by token while the choices and rationales are still streaming
+    stem = buf.watcher.stem if buf.watcher else ""
+    if stem:
+        st.markdown(
+            f"<h3 class='qtext tex2jax_ignore mathjax_ignore'>{safe_inline(stem)}</h3>",
+            unsafe_allow_html=True
+        )
+    st.markdown("<div class='muted'>Generating...</div>", unsafe_allow_html=True)
+
+# ---------- Question panel ----------
+@st.fragment
+def question_panel(selected_exam: str, topic: str, difficulty: str, asked_topic: str, asked_difficulty: str):
+    """The question, answer choices and result; picking an answer reruns only this panel."""
+    q = ss.question_data
+    # Sanitized once per question (see sanitize.render_question), not on every rerun
+    qr = rendered(q)
+
+    st.markdown(
+        f"<h3 class='qtext tex2jax_ignore mathjax_ignore'>{qr['question']}</h3>",
+        unsafe_allow_html=True
+    )
+
+    shown_topic = topic.strip() or "Random"
+    st.markdown(
+        f"<div class='muted'>Exam: {safe_inline(get_track_config(selected_exam)['display'])} "
+        f"• Topic: {safe_inline(shown_topic)} • Difficulty: {safe_inline(difficulty)}</div>",
+        unsafe_allow_html=True
+    )
+
+    display_options = [(L, qr["labels"][L]) for L in q["choices"]]
+    selected = st.radio(
+        "Choose your answer:",
+        options=display_options,
+        format_func=lambda x: f"{x[0]}. {x[1]}",
+        index=None,
+        key="selected_answer"
+    )
+
+    if selected and not ss.show_result:
+        ss.show_result = True
+        ss.total += 1
+        is_correct = (selected[0] == q["correct"])
+        if is_correct:
+            ss.score += 1
+
+        elapsed = round(time.time() - ss.question_start, 1) if ss.question_start else None
+        # The explanation and rationales were generated in the background while the learner read
+        # the question; wait for them here only if they are still on their way
+        if needs_details(q):
+            with st.spinner("Loading explanation..."):
+                complete_question(q, selected_exam, difficulty)
+        qr = rendered(q)
+        ss.scheduler.observe(selected_exam, q.get("category") or shown_topic, difficulty, is_correct, elapsed)
+        prewarm(selected_exam, asked_topic, asked_difficulty)
+        record_answer({
+            "id": q.get("id"),
+            "exam": get_track_config(selected_exam)["display"],
+            "question": q["question"],
+            "choices": q["choices"],
+            "correct": q["correct"],
+            "chosen": selected[0],
+            "is_correct": is_correct,
+            "explanation": q.get("explanation", ""),
+            "rationales": q.get("rationales", {}),
+            "rendered": qr,
+            "time_sec": elapsed,
+            "topic": shown_topic,
+            "difficulty": difficulty
+        })
+
+    if ss.show_result and selected:
+        if selected[0] == q["correct"]:
+            st.success("Correct.")
+        else:
+            st.error(f"Incorrect. Correct answer is {q['correct']}.")
+
+        if needs_details(q):
+            st.caption("The explanation for this question is not available right now.")
+        else:
+            st.info(f"Explanation: {qr['explanation']}")
+
+        with st.expander("Why the other options are not the best choice"):
+            correct_letter = q["correct"]
+            items = []
+            for letter in ["A", "B", "C", "D"]:
+                if letter == correct_letter:
+                    continue
+                items.append(
+                    f"<li>{letter}. {qr['choices'][letter]} — "
+                    f"{qr['rationales'].get(letter, '')}</li>"
+                )
+            st.markdown(f"<ul>{''.join(items)}</ul>", unsafe_allow_html=True)
+
+        st.markdown(f"<div>Score: {ss.score} out of {ss.total} this session</div>", unsafe_allow_html=True)
+
+        # Bottom Generate button: request then rerun (safe)
+        if st.button("Generate New Question", key="gen_bottom"):
+            request_generation()
+
 # ---------- Views ----------
 view = get_view()
 
@@ -458,15 +627,24 @@ if view == "quiz":
     with col2:
         difficulty = st.selectbox(
             "Difficulty",
-            options=["Easy", "Moderate", "Hard"],
+            options=[*LEVELS, ADAPTIVE],
             index=1,
             disabled=(not exam_selected)
         )
 
+    # A blank topic or Adaptive difficulty resolves to the scheduler's pick from here on
+    asked_topic, asked_difficulty = topic, difficulty
+    if exam_selected:
+        topic, difficulty = resolve_selection(selected_exam, topic, difficulty)
+
     # Top generate button: request then rerun (prevents widget-state conflicts)
     if st.button("Generate New Question", disabled=(not exam_selected), key="gen_top"):
         request_generation()
 
+    if exam_selected and st.button(
+            f"Start full mock exam ({cfg['exam_questions']} questions)", key="start_exam"):
+        start_mock_exam(selected_exam, asked_difficulty)
+
     if not exam_selected:
         st.info("Select an exam simulator to begin.")
     else:
@@ -478,81 +656,30 @@ if view == "quiz":
     # If a generation was requested, do it BEFORE rendering the answer widget
     if exam_selected and ss.get("generate_request"):
         ss.generate_request = False
-        run_generation_now(selected_exam, topic, difficulty)
-
-    if ss.question_data and exam_selected:
-        q = ss.question_data
-
-        st.markdown(
-            f"<h3 class='qtext tex2jax_ignore mathjax_ignore'>{safe_inline(q['question'])}</h3>",
-            unsafe_allow_html=True
-        )
-
-        shown_topic = topic.strip() or "Random"
-        st.markdown(
-            f"<div class='muted'>Exam: {safe_inline(get_track_config(selected_exam)['display'])} "
-            f"• Topic: {safe_inline(shown_topic)} • Difficulty: {safe_inline(difficulty)}</div>",
-            unsafe_allow_html=True
-        )
+        run_generation_now(selected_exam, topic, difficulty, asked_topic, asked_difficulty)
+        # A buffered question may have been generated for another pick; show it as what it is
+        topic, difficulty = resolve_selection(selected_exam, asked_topic, asked_difficulty)
 
-        display_options = [(L, safe_plain(txt)) for L, txt in q["choices"].items()]
-        selected = st.radio(
-            "Choose your answer:",
-            options=display_options,
-            format_func=lambda x: f"{x[0]}. {x[1]}",
-            index=None,
-            key="selected_answer"
-        )
+    if ss.get("generation_error"):
+        st.error("Sorry, something went wrong generating the question.")
+        st.caption(ss.generation_error)
+        ss.generation_error = None
+
+    if exam_selected and ss.get("awaiting_question"):
+        pending_question_panel(selected_exam, topic, difficulty, asked_topic, asked_difficulty)
+
+    # Keep the buffer in step with the selection as asked and top it up in the background, for the
+    # scheduler's next pick, while the user is answering or reading the explanation
+    if exam_selected:
+        buf = get_prefetch_buffer()
+        buf.select(selected_exam, asked_topic, asked_difficulty)
+        next_topic, next_difficulty = upcoming_pick(selected_exam, asked_topic, asked_difficulty)
+        # The pack and bank already cover well-stocked selections; only spend LLM calls when they run low
+        if ss.question_data and running_low(selected_exam, next_topic.strip(), next_difficulty):
+            buf.fill((next_topic, next_difficulty))
 
-        if selected and not ss.show_result:
-            ss.show_result = True
-            ss.total += 1
-            is_correct = (selected[0] == q["correct"])
-            if is_correct:
-                ss.score += 1
-
-            elapsed = round(time.time() - ss.question_start, 1) if ss.question_start else None
-            ss.history.append({
-                "exam": get_track_config(selected_exam)["display"],
-                "question": q["question"],
-                "choices": q["choices"],
-                "correct": q["correct"],
-                "chosen": selected[0],
-                "is_correct": is_correct,
-                "explanation": q.get("explanation", ""),
-                "rationales": q.get("rationales", {}),
-                "time_sec": elapsed,
-                "topic": shown_topic,
-                "difficulty": difficulty
-            })
-
-        if ss.show_result and selected:
-            if selected[0] == q["correct"]:
-                st.success("Correct.")
-            else:
-                st.error(f"Incorrect. Correct answer is {q['correct']}.")
-
-            expl = safe_inline(sanitize_explanation(q.get("explanation", "")))
-            st.info(f"Explanation: {expl}")
-
-            with st.expander("Why the other options are not the best choice"):
-                ration = q.get("rationales", {}) or {}
-                correct_letter = q["correct"]
-                items = []
-                for letter in ["A", "B", "C", "D"]:
-                    if letter == correct_letter:
-                        continue
-                    items.append(
-                        f"<li>{letter}. {safe_inline(q['choices'][letter])} — "
-                        f"{safe_inline(sanitize_explanation(ration.get(letter, '')))}</li>"
-                    )
-                st.markdown(f"<ul>{''.join(items)}</ul>", unsafe_allow_html=True)
-
-            st.markdown(f"<div>Score: {ss.score} out of {ss.total} this session</div>", unsafe_allow_html=True)
-
-            # Bottom Generate button: request then rerun (safe)
-            if st.button("Generate New Question", disabled=(not exam_selected), key="gen_bottom"):
-                request_generation()
+    if ss.question_data and exam_selected:
+        question_panel(selected_exam, topic, difficulty, asked_topic, asked_difficulty)
 
     st.markdown("---")
     colL, colR = st.columns([2, 3])
@@ -562,67 +689,57 @@ if view == "quiz":
     with colR:
         st.markdown("<div class='muted'>Tip: End session to review wrong answers and download your results.</div>", unsafe_allow_html=True)
 
+elif view == "exam":
+    exam = get_mock_exam()
+    if exam is None:
+        st.info("No mock exam in progress.")
+        if st.button("Back to Quiz"):
+            set_view("quiz")
+    else:
+        display = get_track_config(exam.track_key)["display"]
+        st.markdown(f"<div class='page-title'>{safe_inline(display)} Mock Exam</div>", unsafe_allow_html=True)
+
+        exam_question_panel(exam)
+
+        st.markdown("---")
+        if st.button("Finish Exam & Review", key="exam_finish"):
+            finish_mock_exam(exam)
+
 else:  # view == "review"
     st.markdown("<div class='page-title'>Session Summary</div>", unsafe_allow_html=True)
 
     if not ss.history:
         st.info("No questions answered yet.")
     else:
+        # Maintained as answers come in; nothing here scans the history
         total = len(ss.history)
-        correct = sum(1 for h in ss.history if h["is_correct"])
-        avg_time = round(sum((h["time_sec"] or 0) for h in ss.history) / total, 1) if total else 0.0
+        correct = ss.history.correct
+        avg_time = round(ss.history.avg_time, 1)
 
         st.markdown(f"- Questions answered: {total}")
         st.markdown(f"- Correct: {correct}  •  Accuracy: {round(100*correct/total,1)}%")
         st.markdown(f"- Average response time: {avg_time} seconds")
 
-        wrong = [h for h in ss.history if not h["is_correct"]]
-        if wrong:
+        if ss.history.wrong_indices:
             st.markdown("#### Review your incorrect answers")
-            for i, h in enumerate(wrong, start=1):
-                st.markdown(
-                    f"<strong class='qtext tex2jax_ignore mathjax_ignore'>{i}. {safe_inline(h['question'])}</strong>",
-                    unsafe_allow_html=True
-                )
-
-                lis = [f"<li>{L}. {safe_inline(h['choices'][L])}</li>" for L in ["A","B","C","D"]]
-                st.markdown(f"<ul>{''.join(lis)}</ul>", unsafe_allow_html=True)
-
-                st.markdown(f"<div>Exam: <strong>{safe_inline(h.get('exam',''))}</strong></div>", unsafe_allow_html=True)
-                st.markdown(f"<div>Your answer: <strong>{safe_inline(h['chosen'])}</strong></div>", unsafe_allow_html=True)
-                st.markdown(f"<div>Correct answer: <strong>{safe_inline(h['correct'])}</strong></div>", unsafe_allow_html=True)
-
-                st.info(f"Explanation: {safe_inline(sanitize_explanation(h['explanation']))}")
-
-                with st.expander("Why each incorrect option was not the best"):
-                    r = h.get("rationales", {}) or {}
-                    items = []
-                    for L in ["A", "B", "C", "D"]:
-                        if L == h["correct"]:
-                            continue
-                        items.append(f"<li>{L}. {safe_inline(sanitize_explanation(r.get(L, '')))}</li>")
-                    st.markdown(f"<ul>{''.join(items)}</ul>", unsafe_allow_html=True)
-                st.markdown("---")
-
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow([
-            "exam", "topic", "difficulty", "question",
-            "choice_A", "choice_B", "choice_C", "choice_D",
-            "chosen", "correct", "is_correct", "time_sec", "explanation"
-        ])
-        for h in ss.history:
-            ch = h["choices"]
-            writer.writerow([
-                h.get("exam", ""),
-                h["topic"], h["difficulty"], h["question"],
-                ch.get("A",""), ch.get("B",""), ch.get("C",""), ch.get("D",""),
-                h["chosen"], h["correct"], "TRUE" if h["is_correct"] else "FALSE",
-                h["time_sec"] if h["time_sec"] is not None else "",
-                sanitize_explanation(h["explanation"])
-            ])
-        csv_bytes = output.getvalue().encode("utf-8")
-        st.download_button("Download results (CSV)", data=csv_bytes, file_name="opsynergy_exam_session.csv", mime="text/csv")
+            review_wrong_answers(ss.history)
+
+        # Files are built only when a download is clicked, on Streamlit's download thread
+        history = ss.history
+        dl_csv, dl_parquet = st.columns(2)
+        with dl_csv:
+            st.download_button(
+                "Download results (CSV)", data=lambda: csv_export(history),
+                file_name="opsynergy_exam_session.csv", mime="text/csv"
+            )
+        with dl_parquet:
+            st.download_button(
+                "Download with rationales (Parquet)", data=lambda: parquet_export(history),
+                file_name="opsynergy_exam_session.parquet", mime="application/vnd.apache.parquet"
+            )
+
+    # Across every session this learner has had, read from the progress store's per-topic rollups
+    progress_dashboard(get_learner())
 
     st.markdown("---")
     colA, colB = st.columns(2)
@@ -0,0 +1,176 @@
+"""Load test: N concurrent learners driving the real app against the mock Groq server.
+
+Each simulated session runs app.py through Streamlit's AppTest harness: pick a track, click
+Generate (run_generation_now), poll reruns until the question renders, answer it, repeat, then
+End Session & Review. Reports time-to-question percentiles, throughput, and how many requests
+failed, alongside what the mock server injected. Run from the repository root:
+
+    python benchmarks/load_test.py --sessions 20 --questions 5 --latency lognormal:800:0.5 --malformed-rate 0.1
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_groq import add_mock_arguments, serve  # noqa: E402
+
+APP_PATH = os.path.join(ROOT, "app.py")
+
+# AppTest compiles the script on every run, and concurrent compile() calls can fail inside CPython's
+# AST builder on some 3.11 releases. Script runs are GIL-bound anyway, so they take turns; generation,
+# polling waits and think time still overlap across sessions, as they do on a real server.
+_script_lock = threading.Lock()
+
+
+def _run(widget_or_app):
+    with _script_lock:
+        return widget_or_app.run()
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.time_to_question = []
+        self.review_seconds = []
+        self.failures = 0
+        self.timeouts = 0
+        self.crashes = []
+
+    def record(self, **kw):
+        with self.lock:
+            for key, value in kw.items():
+                if isinstance(getattr(self, key), list):
+                    getattr(self, key).append(value)
+                else:
+                    setattr(self, key, getattr(self, key) + value)
+
+
+def _has_question(at) -> bool:
+    return any(r.key == "selected_answer" for r in at.radio)
+
+
+def _failed(at) -> bool:
+    return any("went wrong generating" in e.value for e in at.error)
+
+
+def run_session(args, results: Results, rng: random.Random):
+    from streamlit.testing.v1 import AppTest
+
+    at = _run(AppTest.from_file(APP_PATH, default_timeout=args.request_timeout))
+    _run(at.radio(key="exam_track").set_value(args.track))
+    for _ in range(args.questions):
+        started = time.perf_counter()
+        _run(at.button(key="gen_top").click())
+        # The app polls with a 0.5 s fragment timer; AppTest doesn't run timers, so rerun on the same cadence
+        while not _has_question(at):
+            if _failed(at):
+                results.record(failures=1)
+                break
+            if time.perf_counter() - started > args.request_timeout:
+                results.record(timeouts=1)
+                break
+            time.sleep(args.poll)
+            _run(at)
+        else:
+            results.record(time_to_question=time.perf_counter() - started)
+            time.sleep(rng.uniform(0, args.think))
+            radio = at.radio(key="selected_answer")
+            _run(radio.set_value(tuple(rng.choice(radio.options).split(". ", 1))))
+    started = time.perf_counter()
+    _run(next(b for b in at.button if b.label == "End Session & Review").click())
+    results.record(review_seconds=time.perf_counter() - started)
+
+
+def _session_thread(args, results: Results, seed: int):
+    try:
+        run_session(args, results, random.Random(seed))
+    except Exception as e:
+        results.record(crashes=repr(e))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent simulated learners")
+    parser.add_argument("--questions", type=int, default=5, help="questions each learner requests")
+    parser.add_argument("--track", default="PMP")
+    parser.add_argument("--think", type=float, default=1.0, help="max seconds a learner takes to answer")
+    parser.add_argument("--poll", type=float, default=0.5, help="rerun interval while waiting (the app's fragment timer)")
+    parser.add_argument("--request-timeout", type=float, default=60.0)
+    parser.add_argument("--rpm", default="100000", help="GROQ_RPM for the client-side limiter")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    server = serve(argparse.Namespace(host="127.0.0.1", port=0, **vars(args)))
+    host, port = server.server_address
+    bank_dir = tempfile.mkdtemp(prefix="quiz-load-")
+    # Must be set before app modules are imported: they read configuration at import time
+    os.environ.update({
+        "GROQ_BASE_URL": f"http://{host}:{port}/v1",
+        "GROQ_API_KEY": os.getenv("GROQ_API_KEY", "mock"),
+        "GROQ_RPM": args.rpm,
+        "QUESTION_BANK_PATH": os.path.join(bank_dir, "bank.sqlite3"),
+        # Simulated answers must not land in the real learners' progress
+        "PROGRESS_DB_PATH": os.path.join(bank_dir, "progress.sqlite3"),
+        # No pack: a local question pack would answer from disk and hide the generation path under test
+        "QUESTION_PACK_PATH": os.path.join(bank_dir, "none.pack"),
+    })
+
+    results = Results()
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(target=_session_thread, args=(args, results, args.seed + i), name=f"learner-{i}")
+        for i in range(args.sessions)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    with urllib.request.urlopen(f"http://{host}:{port}/v1/stats") as resp:
+        served = json.load(resp)
+    server.shutdown()
+
+    ttq = results.time_to_question
+    requested = args.sessions * args.questions
+    print(f"{args.sessions} sessions x {args.questions} questions, mock latency {args.latency}, {elapsed:.1f}s wall\n")
+    print(f"time to question   p50 {percentile(ttq, 0.50):6.3f}s  p95 {percentile(ttq, 0.95):6.3f}s  "
+          f"p99 {percentile(ttq, 0.99):6.3f}s  max {max(ttq, default=float('nan')):6.3f}s")
+    print(f"throughput         {len(ttq) / elapsed:6.2f} questions/s served")
+    print(f"review render      p50 {percentile(results.review_seconds, 0.50):6.3f}s")
+    print(f"failed requests    {results.failures}/{requested} ({results.failures / max(requested, 1):.1%}) "
+          f"shown an error, {results.timeouts} timed out")
+    print(f"mock server        {served['requests']} completions: {served['malformed']} malformed "
+          f"({served['malformed'] / max(served['requests'], 1):.1%}), {served['rate_limited']} x 429, "
+          f"{served['errors']} x 503")
+    # App modules were imported by the sessions, so their counters are in this process
+    import metrics
+    parse_failures = {dict(labels)["kind"]: int(v) for labels, v in metrics.counter_values("quiz_parse_failures_total").items()}
+    completions = sum(metrics.counter_values("quiz_groq_completions_total").values())
+    print(f"parse failures     {sum(parse_failures.values())} over {completions:.0f} completions "
+          f"({sum(parse_failures.values()) / max(completions, 1):.2f} per completion) {parse_failures or ''}")
+    from question_pool import get_pool
+    pool = get_pool()
+    print(f"question pool      {pool.hits} hits / {pool.misses} misses ({pool.hit_rate:.1%} hit rate)")
+    if results.crashes:
+        print(f"\n{len(results.crashes)} sessions crashed, first: {results.crashes[0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""Local OpenAI-compatible stand-in for the Groq chat completions API.
+
+Answers POST .../chat/completions (streamed or not) with generated exam questions after a
+sampled delay, and injects 5xx errors, 429s with retry-after, and malformed completions at
+configurable rates. GET /stats returns what it has served so far. Point the app at it with
+GROQ_BASE_URL=http://127.0.0.1:8787/v1 (any GROQ_API_KEY value is accepted).
+
+    python benchmarks/mock_groq.py --latency lognormal:900:0.5 --error-rate 0.02 --rate-limit-rate 0.05
+"""
+import re
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_WORDS = (
+    "sponsor vendor backlog sprint baseline charter stakeholder risk register scope schedule budget "
+    "contractor regulator audit release milestone dependency escalation change request variance team "
+    "retrospective forecast procurement quality defect integration onboarding workshop pilot rollout "
+    "hospital bank retailer factory startup agency council utility airline university warehouse"
+).split()
+
+
+class Latency:
+    """Delay sampler from a spec: fixed:MS, uniform:LO:HI, exp:MEAN or lognormal:MEDIAN:SIGMA (milliseconds)."""
+
+    def __init__(self, spec: str):
+        kind, *args = spec.split(":")
+        self.kind, self.args = kind, [float(a) for a in args]
+        if kind not in ("fixed", "uniform", "exp", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def sample(self, rng: random.Random) -> float:
+        a = self.args
+        if self.kind == "fixed":
+            ms = a[0]
+        elif self.kind == "uniform":
+            ms = rng.uniform(a[0], a[1])
+        elif self.kind == "exp":
+            ms = rng.expovariate(1 / a[0])
+        else:
+            ms = rng.lognormvariate(math.log(a[0]), a[1])
+        return ms / 1000
+
+
+def fake_question(rng: random.Random) -> dict:
+    scene = " ".join(rng.choice(_WORDS) for _ in range(14))
+    return {
+        "question": f"A project involving {scene} is at risk. What should the project manager do first?",
+        "choices": {L: f"Option {L}: " + " ".join(rng.choice(_WORDS) for _ in range(5)) for L in "ABCD"},
+        "correct": rng.choice("ABCD"),
+        "explanation": "Reasoning based on " + " ".join(rng.choice(_WORDS) for _ in range(8)) + ".",
+        "rationales": {L: "Because " + " ".join(rng.choice(_WORDS) for _ in range(6)) + "." for L in "ABCD"},
+    }
+
+
+def malformed(text: str, rng: random.Random) -> str:
+    kind = rng.choice(("truncated", "prose", "no_key"))
+    if kind == "truncated":
+        return text[:rng.randrange(10, max(11, len(text) // 2))]
+    if kind == "prose":
+        return "I'm sorry, I can't produce that question right now."
+    return re.sub(r'"correct":\s*"[A-D]",?', "", text)
+
+
+class MockState:
+    def __init__(self, args):
+        self.args = args
+        self.latency = Latency(args.latency)
+        self.rng = random.Random(args.seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "ok": 0, "errors": 0, "rate_limited": 0, "malformed": 0, "streamed": 0}
+
+    def draw(self):
+        """Pick this request's outcome and delay under the lock so runs are reproducible per seed."""
+        with self.lock:
+            self.stats["requests"] += 1
+            roll = self.rng.random()
+            delay = self.latency.sample(self.rng)
+            a = self.args
+            if roll < a.rate_limit_rate:
+                outcome = "rate_limited"
+            elif roll < a.rate_limit_rate + a.error_rate:
+                outcome = "errors"
+            elif self.rng.random() < a.malformed_rate:
+                outcome = "malformed"
+            else:
+                outcome = "ok"
+            self.stats[outcome] += 1
+            return outcome, delay, random.Random(self.rng.random())
+
+    def bump(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+
+def make_handler(state: MockState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, payload: dict, headers=()):
+            raw = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            for k, v in headers:
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/stats"):
+                with state.lock:
+                    self._send(200, dict(state.stats))
+            else:
+                self._send(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send(404, {"error": {"message": "not found"}})
+                return
+            outcome, delay, rng = state.draw()
+            if outcome == "rate_limited":
+                time.sleep(min(delay, 0.05))
+                self._send(429, {"error": {"message": "Rate limit reached"}},
+                           [("retry-after", f"{state.args.retry_after:g}")])
+                return
+            if outcome == "errors":
+                time.sleep(delay)
+                self._send(503, {"error": {"message": "Service unavailable"}})
+                return
+
+            prompt = body.get("messages", [{}])[-1].get("content", "")
+            m = re.search(r"Write (\d+) separate", prompt)
+            if m:
+                text = json.dumps([fake_question(rng) for _ in range(int(m.group(1)))])
+            else:
+                text = json.dumps(fake_question(rng))
+            if outcome == "malformed":
+                text = malformed(text, rng)
+
+            if body.get("stream"):
+                state.bump("streamed")
+                self._stream(text, delay, body.get("model", ""))
+            else:
+                time.sleep(delay)
+                self._send(200, {
+                    "id": "mock", "object": "chat.completion", "model": body.get("model", ""),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                                 "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4},
+                })
+
+        def _stream(self, text: str, delay: float, model: str):
+            # Time to first byte takes the configured share of the delay; the rest is spread over the chunks
+            ttfb = delay * state.args.ttfb_share
+            pieces = [text[i:i + 24] for i in range(0, len(text), 24)] or [""]
+            gap = (delay - ttfb) / len(pieces)
+            time.sleep(ttfb)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for piece in pieces:
+                event = {"id": "mock", "model": model, "choices": [{"index": 0, "delta": {"content": piece}}]}
+                self._chunk(f"data: {json.dumps(event)}\n\n".encode())
+                time.sleep(gap)
+            self._chunk(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _chunk(self, data: bytes):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+def serve(args) -> ThreadingHTTPServer:
+    """Start the server on a daemon thread and return it; args.port 0 picks a free port."""
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(MockState(args)))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="mock-groq").start()
+    return server
+
+
+def add_mock_arguments(parser: argparse.ArgumentParser):
+    """Server behaviour options, shared with the load test (which starts its own server)."""
+    parser.add_argument("--latency", default="lognormal:800:0.5",
+                        help="fixed:MS, uniform:LO:HI, exp:MEAN or lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--ttfb-share", type=float, default=0.3, help="share of the delay before the first streamed byte")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="retry-after seconds sent with a 429")
+    parser.add_argument("--malformed-rate", type=float, default=0.0,
+                        help="share of successful completions that are truncated, prose, or missing the answer key")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+    server = serve(args)
+    host, port = server.server_address
+    print(f"Mock Groq API on http://{host}:{port}/v1  (GROQ_BASE_URL=http://{host}:{port}/v1)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
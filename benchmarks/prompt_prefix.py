@@ -0,0 +1,146 @@
+"""Prompt layout benchmark: single user prompt vs. cached system prefix + short user turn.
+
+Offline (default) it compares prompt size, how much of each request repeats the previous one
+byte-for-byte from the start (what provider-side prefix caching can reuse) and assembly time.
+With --live it also sends max_tokens=1 requests to Groq and reports billed prompt tokens,
+cached prompt tokens and prefill latency. Run from the repository root:
+
+    python benchmarks/prompt_prefix.py [--calls 50] [--track PMP] [--level Moderate] [--live]
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import quiz_engine  # noqa: E402
+from groq_client import GROQ_URL, get_session  # noqa: E402
+from scheduler import LEVELS  # noqa: E402
+
+CHARS_PER_TOKEN = 4  # rough estimate for English prose; --live reports real counts
+
+
+def legacy_prompt(track_key: str, topic: str, level: str) -> list:
+    """The pre-change layout: one user message, per-call text near the top and a nonce at the end."""
+    cfg = quiz_engine.get_track_config(track_key)
+    selected = quiz_engine.pick_category(track_key, topic)
+    topic_prompt = random.choice(cfg["prompt_variants"]).format(selected=selected)
+    return [{"role": "user", "content": f"""
+Before generating the question, avoid repetitive structures such as 'You are a project manager and you have a problem.'
+Vary scenario type, tone, setting, and narrative style.
+
+Exam track: {cfg["display"]}
+{topic_prompt}
+Difficulty guidance: {quiz_engine.difficulty_instructions(level)}
+
+Return ONLY valid JSON in this schema:
+{quiz_engine.QUESTION_SCHEMA}
+
+Rules:
+- 'correct' must be A, B, C, or D.
+- Explanation must NOT refer to the correct letter.
+- {cfg["scope_rule"]}
+- The scenario must align ONLY with the selected domain or focus area: {selected}.
+- Make the structure different from previous typical exam questions.
+
+Session: {uuid.uuid4()}
+"""}]
+
+
+def _serialized(messages: list) -> str:
+    return json.dumps(messages)
+
+
+def _common_prefix(a: str, b: str) -> int:
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def offline(build, calls: int, track: str, level: str) -> dict:
+    sizes, reused, timings = [], [], []
+    previous = ""
+    for _ in range(calls):
+        started = time.perf_counter()
+        messages = build(track, "", level)
+        timings.append(time.perf_counter() - started)
+        text = _serialized(messages)
+        sizes.append(len(text))
+        reused.append(_common_prefix(previous, text) if previous else 0)
+        previous = text
+    # The first call can't hit the cache; average reuse over the calls that could
+    reusable = statistics.mean(reused[1:]) if calls > 1 else 0
+    return {
+        "chars": statistics.mean(sizes),
+        "est_tokens": statistics.mean(sizes) / CHARS_PER_TOKEN,
+        "prefix_reused": reusable / statistics.mean(sizes),
+        "est_uncached_tokens": (statistics.mean(sizes) - reusable) / CHARS_PER_TOKEN,
+        "build_us": statistics.mean(timings) * 1e6,
+    }
+
+
+def live(build, calls: int, track: str, level: str) -> dict:
+    model = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
+    headers = {"Authorization": f"Bearer {os.getenv('GROQ_API_KEY')}"}
+    prompt_tokens, cached_tokens, latencies = [], [], []
+    for _ in range(calls):
+        body = {"model": model, "messages": build(track, "", level), "max_tokens": 1, "temperature": 0}
+        started = time.perf_counter()
+        resp = get_session().post(GROQ_URL, headers=headers, json=body, timeout=(5, 60))
+        latencies.append(time.perf_counter() - started)
+        resp.raise_for_status()
+        usage = resp.json().get("usage", {})
+        prompt_tokens.append(usage.get("prompt_tokens", 0))
+        cached_tokens.append((usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0))
+    return {
+        "prompt_tokens": statistics.mean(prompt_tokens),
+        "cached_tokens": statistics.mean(cached_tokens),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000,
+    }
+
+
+def _uncached_system(track_key: str, topic: str, level: str) -> list:
+    quiz_engine.system_prompt.cache_clear()
+    return quiz_engine.generate_prompt(track_key, topic, level)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--track", choices=list(quiz_engine.EXAM_TRACKS), default="PMP")
+    # The app's default difficulty
+    parser.add_argument("--level", choices=LEVELS, default="Moderate")
+    parser.add_argument("--live", action="store_true", help="also measure against the Groq API (needs GROQ_API_KEY)")
+    args = parser.parse_args()
+
+    layouts = [
+        ("legacy single prompt", legacy_prompt),
+        ("system prefix, no template cache", _uncached_system),
+        ("system prefix + template cache", quiz_engine.generate_prompt),
+    ]
+    print(f"{args.calls} single-question prompts, {args.track} / {args.level}\n")
+    print(f"{'layout':36} {'chars':>7} {'~tokens':>8} {'prefix reused':>14} {'~uncached tok':>14} {'build us':>9}")
+    for name, build in layouts:
+        r = offline(build, args.calls, args.track, args.level)
+        print(f"{name:36} {r['chars']:7.0f} {r['est_tokens']:8.0f} {r['prefix_reused']:13.1%} "
+              f"{r['est_uncached_tokens']:14.0f} {r['build_us']:9.1f}")
+
+    if args.live:
+        if not os.getenv("GROQ_API_KEY"):
+            sys.exit("--live needs GROQ_API_KEY")
+        print(f"\n{'layout':36} {'prompt tok':>11} {'cached tok':>11} {'p50 ms':>8} {'mean ms':>8}")
+        for name, build in (layouts[0], layouts[2]):
+            r = live(build, args.calls, args.track, args.level)
+            print(f"{name:36} {r['prompt_tokens']:11.0f} {r['cached_tokens']:11.0f} {r['p50_ms']:8.0f} {r['mean_ms']:8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""Rerun cost: server-side time and bytes sent to the browser for each interaction on a live app server.
+
+Starts `streamlit run` headless against the mock Groq server and drives one session over Streamlit's
+websocket protocol the way the browser does: pick a track, then rounds of Generate and answer, then
+End Session & Review and page through the wrong answers. For each interaction it records the time from
+sending the widget change to the server's script_finished, and the bytes of the messages in between.
+Widgets inside an st.fragment are sent as fragment reruns, as the frontend does.
+
+Run from the repository root; pass an older app.py to compare before and after:
+
+    python benchmarks/rerun_cost.py --rounds 30
+    git show HEAD~1:app.py > /tmp/app_before.py && python benchmarks/rerun_cost.py --app /tmp/app_before.py
+"""
+import os
+import sys
+import time
+import random
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_groq import add_mock_arguments, serve  # noqa: E402
+
+WIDGET_TYPES = ("radio", "selectbox", "text_input", "button")
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Browser:
+    """Just enough of the Streamlit frontend to drive a session and measure each rerun."""
+
+    def __init__(self, ws, timeout: float):
+        self.ws = ws
+        self.timeout = timeout
+        self.query_string = ""
+        self.page_hash = ""
+        # widget id -> (element type, element proto, fragment id or "")
+        self.widgets = {}
+        # widget id -> WidgetState the frontend resends on every rerun
+        self.values = {}
+        # fragment id -> seconds between timed reruns (st.fragment(run_every=...))
+        self.auto_rerun = {}
+
+    def _element(self, delta, fragment_id: str):
+        if delta.WhichOneof("type") != "new_element":
+            return
+        kind = delta.new_element.WhichOneof("type")
+        if kind in WIDGET_TYPES:
+            el = getattr(delta.new_element, kind)
+            self.widgets[el.id] = (kind, el, fragment_id)
+
+    async def rerun(self, fragment_id: str = "", trigger: str = None) -> tuple:
+        """(seconds, bytes, messages) until the run (and any st.rerun it requested) has finished."""
+        msg = BackMsg()
+        state = msg.rerun_script
+        state.query_string = self.query_string
+        state.page_script_hash = self.page_hash
+        state.fragment_id = fragment_id
+        state.widget_states.widgets.extend(self.values.values())
+        if trigger:
+            button = state.widget_states.widgets.add()
+            button.id = trigger
+            button.trigger_value = True
+
+        started = time.perf_counter()
+        size = count = 0
+        await self.ws.send(msg.SerializeToString())
+        while True:
+            raw = await asyncio.wait_for(self.ws.recv(), self.timeout)
+            size += len(raw)
+            count += 1
+            fm = ForwardMsg()
+            fm.ParseFromString(raw)
+            kind = fm.WhichOneof("type")
+            if kind == "new_session":
+                self.page_hash = fm.new_session.page_script_hash
+                # A full run redraws everything; a fragment run only its own elements
+                scope = set(fm.new_session.fragment_ids_this_run)
+                self.widgets = {k: v for k, v in self.widgets.items() if scope and v[2] not in scope}
+                if not scope:
+                    self.auto_rerun.clear()
+            elif kind == "page_info_changed":
+                self.query_string = fm.page_info_changed.query_string
+            elif kind == "delta":
+                self._element(fm.delta, fm.delta.fragment_id)
+            elif kind == "auto_rerun":
+                self.auto_rerun[fm.auto_rerun.fragment_id] = fm.auto_rerun.interval
+            elif kind == "script_finished" and fm.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                break
+        # The frontend forgets the state of widgets that are no longer on the page
+        self.values = {k: v for k, v in self.values.items() if k in self.widgets}
+        return time.perf_counter() - started, size, count
+
+    def find(self, key: str = None, label: str = None, kind: str = None):
+        for wid, (k, el, fragment_id) in self.widgets.items():
+            if (key and wid.endswith(f"-{key}")) or (label and el.label == label) or (kind and k == kind):
+                return wid, k, el, fragment_id
+        return None
+
+    async def set(self, key: str = None, value: str = None, label: str = None, kind: str = None) -> tuple:
+        wid, kind, el, fragment_id = self.find(key, label, kind)
+        if kind == "button":
+            return await self.rerun(fragment_id, trigger=wid)
+        state = self.values.setdefault(wid, WidgetState(id=wid))
+        state.string_value = value
+        return await self.rerun(fragment_id)
+
+
+async def drive(url: str, args, samples: dict):
+    rng = random.Random(args.seed)
+    async with websockets.connect(url, subprotocols=["streamlit"], max_size=None) as ws:
+        b = Browser(ws, args.request_timeout)
+        samples["first load"].append(await b.rerun())
+        _, _, tracks, _ = b.find("exam_track")
+        samples["pick exam"].append(await b.set("exam_track", next(o for o in tracks.options if args.track in o)))
+        if args.topic:
+            await b.set(kind="text_input", value=args.topic)
+        for r in range(args.rounds):
+            await b.set("gen_top" if r == 0 or not b.find("gen_bottom") else "gen_bottom")
+            waited = time.perf_counter()
+            while not b.find("selected_answer"):
+                if time.perf_counter() - waited > args.request_timeout:
+                    raise TimeoutError("No question arrived")
+                # Poll the way the browser does: rerun the timed fragment on its interval
+                fragment_id, interval = next(iter(b.auto_rerun.items()), ("", 0.5))
+                await asyncio.sleep(interval)
+                await b.rerun(fragment_id)
+            _, _, radio, _ = b.find("selected_answer")
+            samples["answer"].append(await b.set("selected_answer", rng.choice(list(radio.options))))
+        samples["open review"].append(await b.set(None, label="End Session & Review"))
+        for step in range(args.pages):
+            key = "review_next" if step % 2 == 0 else "review_prev"
+            if not b.find(key) or b.find(key)[2].disabled:
+                break
+            samples["review page"].append(await b.set(key))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", default=os.path.join(ROOT, "app.py"), help="app script to serve")
+    parser.add_argument("--rounds", type=int, default=30, help="questions generated and answered")
+    parser.add_argument("--pages", type=int, default=10, help="review page turns (next/previous alternately)")
+    parser.add_argument("--track", default="PMP", help="exam simulator (substring of its label)")
+    parser.add_argument("--topic", default="Earned Value Management",
+                        help="topic to study; the default is served locally so each round waits on no completion")
+    parser.add_argument("--request-timeout", type=float, default=60.0)
+    add_mock_arguments(parser)
+    parser.set_defaults(latency="fixed:100")
+    args = parser.parse_args()
+
+    mock = serve(argparse.Namespace(host="127.0.0.1", port=0, **vars(args)))
+    mock_host, mock_port = mock.server_address
+    port = _free_port()
+    data_dir = tempfile.mkdtemp(prefix="quiz-rerun-")
+    env = dict(
+        os.environ,
+        GROQ_BASE_URL=f"http://{mock_host}:{mock_port}/v1",
+        GROQ_API_KEY=os.getenv("GROQ_API_KEY", "mock"),
+        # Nothing read from or written to the real bank, progress or pack, so runs compare like for like
+        QUESTION_BANK_PATH=os.path.join(data_dir, "bank.sqlite3"),
+        PROGRESS_DB_PATH=os.path.join(data_dir, "progress.sqlite3"),
+        QUESTION_PACK_PATH=os.path.join(data_dir, "none.pack"),
+        # An --app outside the repository still imports the repository's modules
+        PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.getenv("PYTHONPATH")])),
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", os.path.abspath(args.app), "--server.headless", "true",
+         "--server.port", str(port), "--browser.gatherUsageStats", "false"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    samples = {name: [] for name in ("first load", "pick exam", "answer", "open review", "review page")}
+    try:
+        deadline = time.time() + 30
+        while True:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1).read()
+                break
+            except OSError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.2)
+        asyncio.run(drive(f"ws://127.0.0.1:{port}/_stcore/stream", args, samples))
+    finally:
+        server.terminate()
+        server.wait()
+        mock.shutdown()
+
+    print(f"{args.app}: {args.rounds} questions, mock latency {args.latency}\n")
+    print(f"{'interaction':<14}{'runs':>5}  {'time p50':>9}  {'time p95':>9}  {'bytes p50':>10}  {'msgs p50':>8}")
+    for name, runs in samples.items():
+        if not runs:
+            continue
+        seconds, sizes, counts = zip(*runs)
+        print(f"{name:<14}{len(runs):>5}  {percentile(seconds, 0.5) * 1000:7.1f}ms  "
+              f"{percentile(seconds, 0.95) * 1000:7.1f}ms  {percentile(sizes, 0.5):>10,}  {percentile(counts, 0.5):>8}")
+
+
+if __name__ == "__main__":
+    main()
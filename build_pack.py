@@ -0,0 +1,180 @@
+"""Build a question pack offline: vetted questions for every track, category and difficulty.
+
+Each (track, category, difficulty) cell is one job on a process pool. A job asks for questions in
+batches, validates every item with parse_question, keeps only those with an explanation and a
+rationale for every distractor, and drops near-duplicates of the cell's earlier questions. Accepted
+questions are appended to a per-cell file in the work directory as they arrive, so rerunning the same
+command resumes where an interrupted build stopped. Finally every cell in the work directory is
+written to one pack file (see question_pack.py), which the app memory-maps at startup.
+
+    python build_pack.py --per-cell 40 --workers 8 --rpm 240
+    python build_pack.py --pack-only
+"""
+import os
+import sys
+import json
+import signal
+import hashlib
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from dedup import SimilarityIndex
+from groq_client import call_groq
+from question_bank import question_id
+from question_pack import QUESTION_PACK_PATH, QuestionPack, write_pack
+from question_parser import iter_json_objects
+from quiz_engine import EXAM_TRACKS, generate_batch_prompt, needs_details, parse_question
+from scheduler import LEVELS
+
+# Completions per cell, as a multiple of the batches the cell needs, before giving up on it
+MAX_ATTEMPTS_FACTOR = 3
+
+
+def track_categories(track_key: str) -> list:
+    """Default categories, then any exam-blueprint categories not already among them."""
+    cfg = EXAM_TRACKS[track_key]
+    categories = list(cfg["default_categories"])
+    for _, _, domain_categories in cfg.get("exam_domains") or ():
+        categories.extend(c for c in domain_categories if c not in categories)
+    return categories
+
+
+def cell_path(work_dir: str, track: str, category: str, level: str) -> str:
+    digest = hashlib.sha1(f"{track}\0{category.lower()}\0{level}".encode("utf-8")).hexdigest()[:16]
+    return os.path.join(work_dir, f"{digest}.jsonl")
+
+
+def read_cell(path: str) -> list:
+    """Questions already accepted for a cell; a line cut off by an interrupted build is dropped."""
+    questions = []
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    questions.append(json.loads(line))
+                except ValueError:
+                    pass
+    except OSError:
+        pass
+    return questions
+
+
+def vetted(qd: dict) -> bool:
+    return not needs_details(qd) and all(
+        qd["rationales"].get(letter) for letter in qd["choices"] if letter != qd["correct"]
+    )
+
+
+def build_cell(work_dir: str, track: str, category: str, level: str, target: int, batch: int) -> dict:
+    path = cell_path(work_dir, track, category, level)
+    questions = read_cell(path)
+    index = SimilarityIndex()
+    for qd in questions:
+        index.add(qd["id"], qd["question"])
+    # Rewrite the good lines so appends never follow a partial one
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(qd) + "\n" for qd in questions)
+    os.replace(f"{path}.tmp", path)
+
+    stats = {"rejected": 0, "duplicates": 0, "failed_calls": 0}
+    max_attempts = MAX_ATTEMPTS_FACTOR * -(-max(target - len(questions), 0) // batch)
+    with open(path, "a", encoding="utf-8") as out:
+        for _ in range(max_attempts):
+            if len(questions) >= target:
+                break
+            n = min(batch, target - len(questions))
+            try:
+                raw = call_groq(generate_batch_prompt(track, [category] * n, level))
+            except Exception:
+                stats["failed_calls"] += 1
+                continue
+            for obj_text in iter_json_objects([raw]):
+                try:
+                    qd = parse_question(obj_text)
+                except ValueError:
+                    stats["rejected"] += 1
+                    continue
+                if not vetted(qd):
+                    stats["rejected"] += 1
+                    continue
+                if index.find_similar(qd["question"]) is not None:
+                    stats["duplicates"] += 1
+                    continue
+                qd = dict(qd, id=question_id(qd), track=track, category=category, difficulty=level)
+                index.add(qd["id"], qd["question"])
+                questions.append(qd)
+                out.write(json.dumps(qd) + "\n")
+                out.flush()
+                if len(questions) >= target:
+                    break
+    return dict(stats, accepted=len(questions))
+
+
+def load_work_dir(work_dir: str) -> dict:
+    cells = {}
+    for name in sorted(os.listdir(work_dir)):
+        if name.endswith(".jsonl"):
+            for qd in read_cell(os.path.join(work_dir, name)):
+                cells.setdefault((qd["track"], qd["category"], qd["difficulty"]), []).append(qd)
+    return cells
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", default=QUESTION_PACK_PATH, help="pack file to write")
+    parser.add_argument("--work-dir", help="per-cell progress, kept for resuming (default: OUT.work)")
+    parser.add_argument("--per-cell", type=int, default=40, help="questions wanted per track/category/difficulty")
+    parser.add_argument("--batch", type=int, default=5, help="questions asked for per completion")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--rpm", type=float, default=float(os.getenv("GROQ_RPM", "30")),
+                        help="requests per minute for the whole build, shared by the workers")
+    parser.add_argument("--tracks", nargs="+", choices=list(EXAM_TRACKS), default=list(EXAM_TRACKS))
+    parser.add_argument("--levels", nargs="+", choices=LEVELS, default=list(LEVELS))
+    parser.add_argument("--pack-only", action="store_true", help="only pack what the work directory holds")
+    args = parser.parse_args()
+    work_dir = args.work_dir or f"{args.out}.work"
+    os.makedirs(work_dir, exist_ok=True)
+
+    if not args.pack_only:
+        cells = [(t, c, lv) for t in args.tracks for c in track_categories(t) for lv in args.levels]
+        todo = [cell for cell in cells if len(read_cell(cell_path(work_dir, *cell))) < args.per_cell]
+        print(f"{len(cells)} cells, {len(cells) - len(todo)} already complete, {len(todo)} to build")
+        # Workers are spawned fresh so they read these at import: the rate limit is per process, and
+        # packed questions must carry their explanation and rationales, so skip the two-phase split
+        os.environ["GROQ_RPM"] = str(args.rpm / args.workers)
+        os.environ["TWO_PHASE_GENERATION"] = "0"
+        # Ctrl-C is handled once, here; workers ignore it
+        pool = ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=signal.signal, initargs=(signal.SIGINT, signal.SIG_IGN))
+        jobs = {pool.submit(build_cell, work_dir, *cell, args.per_cell, args.batch): cell for cell in todo}
+        try:
+            for done, job in enumerate(as_completed(jobs), start=1):
+                track, category, level = jobs[job]
+                try:
+                    r = job.result()
+                    note = (f"{r['accepted']}/{args.per_cell} ({r['rejected']} rejected, "
+                            f"{r['duplicates']} duplicates, {r['failed_calls']} failed calls)")
+                except Exception as e:
+                    note = f"failed: {e}"
+                print(f"[{done}/{len(todo)}] {track} / {category} / {level}: {note}", flush=True)
+        except KeyboardInterrupt:
+            # Every accepted question is already on disk, so the workers can stop mid-cell
+            for worker in multiprocessing.active_children():
+                worker.terminate()
+            pool.shutdown(wait=False, cancel_futures=True)
+            sys.exit("Interrupted. Run the same command again to resume.")
+        pool.shutdown()
+
+    cells = load_work_dir(work_dir)
+    if not cells:
+        sys.exit(f"Nothing to pack in {work_dir}")
+    write_pack(args.out, cells)
+    pack = QuestionPack(args.out)
+    short = sum(len(qs) < args.per_cell for qs in cells.values())
+    print(f"Wrote {args.out}: {len(pack)} questions in {len(pack.cells)} cells "
+          f"({short} under {args.per_cell}), {os.path.getsize(args.out) / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
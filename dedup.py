@@ -0,0 +1,110 @@
+import os
+import re
+import zlib
+import random
+import threading
+
+# MinHash over word-bigram shingles of the stem, bucketed with LSH (BANDS x ROWS = NUM_PERM).
+# Candidates that share a band are confirmed against the estimated Jaccard similarity.
+NUM_PERM = 60
+BANDS, ROWS = 20, 3
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.5"))
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(1337)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def shingles(text: str) -> set:
+    words = _WORD_RE.findall(str(text).lower())
+    if len(words) < 2:
+        return set(words)
+    return {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+
+def signature(text: str) -> tuple:
+    hashes = [zlib.crc32(s.encode("utf-8")) for s in shingles(text)] or [0]
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def similarity(sig_a: tuple, sig_b: tuple) -> float:
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / NUM_PERM
+
+
+class SimilarityIndex:
+    """LSH index of question stems; lookups touch only the items sharing a band with the query."""
+
+    def __init__(self):
+        self.signatures = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def add(self, qid: str, text: str):
+        sig = signature(text)
+        with self._lock:
+            if qid in self.signatures:
+                return
+            self.signatures[qid] = sig
+            for band in range(BANDS):
+                key = (band, sig[band * ROWS:(band + 1) * ROWS])
+                self._buckets.setdefault(key, []).append(qid)
+
+    def find_similar(self, text: str, threshold: float = NEAR_DUPLICATE_THRESHOLD):
+        sig = signature(text)
+        best, best_score = None, threshold
+        with self._lock:
+            candidates = set()
+            for band in range(BANDS):
+                candidates.update(self._buckets.get((band, sig[band * ROWS:(band + 1) * ROWS]), ()))
+            for qid in candidates:
+                score = similarity(sig, self.signatures[qid])
+                if score >= best_score:
+                    best, best_score = qid, score
+        return best
+
+    def __len__(self):
+        return len(self.signatures)
+
+
+class SeenQuestions:
+    """What one learner has been served: exact ids plus a similarity index over the stems."""
+
+    def __init__(self):
+        self.ids = set()
+        self.index = SimilarityIndex()
+
+    def add(self, qd: dict):
+        qid = qd.get("id")
+        self.ids.add(qid)
+        self.index.add(qid, qd.get("question", ""))
+
+    def has(self, qd: dict) -> bool:
+        return qd.get("id") in self.ids or self.index.find_similar(qd.get("question", "")) is not None
+
+    def __contains__(self, qid) -> bool:
+        return qid in self.ids
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+# Shared per-(track, category) indexes over the bank, built lazily on first use
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_index(track_key: str, category: str, load) -> SimilarityIndex:
+    """`load()` returns (id, stem) pairs already in the bank; called once per bucket."""
+    key = (track_key, category.strip().lower())
+    with _shared_lock:
+        index = _shared.get(key)
+        if index is not None:
+            return index
+        index = _shared[key] = SimilarityIndex()
+        for qid, stem in load():
+            index.add(qid, stem)
+        return index
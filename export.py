@@ -0,0 +1,89 @@
+import io
+import csv
+
+from sanitize import sanitize_explanation
+
+LETTERS = ("A", "B", "C", "D")
+
+CSV_COLUMNS = [
+    "exam", "topic", "difficulty", "question",
+    "choice_A", "choice_B", "choice_C", "choice_D",
+    "chosen", "correct", "is_correct", "time_sec", "explanation"
+]
+
+# Rows per Parquet row group; bounds how many answers are held as Python objects at once
+PARQUET_BATCH_ROWS = 512
+
+
+def csv_export(history) -> bytes:
+    """The session as CSV.
+
+    Streamlit reads whatever a download callable returns into memory before sending it, so the
+    file is built as one buffer; spilled answers are still read back one at a time.
+    """
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(CSV_COLUMNS)
+    for h in history.entries():
+        ch = h["choices"]
+        writer.writerow([
+            h.get("exam", ""),
+            h["topic"], h["difficulty"], h["question"],
+            ch.get("A", ""), ch.get("B", ""), ch.get("C", ""), ch.get("D", ""),
+            h["chosen"], h["correct"], "TRUE" if h["is_correct"] else "FALSE",
+            h["time_sec"] if h["time_sec"] is not None else "",
+            sanitize_explanation(h["explanation"])
+        ])
+    return out.getvalue().encode("utf-8")
+
+
+def _parquet_schema():
+    import pyarrow as pa
+
+    text = pa.string()
+    # Labels repeat on every row, so dictionary-encode them
+    label = pa.dictionary(pa.int16(), pa.string())
+    return pa.schema(
+        [("exam", label), ("topic", label), ("difficulty", label), ("question", text)]
+        + [(f"choice_{L}", text) for L in LETTERS]
+        + [("chosen", text), ("correct", text), ("is_correct", pa.bool_()), ("time_sec", pa.float64()),
+           ("explanation", text)]
+        + [(f"rationale_{L}", text) for L in LETTERS]
+    )
+
+
+def _parquet_columns(entries: list) -> dict:
+    columns = {
+        "exam": [h.get("exam", "") for h in entries],
+        "topic": [h["topic"] for h in entries],
+        "difficulty": [h["difficulty"] for h in entries],
+        "question": [h["question"] for h in entries],
+        "chosen": [h["chosen"] for h in entries],
+        "correct": [h["correct"] for h in entries],
+        "is_correct": [bool(h["is_correct"]) for h in entries],
+        "time_sec": [h["time_sec"] for h in entries],
+        "explanation": [sanitize_explanation(h.get("explanation", "")) for h in entries],
+    }
+    for L in LETTERS:
+        columns[f"choice_{L}"] = [h["choices"].get(L, "") for h in entries]
+        columns[f"rationale_{L}"] = [sanitize_explanation((h.get("rationales") or {}).get(L, "")) for h in entries]
+    return columns
+
+
+def parquet_export(history) -> bytes:
+    """The session, rationales included, as a zstd-compressed Parquet file written one row group at a time."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema()
+    out = io.BytesIO()
+    with pq.ParquetWriter(out, schema, compression="zstd") as writer:
+        batch = []
+        for h in history.entries():
+            batch.append(h)
+            if len(batch) == PARQUET_BATCH_ROWS:
+                writer.write_batch(pa.RecordBatch.from_pydict(_parquet_columns(batch), schema=schema))
+                batch = []
+        if batch or not len(history):
+            writer.write_batch(pa.RecordBatch.from_pydict(_parquet_columns(batch), schema=schema))
+    return out.getvalue()
@@ -0,0 +1,550 @@
+import os
+import re
+import json
+import time
+import queue
+import random
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+import metrics
+from metrics import LatencyHistogram
+
+# Any OpenAI-compatible endpoint works, e.g. benchmarks/mock_groq.py for load tests
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1").rstrip("/")
+GROQ_URL = f"{GROQ_BASE_URL}/chat/completions"
+
+# Connection pool: one keep-alive pool per process, sized for concurrent sessions plus prefetch workers
+GROQ_POOL_SIZE = int(os.getenv("GROQ_POOL_SIZE", "16"))
+
+# Per-phase timeouts (seconds): TCP+TLS connect, wait between bytes (incl. first byte), whole body
+GROQ_CONNECT_TIMEOUT = float(os.getenv("GROQ_CONNECT_TIMEOUT", "5"))
+GROQ_READ_TIMEOUT = float(os.getenv("GROQ_READ_TIMEOUT", "30"))
+GROQ_TOTAL_TIMEOUT = float(os.getenv("GROQ_TOTAL_TIMEOUT", "60"))
+
+# Hedged dispatch: if a model hasn't answered within its latency budget, race the next model
+GROQ_HEDGE = os.getenv("GROQ_HEDGE", "1") == "1"
+GROQ_HEDGE_QUANTILE = float(os.getenv("GROQ_HEDGE_QUANTILE", "0.95"))
+# Budget (seconds) used until a model has enough samples for the quantile to mean anything
+GROQ_HEDGE_BUDGET = float(os.getenv("GROQ_HEDGE_BUDGET", "8"))
+GROQ_HEDGE_MIN_SAMPLES = 20
+
+# Client-side rate limiting (per model, as Groq's limits are) and retry policy
+GROQ_RPM = float(os.getenv("GROQ_RPM", "30"))
+GROQ_BURST = int(os.getenv("GROQ_BURST", "5"))
+GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "3"))
+GROQ_BACKOFF_BASE = float(os.getenv("GROQ_BACKOFF_BASE", "0.5"))
+GROQ_BACKOFF_CAP = float(os.getenv("GROQ_BACKOFF_CAP", "20"))
+# Rough prompt+completion size, used to decide whether x-ratelimit-remaining-tokens can cover another call
+GROQ_EST_TOKENS_PER_REQUEST = int(os.getenv("GROQ_EST_TOKENS_PER_REQUEST", "1500"))
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+
+# Racing requests run here rather than on the caller's pool so a hedge can't wait on its own worker
+_hedge_pool = ThreadPoolExecutor(max_workers=GROQ_POOL_SIZE, thread_name_prefix="groq-hedge")
+
+
+# Which session a call is made for; the limiter hands out turns round-robin across these
+current_client = contextvars.ContextVar("groq_client_id", default="default")
+# Whether a learner is waiting on the call; such calls take the limiter's next token ahead of the fair queue
+current_foreground = contextvars.ContextVar("groq_foreground", default=False)
+
+
+@contextmanager
+def client_scope(client_id: str, foreground: bool = False):
+    token = current_client.set(client_id)
+    fg_token = current_foreground.set(foreground)
+    try:
+        yield
+    finally:
+        current_foreground.reset(fg_token)
+        current_client.reset(token)
+
+
+class RequestCancelled(Exception):
+    pass
+
+
+class GroqHTTPError(RuntimeError):
+    def __init__(self, status: int, reason: str, text: str, retry_after: float = None):
+        super().__init__(f"{status} {reason} | {text}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+def _parse_duration(value) -> float:
+    """Parse Groq reset headers such as '2m59.56s', '7.66s' or '250ms' into seconds."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    units = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+    parts = re.findall(r"([\d.]+)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    return sum(float(n) * units[u] for n, u in parts)
+
+
+class RateLimiter:
+    """Token bucket with a fair queue: waiting clients are served round-robin, FIFO within a client.
+
+    Foreground calls (a learner is waiting on them) queue separately and are served, FIFO, before
+    anything in the fair queue. The refill rate adapts to the x-ratelimit-* headers, and a 429's
+    retry-after pauses the bucket.
+    """
+
+    def __init__(self, rpm: float = GROQ_RPM, burst: int = GROQ_BURST):
+        self.base_rate = rpm / 60.0
+        self.rate = self.base_rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._cond = threading.Condition()
+        self._queues = {}
+        self._order = deque()
+        self._foreground = deque()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def throttled(self) -> bool:
+        with self._cond:
+            return time.monotonic() < self.paused_until or bool(self._order) or bool(self._foreground)
+
+    def _turn(self, client: str, ticket, foreground: bool) -> bool:
+        if foreground:
+            return self._foreground[0] is ticket
+        return not self._foreground and self._order[0] == client and self._queues[client][0] is ticket
+
+    def acquire(self, client: str = "default", cancel=None, foreground: bool = False):
+        ticket = object()
+        with self._cond:
+            if foreground:
+                self._foreground.append(ticket)
+            else:
+                waiting = self._queues.setdefault(client, deque())
+                if not waiting:
+                    self._order.append(client)
+                waiting.append(ticket)
+            try:
+                while True:
+                    _check_cancel(cancel)
+                    now = time.monotonic()
+                    self._refill(now)
+                    wait = 0.5
+                    if self._turn(client, ticket, foreground):
+                        if now < self.paused_until:
+                            wait = self.paused_until - now
+                        elif self.tokens >= 1:
+                            self.tokens -= 1
+                            return
+                        else:
+                            wait = (1 - self.tokens) / self.rate
+                    self._cond.wait(min(wait, 0.5))
+            finally:
+                if foreground:
+                    self._foreground.remove(ticket)
+                else:
+                    waiting.remove(ticket)
+                    # This client's turn is over: send it to the back of the line, or drop it if idle
+                    self._order.remove(client)
+                    if waiting:
+                        self._order.append(client)
+                    else:
+                        del self._queues[client]
+                self._cond.notify_all()
+
+    def pause(self, seconds: float):
+        with self._cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            # Allow a single probe when the pause ends rather than a burst
+            self.tokens = min(self.tokens, 1.0)
+            self._cond.notify_all()
+
+    def observe(self, headers):
+        remaining = headers.get("x-ratelimit-remaining-requests")
+        reset = _parse_duration(headers.get("x-ratelimit-reset-requests"))
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        reset_tokens = _parse_duration(headers.get("x-ratelimit-reset-tokens"))
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            if remaining is not None and reset:
+                remaining = int(remaining)
+                if remaining <= 0:
+                    self.paused_until = max(self.paused_until, now + reset)
+                # Spread what is left of the window evenly instead of bursting into a 429
+                self.rate = min(self.base_rate, max(remaining, 1) / reset)
+            if remaining_tokens is not None and reset_tokens and int(remaining_tokens) < GROQ_EST_TOKENS_PER_REQUEST:
+                self.paused_until = max(self.paused_until, now + reset_tokens)
+            self._cond.notify_all()
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(model: str) -> RateLimiter:
+    with _limiters_lock:
+        if model not in _limiters:
+            _limiters[model] = RateLimiter()
+        return _limiters[model]
+
+
+def _sleep_backoff(attempt: int, cancel=None, at_least: float = None):
+    # Full jitter keeps concurrent sessions from retrying in lockstep
+    delay = random.uniform(0, min(GROQ_BACKOFF_CAP, GROQ_BACKOFF_BASE * 2 ** attempt))
+    delay = max(delay, at_least or 0.0)
+    if cancel is not None:
+        if cancel.wait(delay):
+            _check_cancel(cancel)
+    else:
+        time.sleep(delay)
+
+
+# Per-model histograms, also exported: full completions for call_groq, first token for stream_groq
+completion_latency = "quiz_groq_completion_seconds"
+first_token_latency = "quiz_groq_first_token_seconds"
+metrics.describe(completion_latency, "Send to last byte of non-streamed completions, per model.")
+metrics.describe(first_token_latency, "Send to first content token of streamed completions, per model.")
+metrics.describe("quiz_groq_completions_total", "Completions received, by model and primary/fallback role.")
+metrics.describe("quiz_groq_retries_total", "Requests retried, by model and reason (HTTP status or connection).")
+
+
+def _histogram(name: str, model: str) -> LatencyHistogram:
+    return metrics.histogram(name, model=model)
+
+
+def hedge_budget(table: str, model: str) -> float:
+    hist = _histogram(table, model)
+    if hist.count < GROQ_HEDGE_MIN_SAMPLES:
+        return GROQ_HEDGE_BUDGET
+    return hist.quantile(GROQ_HEDGE_QUANTILE)
+
+
+# Connect time (TCP + TLS) of the connection most recently opened on this thread; 0 when one was reused
+_phase = threading.local()
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        _phase.connect = time.perf_counter() - started
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        _phase.connect = time.perf_counter() - started
+
+
+class _TimedHTTPPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+def get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=GROQ_POOL_SIZE, max_retries=0)
+                adapter.poolmanager.pool_classes_by_scheme = {"http": _TimedHTTPPool, "https": _TimedHTTPSPool}
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({"Connection": "keep-alive", "Content-Type": "application/json"})
+                _session = session
+    return _session
+
+
+def _models() -> list:
+    preferred = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
+    fallbacks = ["llama-3.1-8b-instant"]
+    return [preferred] + [m for m in fallbacks if m != preferred]
+
+
+def _role(model: str) -> str:
+    return "primary" if model == _models()[0] else "fallback"
+
+
+def _chat_body(model: str, prompt) -> dict:
+    # A prompt is either one user message or a prepared message list (system prefix + user turn)
+    messages = prompt if isinstance(prompt, list) else [{"role": "user", "content": prompt}]
+    return {"model": model, "messages": messages, "temperature": 0.9}
+
+
+def _check_cancel(cancel):
+    if cancel is not None and cancel.is_set():
+        raise RequestCancelled("Request cancelled after another model answered first")
+
+
+def _read_body(resp, deadline: float, cancel=None) -> bytes:
+    chunks = []
+    for chunk in resp.iter_content(chunk_size=16384):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Groq response exceeded {GROQ_TOTAL_TIMEOUT:g}s total timeout")
+        _check_cancel(cancel)
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _open(body, cancel=None):
+    """POST through the model's rate limiter, retrying 429/5xx and connection errors with jittered backoff.
+
+    Returns (response, send_time) for a 200 response whose body has not been read yet.
+    """
+    headers = {"Authorization": f"Bearer {os.getenv('GROQ_API_KEY')}"}
+    limiter = get_limiter(body["model"])
+    for attempt in range(GROQ_MAX_RETRIES + 1):
+        limiter.acquire(current_client.get(), cancel, current_foreground.get())
+        started = time.monotonic()
+        _phase.connect = 0.0
+        try:
+            resp = get_session().post(
+                GROQ_URL, headers=headers, json=body,
+                timeout=(GROQ_CONNECT_TIMEOUT, GROQ_READ_TIMEOUT), stream=True
+            )
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == GROQ_MAX_RETRIES:
+                raise
+            metrics.inc("quiz_groq_retries_total", model=body["model"], reason="connection")
+            _sleep_backoff(attempt, cancel)
+            continue
+        # Headers are in: split the wait into connection setup and time to first byte
+        if _phase.connect:
+            metrics.observe_span("groq_connect", _phase.connect, model=body["model"])
+        metrics.observe_span("groq_ttfb", time.monotonic() - started - _phase.connect, model=body["model"])
+        limiter.observe(resp.headers)
+        if resp.status_code == 200:
+            return resp, started
+        with resp:
+            raw = _read_body(resp, started + GROQ_TOTAL_TIMEOUT, cancel)
+        err = GroqHTTPError(
+            resp.status_code, resp.reason, raw.decode("utf-8", "replace"),
+            _parse_duration(resp.headers.get("retry-after"))
+        )
+        if resp.status_code == 429:
+            limiter.pause(err.retry_after or GROQ_BACKOFF_BASE * 2 ** attempt)
+        if resp.status_code not in RETRYABLE_STATUS or attempt == GROQ_MAX_RETRIES:
+            raise err
+        metrics.inc("quiz_groq_retries_total", model=body["model"], reason=str(resp.status_code))
+        _sleep_backoff(attempt, cancel, err.retry_after)
+
+
+def _post_groq(body, cancel=None):
+    resp, started = _open(body, cancel)
+    # Always drain or close so the connection goes back to the pool
+    with resp, metrics.span("groq_body", model=body["model"]):
+        raw = _read_body(resp, started + GROQ_TOTAL_TIMEOUT, cancel)
+        content = json.loads(raw)["choices"][0]["message"]["content"]
+    _histogram(completion_latency, body["model"]).observe(time.monotonic() - started)
+    metrics.inc("quiz_groq_completions_total", model=body["model"], role=_role(body["model"]))
+    return content
+
+
+def _call_sequential(prompt, validate=None):
+    last_err = None
+    for model in _models():
+        try:
+            content = _post_groq(_chat_body(model, prompt))
+            return content if validate is None else validate(content)
+        except Exception as e:
+            last_err = e
+    raise last_err
+
+
+def _call_hedged(prompt, validate=None):
+    models = _models()
+    results = queue.SimpleQueue()
+    cancels = {}
+
+    def run(model, cancel):
+        try:
+            content = _post_groq(_chat_body(model, prompt), cancel)
+            results.put((model, content if validate is None else validate(content), None))
+        except Exception as e:
+            results.put((model, None, e))
+
+    def launch(i):
+        cancels[models[i]] = threading.Event()
+        # Copy the context so the racer is queued under the caller's client id
+        _hedge_pool.submit(contextvars.copy_context().run, run, models[i], cancels[models[i]])
+        return time.monotonic() + hedge_budget(completion_latency, models[i])
+
+    launched, outstanding, last_err = 1, 1, None
+    hedge_at = launch(0)
+    while outstanding:
+        can_hedge = launched < len(models)
+        timeout = max(0.0, hedge_at - time.monotonic()) if can_hedge else None
+        try:
+            model, content, err = results.get(timeout=timeout)
+        except queue.Empty:
+            if get_limiter(models[launched]).throttled():
+                # A hedge would only queue behind a rate limit; look again shortly
+                hedge_at = time.monotonic() + 1.0
+                continue
+            # Slowest-tail case: race the next model instead of waiting out the full timeout
+            hedge_at = launch(launched)
+            launched += 1
+            outstanding += 1
+            continue
+        outstanding -= 1
+        if err is None:
+            for other, cancel in cancels.items():
+                if other != model:
+                    cancel.set()
+            return content
+        last_err = err
+        if can_hedge and not outstanding:
+            hedge_at = launch(launched)
+            launched += 1
+            outstanding += 1
+    raise last_err
+
+
+def call_groq(prompt, validate=None):
+    """Return the completion text, or what validate(text) makes of it when given.
+
+    validate may raise to reject an unusable answer; its return value (e.g. the parsed question) is
+    passed through so the caller doesn't parse the text a second time.
+    """
+    if GROQ_HEDGE:
+        return _call_hedged(prompt, validate)
+    return _call_sequential(prompt, validate)
+
+
+def _stream_groq(body, cancel=None):
+    resp, started = _open(dict(body, stream=True), cancel)
+    deadline = started + GROQ_TOTAL_TIMEOUT
+    first_token = True
+    with resp, metrics.span("groq_body", model=body["model"]):
+        # Server-sent events: one "data: {json}" line per chunk, terminated by "data: [DONE]"
+        for line in resp.iter_lines():
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Groq response exceeded {GROQ_TOTAL_TIMEOUT:g}s total timeout")
+            _check_cancel(cancel)
+            if not line.startswith(b"data:"):
+                continue
+            data = line[5:].strip()
+            if data == b"[DONE]":
+                # Keep reading to the end of the stream so the connection can be reused
+                continue
+            delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+            if delta:
+                if first_token:
+                    _histogram(first_token_latency, body["model"]).observe(time.monotonic() - started)
+                    first_token = False
+                yield delta
+    metrics.inc("quiz_groq_completions_total", model=body["model"], role=_role(body["model"]))
+
+
+def _stream_sequential(prompt):
+    last_err = None
+    for model in _models():
+        started = False
+        try:
+            for delta in _stream_groq(_chat_body(model, prompt)):
+                started = True
+                yield delta
+            return
+        except Exception as e:
+            if started:
+                raise
+            last_err = e
+    raise last_err
+
+
+_STREAM_END = object()
+
+
+def _stream_hedged(prompt):
+    models = _models()
+    events = queue.SimpleQueue()
+    cancels = {}
+
+    def run(model, cancel):
+        try:
+            for delta in _stream_groq(_chat_body(model, prompt), cancel):
+                events.put((model, delta, None))
+            events.put((model, _STREAM_END, None))
+        except Exception as e:
+            events.put((model, None, e))
+
+    def launch(i):
+        cancels[models[i]] = threading.Event()
+        _hedge_pool.submit(contextvars.copy_context().run, run, models[i], cancels[models[i]])
+        return time.monotonic() + hedge_budget(first_token_latency, models[i])
+
+    launched, outstanding, last_err = 1, 1, None
+    winner = None
+    hedge_at = launch(0)
+    try:
+        while True:
+            can_hedge = winner is None and launched < len(models)
+            timeout = max(0.0, hedge_at - time.monotonic()) if can_hedge else None
+            try:
+                model, delta, err = events.get(timeout=timeout)
+            except queue.Empty:
+                if get_limiter(models[launched]).throttled():
+                    # A hedge would only queue behind a rate limit; look again shortly
+                    hedge_at = time.monotonic() + 1.0
+                    continue
+                hedge_at = launch(launched)
+                launched += 1
+                outstanding += 1
+                continue
+            if winner is not None and model != winner:
+                continue
+            if err is not None:
+                if winner is not None:
+                    raise err
+                outstanding -= 1
+                last_err = err
+                if launched < len(models) and not outstanding:
+                    hedge_at = launch(launched)
+                    launched += 1
+                    outstanding += 1
+                elif not outstanding:
+                    raise last_err
+                continue
+            if winner is None:
+                # First model to produce a token wins the race; the rest are cancelled
+                winner = model
+                for other, cancel in cancels.items():
+                    if other != model:
+                        cancel.set()
+            if delta is _STREAM_END:
+                return
+            yield delta
+    finally:
+        # Also stops the winner if the consumer abandons the stream early
+        for cancel in cancels.values():
+            cancel.set()
+
+
+def stream_groq(prompt):
+    """Yield completion text as it arrives. Falls back to the next model only if nothing was streamed yet."""
+    if GROQ_HEDGE:
+        return _stream_hedged(prompt)
+    return _stream_sequential(prompt)
@@ -0,0 +1,143 @@
+import os
+import sys
+import json
+import weakref
+import threading
+import tempfile
+
+# Answers whose full question text stays in memory; older text is spilled to a per-session file
+HISTORY_MEMORY_CAP = int(os.getenv("HISTORY_MEMORY_CAP", "50"))
+HISTORY_SPILL_DIR = os.getenv("HISTORY_SPILL_DIR") or tempfile.gettempdir()
+
+# Review filters offered over the wrong answers
+FACETS = ("exam", "topic", "difficulty")
+
+# Bulky per-question text, as opposed to the small per-answer fields kept on AnswerRecord
+DETAIL_FIELDS = ("id", "question", "choices", "explanation", "rationales", "rendered")
+
+
+class AnswerRecord:
+    """The small per-answer fields; enough for scores and filters without touching question text."""
+
+    __slots__ = ("exam", "topic", "difficulty", "chosen", "correct", "is_correct", "time_sec", "spill")
+
+    def __init__(self, entry: dict):
+        # Labels repeat across hundreds of answers, so share one string object per value
+        self.exam = sys.intern(entry.get("exam", ""))
+        self.topic = sys.intern(entry.get("topic", ""))
+        self.difficulty = sys.intern(entry.get("difficulty", ""))
+        self.chosen = entry.get("chosen")
+        self.correct = entry.get("correct")
+        self.is_correct = bool(entry.get("is_correct"))
+        self.time_sec = entry.get("time_sec")
+        # (offset, length) of the detail line once it has been spilled to disk
+        self.spill = None
+
+    def as_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__ if k != "spill"}
+
+
+def _discard(f, path: str):
+    f.close()
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class SessionHistory:
+    """Bounded-memory history of one session's answers.
+
+    Every answer keeps an AnswerRecord; only the last `memory_cap` keep their question text in memory.
+    Older text is appended to a temporary file and read back by offset when the review asks for it.
+    The file is removed when the history is garbage-collected (session ended or reset).
+    """
+
+    def __init__(self, memory_cap: int = HISTORY_MEMORY_CAP):
+        self.memory_cap = memory_cap
+        self.records = []
+        self._recent = {}
+        self._spill = None
+        # Downloads read entries on their own thread while the page may be reading or appending
+        self._lock = threading.Lock()
+        # Summary stats and the wrong-answer index are kept up to date on append, never rescanned
+        self.correct = 0
+        self.time_total = 0.0
+        self.wrong_indices = []
+        self.wrong_facets = {facet: {} for facet in FACETS}
+
+    def append(self, entry: dict):
+        rec = AnswerRecord(entry)
+        with self._lock:
+            self.records.append(rec)
+            self.time_total += rec.time_sec or 0
+            if rec.is_correct:
+                self.correct += 1
+            else:
+                self.wrong_indices.append(len(self.records) - 1)
+                for facet, counts in self.wrong_facets.items():
+                    value = getattr(rec, facet)
+                    counts[value] = counts.get(value, 0) + 1
+            self._recent[len(self.records) - 1] = {k: entry[k] for k in DETAIL_FIELDS if k in entry}
+            while len(self._recent) > self.memory_cap:
+                i = next(iter(self._recent))
+                self._spill_out(i, self._recent.pop(i))
+
+    def fill_details(self, i: int, entry: dict):
+        """Store the explanation and rationales that arrived after answer i was recorded."""
+        detail = {k: entry[k] for k in DETAIL_FIELDS if k in entry}
+        with self._lock:
+            if i in self._recent:
+                self._recent[i] = detail
+            else:
+                # Spilled lines are never rewritten in place; the record points at the new one
+                self._spill_out(i, detail)
+
+    def _spill_out(self, i: int, detail: dict):
+        if self._spill is None:
+            fd, path = tempfile.mkstemp(prefix="quiz-history-", suffix=".jsonl", dir=HISTORY_SPILL_DIR)
+            self._spill = os.fdopen(fd, "w+b")
+            weakref.finalize(self, _discard, self._spill, path)
+        # Rendered HTML is cheap to rebuild, so only the source text goes to disk
+        line = json.dumps({k: v for k, v in detail.items() if k != "rendered"}).encode("utf-8") + b"\n"
+        self._spill.seek(0, os.SEEK_END)
+        self.records[i].spill = (self._spill.tell(), len(line))
+        self._spill.write(line)
+
+    def entry(self, i: int) -> dict:
+        """The full answer, in the shape it was appended (minus rendered HTML once spilled)."""
+        rec = self.records[i]
+        with self._lock:
+            detail = self._recent.get(i)
+            if detail is None:
+                offset, length = rec.spill
+                self._spill.seek(offset)
+                detail = json.loads(self._spill.read(length))
+        return dict(rec.as_dict(), **detail)
+
+    @property
+    def avg_time(self) -> float:
+        return self.time_total / len(self.records) if self.records else 0.0
+
+    def wrong_matching(self, **filters) -> list:
+        """Indices of wrong answers whose facets equal every given filter (None means any)."""
+        wanted = [(facet, value) for facet, value in filters.items() if value is not None]
+        if not wanted:
+            return self.wrong_indices
+        records = self.records
+        return [i for i in self.wrong_indices if all(getattr(records[i], f) == v for f, v in wanted)]
+
+    def entries(self):
+        return (self.entry(i) for i in range(len(self.records)))
+
+    def wrong(self):
+        return (self.entry(i) for i in self.wrong_indices)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __bool__(self):
+        return bool(self.records)
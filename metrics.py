@@ -0,0 +1,220 @@
+import os
+import time
+import bisect
+import functools
+import warnings
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Export: serve GET /metrics on this port, and/or rewrite this file every METRICS_FILE_INTERVAL seconds
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_FILE = os.getenv("METRICS_FILE", "")
+METRICS_FILE_INTERVAL = float(os.getenv("METRICS_FILE_INTERVAL", "15"))
+
+# Span buckets reach down to 100us so local steps (parsing, shuffling) land in more than the first bucket
+SPAN_BOUNDS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+               1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 21.0, 34.0, 60.0)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (seconds) with a bucket-interpolated quantile estimate."""
+
+    BOUNDS = (0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 21.0, 34.0, 60.0)
+
+    def __init__(self, bounds: tuple = None):
+        if bounds is not None:
+            self.BOUNDS = bounds
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+            self.count += 1
+            self.sum += seconds
+
+    def quantile(self, q: float) -> float:
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = q * self.count
+            cumulative = 0
+            for i, n in enumerate(self.counts):
+                if n and cumulative + n >= rank:
+                    lower = self.BOUNDS[i - 1] if i else 0.0
+                    upper = self.BOUNDS[i] if i < len(self.BOUNDS) else self.BOUNDS[-1]
+                    return lower + (upper - lower) * (rank - cumulative) / n
+                cumulative += n
+            return self.BOUNDS[-1]
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.count, self.sum
+
+
+# Process-wide registry, keyed by (metric name, sorted label pairs)
+_counters = {}
+_histograms = {}
+_help = {}
+_registry_lock = threading.Lock()
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def describe(name: str, text: str):
+    _help[name] = text
+
+
+def inc(name: str, amount: float = 1, **labels):
+    key = _key(name, labels)
+    with _registry_lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def counter_values(name: str) -> dict:
+    """{label pairs: value} for one counter, e.g. for a benchmark report."""
+    with _registry_lock:
+        return {labels: v for (n, labels), v in _counters.items() if n == name}
+
+
+def histogram(name: str, bounds: tuple = None, **labels) -> LatencyHistogram:
+    key = _key(name, labels)
+    with _registry_lock:
+        if key not in _histograms:
+            _histograms[key] = LatencyHistogram(bounds)
+        return _histograms[key]
+
+
+def observe_span(span_name: str, seconds: float, **labels):
+    histogram("quiz_span_seconds", SPAN_BOUNDS, span=span_name, **labels).observe(seconds)
+
+
+@contextmanager
+def span(span_name: str, **labels):
+    """Time the block into quiz_span_seconds{span=...}, whether or not it raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_span(span_name, time.perf_counter() - started, **labels)
+
+
+def timed(span_name: str, **labels):
+    """Decorator form of span()."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+describe("quiz_span_seconds", "Time spent in each instrumented step of question generation.")
+
+
+# ---------- Prometheus text exposition ----------
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs, extra=()) -> str:
+    pairs = tuple(pairs) + tuple(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _num(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def render() -> str:
+    with _registry_lock:
+        counters = sorted(_counters.items())
+        histograms = sorted(_histograms.items(), key=lambda kv: kv[0])
+    lines = []
+    seen = set()
+    for (name, labels), value in counters:
+        if name not in seen:
+            seen.add(name)
+            if name in _help:
+                lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_labels(labels)} {_num(value)}")
+    for (name, labels), hist in histograms:
+        if name not in seen:
+            seen.add(name)
+            if name in _help:
+                lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} histogram")
+        counts, count, total = hist.snapshot()
+        cumulative = 0
+        for bound, n in zip(hist.BOUNDS, counts):
+            cumulative += n
+            lines.append(f"{name}_bucket{_labels(labels, [('le', _num(bound))])} {cumulative}")
+        lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {count}")
+        lines.append(f"{name}_sum{_labels(labels)} {total!r}")
+        lines.append(f"{name}_count{_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _write_file_forever(path: str, interval: float):
+    while True:
+        time.sleep(interval)
+        try:
+            tmp = f"{path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(render())
+            # Atomic swap so a scraper (e.g. node_exporter's textfile collector) never reads half a file
+            os.replace(tmp, path)
+        except OSError as e:
+            warnings.warn(f"Could not write metrics to {path}: {e}")
+
+
+_exporters_started = False
+_exporters_lock = threading.Lock()
+
+
+def start_exporters():
+    """Start the configured exporters once per process; later calls (every Streamlit rerun) are no-ops."""
+    global _exporters_started
+    with _exporters_lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+    if METRICS_PORT:
+        try:
+            server = ThreadingHTTPServer((METRICS_HOST, METRICS_PORT), _MetricsHandler)
+        except OSError as e:
+            warnings.warn(f"Metrics endpoint not started on {METRICS_HOST}:{METRICS_PORT}: {e}")
+        else:
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True, name="metrics-http").start()
+    if METRICS_FILE:
+        threading.Thread(
+            target=_write_file_forever, args=(METRICS_FILE, METRICS_FILE_INTERVAL), daemon=True, name="metrics-file"
+        ).start()
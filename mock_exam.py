@@ -0,0 +1,307 @@
+import os
+import re
+import json
+import time
+import uuid
+import random
+import logging
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from dedup import SeenQuestions
+from groq_client import client_scope
+from numeric_questions import take_numeric
+from quiz_engine import (
+    DETAILS_TIMEOUT, complete_questions, generate_question_batch, get_track_config, take_from_bank, take_from_pack
+)
+from sanitize import render_question
+
+# Shared by every exam in the process; EXAM_CONCURRENCY caps how many of those workers one exam may hold
+EXAM_WORKERS = int(os.getenv("EXAM_WORKERS", "8"))
+EXAM_CONCURRENCY = int(os.getenv("EXAM_CONCURRENCY", "3"))
+# Questions requested per completion
+EXAM_CHUNK = int(os.getenv("EXAM_CHUNK", "4"))
+# Generation attempts per question before falling back to any banked question for the track
+EXAM_MAX_ATTEMPTS = 3
+EXAM_CHECKPOINT_DIR = os.getenv("EXAM_CHECKPOINT_DIR") or os.path.join(tempfile.gettempdir(), "quiz-exams")
+# Background fills are checkpointed at most this often; answers are checkpointed immediately
+EXAM_CHECKPOINT_INTERVAL = 2.0
+
+_executor = ThreadPoolExecutor(max_workers=EXAM_WORKERS, thread_name_prefix="mock-exam")
+
+logger = logging.getLogger(__name__)
+metrics.describe("quiz_exam_chunk_failures_total", "Mock exam chunks whose build raised, by track.")
+
+
+def _apportion(total: int, weights: list) -> list:
+    """Split `total` in proportion to `weights` with whole numbers (largest remainder)."""
+    raw = [total * w / sum(weights) for w in weights]
+    counts = [int(r) for r in raw]
+    by_remainder = sorted(range(len(raw)), key=lambda i: raw[i] - counts[i], reverse=True)
+    for i in by_remainder[:total - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+
+def blueprint(track_key: str, rng: random.Random) -> list:
+    """The category of every question on a full paper, weighted by domain, in random order."""
+    cfg = get_track_config(track_key)
+    domains = cfg.get("exam_domains") or [("All", 1.0, cfg["default_categories"])]
+    paper = []
+    for (_, _, categories), n in zip(domains, _apportion(cfg["exam_questions"], [w for _, w, _ in domains])):
+        # Shuffle first so leftover questions in a small domain don't always go to the same categories
+        categories = rng.sample(categories, len(categories))
+        for category, k in zip(categories, _apportion(n, [1] * len(categories))):
+            paper.extend([category] * k)
+    rng.shuffle(paper)
+    return paper
+
+
+def _checkpoint_path(exam_id: str):
+    """The checkpoint file for an exam id, or None if the id isn't one MockExam generates.
+
+    Ids arrive in the URL, so anything else (a path, "..") must never reach the filesystem.
+    """
+    if not isinstance(exam_id, str) or not re.fullmatch(r"[0-9a-f]{12}", exam_id):
+        return None
+    return os.path.join(EXAM_CHECKPOINT_DIR, f"{exam_id}.json")
+
+
+def discard_checkpoint(exam_id: str):
+    path = _checkpoint_path(exam_id)
+    if path is None:
+        return
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class MockExam:
+    """One learner's full paper, built in the background in slot order and checkpointed to disk.
+
+    Each slot is filled from the question pack or the bank when either has an unseen question for the
+    category, otherwise by batch generation. The learner answers slot by slot while later slots are
+    still being built.
+    """
+
+    def __init__(self, track_key: str, level: str, exclude=(), exam_id: str = None, categories: list = None):
+        self.id = exam_id or uuid.uuid4().hex[:12]
+        self.track_key = track_key
+        self.level = level
+        self.categories = categories or blueprint(track_key, random.Random())
+        n = len(self.categories)
+        self.questions = [None] * n
+        self.answers = [None] * n
+        self.failed = set()
+        # Why the most recent chunk failed, shown while the learner waits on a slot
+        self.last_error = None
+        self.cursor = 0
+        self.seen = SeenQuestions()
+        # Don't reuse questions the learner already saw in this session
+        self.seen.ids.update(exclude)
+        self._attempts = [0] * n
+        self._queue = deque()
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._checkpoint_lock = threading.Lock()
+        self._last_checkpoint = 0.0
+        self._discarded = False
+
+    # ---------- Building ----------
+
+    def start(self):
+        with self._lock:
+            todo = [i for i in range(len(self.categories)) if self.questions[i] is None and i not in self.failed]
+            self._queue.extend(todo[k:k + EXAM_CHUNK] for k in range(0, len(todo), EXAM_CHUNK))
+        self._pump()
+        return self
+
+    def _pump(self):
+        with self._lock:
+            while self._in_flight < EXAM_CONCURRENCY and self._queue and not self._discarded:
+                self._in_flight += 1
+                _executor.submit(self._build_chunk, self._queue.popleft())
+
+    def _place(self, i: int, qd: dict) -> bool:
+        with self._lock:
+            if self.questions[i] is not None:
+                return False
+            self.questions[i] = qd
+            self.seen.add(qd)
+            return True
+
+    def _from_numeric(self, i: int) -> bool:
+        qd = take_numeric(self.categories[i], self.level)
+        return qd is not None and self._place(i, qd)
+
+    def _from_pack(self, i: int) -> bool:
+        qd = take_from_pack(self.track_key, self.categories[i], self.level, self.seen)
+        return qd is not None and self._place(i, qd)
+
+    def _from_bank(self, i: int, category) -> bool:
+        qd = take_from_bank(self.track_key, category, self.level, self.seen)
+        return qd is not None and self._place(i, qd)
+
+    def _build_chunk(self, slots: list):
+        try:
+            # Exam jobs queue under their own id so a 180-question build can't starve live sessions
+            with client_scope(f"exam-{self.id}"):
+                missing = [i for i in slots if not self._from_numeric(i) and not self._from_pack(i)
+                           and not self._from_bank(i, self.categories[i])]
+                if missing:
+                    categories = [self.categories[i] for i in missing]
+                    for qd in generate_question_batch(self.track_key, "", self.level, len(categories),
+                                                      categories=categories):
+                        if self._discarded:
+                            # Closing the stream cancels the completion
+                            break
+                        slot = next((i for i in missing if self.questions[i] is None
+                                     and self.categories[i] == qd.get("category")), None)
+                        if slot is not None and not self.seen.has(qd):
+                            self._place(slot, qd)
+            self.last_error = None
+        except Exception as e:
+            # Unfilled slots are retried below; the learner sees the error while waiting on one
+            logger.warning("Mock exam %s: building slots %s failed", self.id, slots, exc_info=True)
+            metrics.inc("quiz_exam_chunk_failures_total", track=self.track_key)
+            self.last_error = f"{type(e).__name__}: {e}"
+        finally:
+            self._requeue_unfilled(slots)
+            with self._lock:
+                self._in_flight -= 1
+            self._pump()
+            # Always write the final state once the whole paper is built
+            self.checkpoint(force=not self._in_flight and not self._queue)
+
+    def _requeue_unfilled(self, slots: list):
+        if self._discarded:
+            return
+        retry = []
+        for i in slots:
+            if self.questions[i] is not None:
+                continue
+            self._attempts[i] += 1
+            if self._attempts[i] < EXAM_MAX_ATTEMPTS:
+                retry.append(i)
+            elif not self._from_bank(i, ""):
+                # Nothing left anywhere for this slot; the paper goes on without it
+                with self._lock:
+                    self.failed.add(i)
+        if retry:
+            with self._lock:
+                # Front of the queue: the learner reaches low slots first
+                self._queue.appendleft(retry)
+
+    # ---------- Taking the exam ----------
+
+    def __len__(self):
+        return len(self.categories)
+
+    @property
+    def ready(self) -> int:
+        return sum(q is not None for q in self.questions)
+
+    @property
+    def done(self) -> bool:
+        return self.cursor >= len(self.categories)
+
+    def current(self):
+        """(slot, question) the learner is on; question is None while it is still being built."""
+        while not self.done and self.cursor in self.failed:
+            self.cursor += 1
+        if self.done:
+            return None, None
+        return self.cursor, self.questions[self.cursor]
+
+    def answer(self, i: int, chosen: str, time_sec):
+        self.answers[i] = (chosen, time_sec)
+        self.cursor = i + 1
+        self.checkpoint(force=True)
+
+    def history_entries(self, exam_display: str, timeout: float = DETAILS_TIMEOUT) -> list:
+        """One history entry per answered question, waiting at most `timeout` seconds in all for explanations.
+
+        Explanations are fetched in the background during the exam, so most are in by now; the rest
+        are left blank and filled in by the review once they arrive.
+        """
+        answered = [(qd, answer, category)
+                    for qd, answer, category in zip(self.questions, self.answers, self.categories)
+                    if qd is not None and answer is not None]
+        complete_questions([qd for qd, _, _ in answered], self.track_key, self.level, timeout)
+        entries = []
+        for qd, (chosen, time_sec), category in answered:
+            entries.append({
+                "id": qd.get("id"),
+                "exam": exam_display,
+                "question": qd["question"],
+                "choices": qd["choices"],
+                "correct": qd["correct"],
+                "chosen": chosen,
+                "is_correct": chosen == qd["correct"],
+                "explanation": qd.get("explanation", ""),
+                "rationales": qd.get("rationales", {}),
+                "rendered": qd.get("rendered"),
+                "time_sec": time_sec,
+                # A fallback question may come from another category than the slot asked for
+                "topic": qd.get("category") or category,
+                "difficulty": self.level,
+            })
+        return entries
+
+    # ---------- Checkpoints ----------
+
+    def checkpoint(self, force: bool = False):
+        now = time.monotonic()
+        if self._discarded:
+            return
+        if not force and now - self._last_checkpoint < EXAM_CHECKPOINT_INTERVAL:
+            return
+        with self._checkpoint_lock:
+            self._last_checkpoint = now
+            with self._lock:
+                state = {
+                    "id": self.id, "track": self.track_key, "level": self.level,
+                    "categories": self.categories, "cursor": self.cursor, "answers": self.answers,
+                    "failed": sorted(self.failed), "seen": sorted(i for i in self.seen.ids if i),
+                    "questions": [None if q is None else {k: v for k, v in q.items() if k != "rendered"}
+                                  for q in self.questions],
+                }
+            os.makedirs(EXAM_CHECKPOINT_DIR, exist_ok=True)
+            path = _checkpoint_path(self.id)
+            with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def resume(cls, exam_id: str):
+        """Rebuild an exam from its checkpoint and restart generation for unfilled slots.
+
+        None if the id is malformed or its checkpoint is missing or unreadable.
+        """
+        path = _checkpoint_path(exam_id)
+        if path is None:
+            return None
+        try:
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+            exam = cls(state["track"], state["level"], state.get("seen", ()), exam_id, state["categories"])
+            exam.cursor = state["cursor"]
+            exam.answers = [tuple(a) if a else None for a in state["answers"]]
+            exam.failed = set(state["failed"])
+            for i, qd in enumerate(state["questions"]):
+                if qd is not None:
+                    exam._place(i, render_question(qd))
+        except (OSError, ValueError, KeyError, TypeError, IndexError, AttributeError):
+            return None
+        return exam.start()
+
+    def discard(self):
+        """Stop building (in-flight chunks stop at their next question) and delete the checkpoint."""
+        with self._lock:
+            self._queue.clear()
+            self._discarded = True
+        discard_checkpoint(self.id)
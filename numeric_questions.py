@@ -0,0 +1,461 @@
+import os
+import random
+import threading
+
+import numpy as np
+
+import metrics
+from question_bank import question_id
+from sanitize import render_question
+
+LETTERS = ("A", "B", "C", "D")
+
+# Questions generated per (family, difficulty) whenever its reservoir runs dry
+NUMERIC_BATCH = int(os.getenv("NUMERIC_BATCH", "256"))
+# Fraction of questions in a numeric category built locally; the rest still come from the LLM
+# so conceptual questions (interpreting indices, choosing a forecast method) keep appearing
+NUMERIC_SHARE = float(os.getenv("NUMERIC_SHARE", "0.75"))
+
+# Category (lowercase) -> question family
+NUMERIC_CATEGORIES = {
+    "earned value management": "evm",
+    "cost baseline and budgeting basics": "evm",
+    "critical path analysis": "cpm",
+    "schedule basics and sequencing": "cpm",
+}
+# Typed topics that mean the same thing
+_TOPIC_KEYWORDS = (("earned value", "evm"), ("critical path", "cpm"))
+
+# Activities per network
+CPM_ACTIVITIES = {"Easy": 5, "Moderate": 7, "Hard": 9}
+# Chance of each extra finish-to-start link beyond the one every activity gets
+CPM_LINK_PROBABILITY = 0.3
+
+
+def numeric_family(topic: str):
+    """"evm" or "cpm" if questions on this topic can be built locally, else None."""
+    key = (topic or "").strip().lower()
+    if key in NUMERIC_CATEGORIES:
+        return NUMERIC_CATEGORIES[key]
+    for keyword, family in _TOPIC_KEYWORDS:
+        if keyword in key:
+            return family
+    return None
+
+
+# ---------- Shared helpers ----------
+
+def _money(v) -> str:
+    return f"-${-v:,.0f}" if v < 0 else f"${v:,.0f}"
+
+
+def _ratio(v) -> str:
+    return f"{v:.2f}"
+
+
+def _days(v) -> str:
+    return "1 day" if v == 1 else f"{v:.0f} days"
+
+
+def _listed(items: list) -> str:
+    return items[0] if len(items) == 1 else f"{', '.join(items[:-1])} and {items[-1]}"
+
+
+# Rationale for a distractor _distinct had to move: it no longer matches the mistake its column models
+_NUDGED_RATIONALE = "This value does not follow from the figures given."
+
+
+def _rationale_table(rationales: tuple, count: int) -> np.ndarray:
+    """One row of per-column rationales per question, for callers to override cell by cell."""
+    return np.tile(np.array(rationales, dtype=object), (count, 1))
+
+
+def _distinct(options: np.ndarray, decimals: int, step: float) -> tuple:
+    """Round the options and nudge distractors that coincide with the key or with each other.
+
+    Column 0 is the key and never changes; a clashing distractor moves up by `step` until it is unique.
+    Returns the options and a mask of the cells that moved.
+    """
+    options = np.round(options, decimals)
+    nudged = np.zeros(options.shape, dtype=bool)
+    for c in range(1, options.shape[1]):
+        for _ in range(options.shape[1]):
+            clash = (options[:, c:c + 1] == options[:, :c]).any(axis=1)
+            if not clash.any():
+                break
+            options[clash, c] = np.round(options[clash, c] + step, decimals)
+            nudged[clash, c] = True
+    return options, nudged
+
+
+def _assemble(stems: list, options: np.ndarray, fmt, rationales: np.ndarray, explanations: list,
+              rng: np.random.Generator) -> list:
+    """Shuffle each row's options into A-D and build the question dicts.
+
+    `options[:, 0]` is the key; `rationales[r, k]` explains option column k of row r.
+    """
+    n = options.shape[0]
+    # Row-wise random permutation: order[r, position] = option column shown at that letter
+    order = np.argsort(rng.random((n, 4)), axis=1)
+    shown = np.take_along_axis(options, order, axis=1)
+    key_position = np.argmax(order == 0, axis=1)
+    questions = []
+    for r in range(n):
+        qd = {
+            "question": stems[r],
+            "choices": {L: fmt(shown[r, p]) for p, L in enumerate(LETTERS)},
+            "correct": LETTERS[key_position[r]],
+            "explanation": explanations[r],
+            "rationales": {L: rationales[r, order[r, p]] for p, L in enumerate(LETTERS)},
+        }
+        qd["id"] = question_id(qd)
+        questions.append(qd)
+    return questions
+
+
+# ---------- Earned value ----------
+
+_EVM_OPENERS = (
+    "A project has a budget at completion (BAC) of {bac}.",
+    "You are reporting status on a project with a BAC of {bac}.",
+    "At the monthly review of a {bac} project,",
+)
+_EVM_FIGURES = "planned value (PV) is {pv}, earned value (EV) is {ev} and actual cost (AC) is {ac}."
+
+# Difficulty -> EVM question kinds drawn from
+EVM_KINDS = {
+    "Easy": ("cpi", "spi"),
+    "Moderate": ("eac", "etc", "vac"),
+    "Hard": ("tcpi", "eac_composite", "etc"),
+}
+
+# kind -> (question, value format, rationale per option column, explanation); column 0 is the key
+_EVM_TEXT = {
+    "cpi": (
+        "What is the cost performance index (CPI)?", _ratio,
+        ("CPI = EV / AC.",
+         "AC / EV inverts the cost index.",
+         "EV / PV is the schedule performance index, not the cost index.",
+         "PV / AC compares the plan with actual cost; it is not a performance index."),
+        "CPI = EV / AC = {ev} / {ac} = {cpi}. A CPI {cpi_side} 1.0 means the work is {cost_state} budget.",
+    ),
+    "spi": (
+        "What is the schedule performance index (SPI)?", _ratio,
+        ("SPI = EV / PV.",
+         "PV / EV inverts the schedule index.",
+         "EV / AC is the cost performance index, not the schedule index.",
+         "AC / PV compares actual cost with the plan; it is not a performance index."),
+        "SPI = EV / PV = {ev} / {pv} = {spi}. An SPI {spi_side} 1.0 means the work is {schedule_state} schedule.",
+    ),
+    "eac": (
+        "Assuming the current cost performance continues, what is the estimate at completion (EAC)?", _money,
+        ("EAC = BAC / CPI when current cost performance is expected to continue.",
+         "AC + (BAC − EV) assumes the remaining work will go to plan, which is the atypical case.",
+         "BAC × CPI multiplies by the index where it should divide.",
+         "BAC / SPI forecasts cost from the schedule index."),
+        "CPI = EV / AC = {ev} / {ac} = {cpi}. With that performance continuing, EAC = BAC / CPI = {bac} / {cpi} = {key}.",
+    ),
+    "etc": (
+        "Assuming the current cost performance continues, what is the estimate to complete (ETC)?", _money,
+        ("ETC = EAC − AC, with EAC = BAC / CPI.",
+         "BAC − EV is the ETC only when the remaining work goes to plan.",
+         "BAC / CPI is the EAC for the whole project, not the cost of the remaining work.",
+         "BAC − AC is what is left of the budget, not a forecast of the remaining cost."),
+        "CPI = EV / AC = {cpi}, so EAC = BAC / CPI = {eac}. ETC = EAC − AC = {eac} − {ac} = {key}.",
+    ),
+    "vac": (
+        "Assuming the current cost performance continues, what is the variance at completion (VAC)?", _money,
+        ("VAC = BAC − EAC, with EAC = BAC / CPI.",
+         "EAC − BAC reverses the sign of the variance.",
+         "EV − AC is the cost variance to date, not at completion.",
+         "BAC − AC is the remaining budget, not a variance."),
+        "CPI = EV / AC = {cpi}, so EAC = BAC / CPI = {eac}. VAC = BAC − EAC = {bac} − {eac} = {key}; "
+        "a negative VAC is a forecast overrun.",
+    ),
+    "tcpi": (
+        "What to-complete performance index (TCPI) is needed to finish within the BAC?", _ratio,
+        ("TCPI = (BAC − EV) / (BAC − AC): the efficiency the remaining work needs to finish within BAC.",
+         "(BAC − AC) / (BAC − EV) inverts the index.",
+         "(BAC − EV) / (EAC − AC) is the TCPI needed to meet the EAC, not the BAC; with EAC = BAC / CPI "
+         "it is simply the CPI achieved so far.",
+         "EV / PV is the schedule performance index; TCPI is a cost efficiency."),
+        "TCPI = (BAC − EV) / (BAC − AC) = ({bac} − {ev}) / ({bac} − {ac}) = {key}. "
+        "A TCPI {tcpi_side} 1.0 means the remaining work {tcpi_meaning} to finish within budget.",
+    ),
+    "eac_composite": (
+        "Management expects both the current cost and schedule performance to continue. "
+        "What is the estimate at completion (EAC)?", _money,
+        ("When cost and schedule performance both influence the remaining work, EAC = AC + (BAC − EV) / (CPI × SPI).",
+         "BAC / CPI accounts for cost performance only.",
+         "AC + (BAC − EV) assumes the remaining work goes to plan.",
+         "BAC / (CPI × SPI) applies the composite index to the work already done as well."),
+        "CPI = {cpi} and SPI = {spi}. EAC = AC + (BAC − EV) / (CPI × SPI) = {ac} + ({bac} − {ev}) / "
+        "({cpi} × {spi}) = {key}.",
+    ),
+}
+
+
+def _performance_index(rng: np.random.Generator, n: int) -> np.ndarray:
+    # Kept at least 5% away from 1.0 so "over" and "under" are never a rounding call
+    return 1.0 + rng.choice((-1.0, 1.0), n) * rng.uniform(0.05, 0.25, n)
+
+
+def _evm_options(kind: str, bac, pv, ev, ac) -> tuple:
+    """(options with the key in column 0, decimals to round to, clash step)."""
+    # Forecasts use the indices as the explanation shows them, so its arithmetic reproduces the key
+    cpi, spi = np.round(ev / ac, 2), np.round(ev / pv, 2)
+    eac = bac / cpi
+    columns = {
+        "cpi": (ev / ac, ac / ev, ev / pv, pv / ac),
+        "spi": (ev / pv, pv / ev, ev / ac, ac / pv),
+        "eac": (eac, ac + bac - ev, bac * cpi, bac / spi),
+        "etc": (eac - ac, bac - ev, eac, bac - ac),
+        "vac": (bac - eac, eac - bac, ev - ac, bac - ac),
+        "tcpi": ((bac - ev) / (bac - ac), (bac - ac) / (bac - ev), (bac - ev) / (bac * ac / ev - ac), spi),
+        "eac_composite": (ac + (bac - ev) / (cpi * spi), eac, ac + bac - ev, bac / (cpi * spi)),
+    }[kind]
+    if kind in ("cpi", "spi", "tcpi"):
+        return np.column_stack(columns), 2, 0.01
+    return np.column_stack(columns), 0, 1000.0
+
+
+def evm_questions(level: str, count: int, rng: np.random.Generator) -> list:
+    """`count` earned-value questions with exact keys and formula-mistake distractors."""
+    kinds = EVM_KINDS.get(level, EVM_KINDS["Moderate"])
+    bac = rng.integers(50, 2000, count) * 1000.0
+    # At most ~70% earned with SPI <= 1.25, and AC stays below BAC, so TCPI is always defined
+    pv = np.round(bac * rng.uniform(0.2, 0.55, count), -3)
+    ev = np.round(pv * _performance_index(rng, count), -3)
+    ac = np.round(ev / _performance_index(rng, count), -3)
+    picks = rng.integers(0, len(kinds), count)
+
+    questions = [None] * count
+    for k, kind in enumerate(kinds):
+        rows = np.flatnonzero(picks == k)
+        if not len(rows):
+            continue
+        b, p, e, a = bac[rows], pv[rows], ev[rows], ac[rows]
+        options, decimals, step = _evm_options(kind, b, p, e, a)
+        options, nudged = _distinct(options, decimals, step)
+        ask, fmt, rationales, explanation = _EVM_TEXT[kind]
+        rationales = _rationale_table(rationales, len(rows))
+        rationales[nudged] = _NUDGED_RATIONALE
+        stems, explanations = [], []
+        for r in range(len(rows)):
+            cpi, spi = np.round(e[r] / a[r], 2), np.round(e[r] / p[r], 2)
+            tcpi = (b[r] - e[r]) / (b[r] - a[r])
+            fields = {
+                "bac": _money(b[r]), "pv": _money(p[r]), "ev": _money(e[r]), "ac": _money(a[r]),
+                "cpi": _ratio(cpi), "spi": _ratio(spi),
+                "eac": _money(b[r] / cpi), "key": fmt(options[r, 0]),
+                "cpi_side": "below" if cpi < 1 else "above", "cost_state": "over" if cpi < 1 else "under",
+                "spi_side": "below" if spi < 1 else "above", "schedule_state": "behind" if spi < 1 else "ahead of",
+                "tcpi_side": "above" if tcpi > 1 else "below",
+                "tcpi_meaning": "must be done more efficiently than planned" if tcpi > 1
+                else "can be done less efficiently than planned and still manage",
+            }
+            opener = _EVM_OPENERS[int(rng.integers(len(_EVM_OPENERS)))].format(**fields)
+            figures = _EVM_FIGURES.format(**fields)
+            if opener.endswith("."):
+                figures = figures[0].upper() + figures[1:]
+            stems.append(f"{opener} {figures} {ask}")
+            explanations.append(explanation.format(**fields))
+        built = _assemble(stems, options, fmt, rationales, explanations, rng)
+        for r, qd in zip(rows, built):
+            questions[r] = qd
+    return questions
+
+
+# ---------- Critical path ----------
+
+CPM_KINDS = {"Easy": "duration", "Moderate": "float", "Hard": "delay"}
+
+
+def _networks(rng: np.random.Generator, count: int, n: int):
+    """Random activity-on-node networks with forward and backward passes, one per row.
+
+    Activities are numbered in topological order; every activity after the first has at least
+    one predecessor, so each network is connected. Returns durations, the link matrix and ES/EF/LS/LF.
+    """
+    rows = np.arange(count)
+    durations = rng.integers(1, 10, (count, n)).astype(float)
+    links = (rng.random((count, n, n)) < CPM_LINK_PROBABILITY) & np.triu(np.ones((n, n), dtype=bool), 1)
+    for j in range(1, n):
+        links[rows, rng.integers(0, j, count), j] = True
+
+    es = np.zeros((count, n))
+    ef = np.zeros((count, n))
+    for j in range(n):
+        es[:, j] = np.where(links[:, :, j], ef, 0.0).max(axis=1)
+        ef[:, j] = es[:, j] + durations[:, j]
+    total = ef.max(axis=1)
+
+    lf = np.zeros((count, n))
+    ls = np.zeros((count, n))
+    for j in reversed(range(n)):
+        has_successor = links[:, j, :].any(axis=1)
+        lf[:, j] = np.where(has_successor, np.where(links[:, j, :], ls, np.inf).min(axis=1), total)
+        ls[:, j] = lf[:, j] - durations[:, j]
+
+    free = np.where(
+        links.any(axis=2),
+        np.where(links, es[:, None, :], np.inf).min(axis=2),
+        total[:, None]
+    ) - ef
+    return durations, links, es, ef, ls, lf, total, free
+
+
+def _network_text(durations, links, r: int) -> str:
+    parts = []
+    for j in range(durations.shape[1]):
+        preds = [str(i + 1) for i in np.flatnonzero(links[r, :, j])]
+        after = f"after {_listed(preds)}" if preds else "at the start"
+        parts.append(f"Activity {j + 1} ({_days(durations[r, j])}, {after})")
+    return ("A project has these activities, all finish-to-start: " + "; ".join(parts) + ".")
+
+
+def cpm_questions(level: str, count: int, rng: np.random.Generator) -> list:
+    """`count` critical-path questions over random networks, keyed by exact forward and backward passes."""
+    n = CPM_ACTIVITIES.get(level, CPM_ACTIVITIES["Moderate"])
+    kind = CPM_KINDS.get(level, "float")
+    rows = np.arange(count)
+    durations, links, es, ef, ls, lf, total, free = _networks(rng, count, n)
+    slack = ls - es
+    # Ask about a non-critical activity where there is one, so float questions aren't all zero, and
+    # preferably one whose free float is less than its total float, so the two can't be confused
+    target = np.argmax(rng.random((count, n)) + (slack > 0) + (free < slack), axis=1)
+    target_float = slack[rows, target]
+    # Rows where free float is no distractor: confusing it with total float gives the right answer
+    same_float = free[rows, target] == target_float
+
+    if kind == "duration":
+        shorter = np.where(slack > 0, slack, np.inf).min(axis=1)
+        options = np.column_stack((
+            total,
+            durations.sum(axis=1),
+            np.where(np.isfinite(shorter), total - shorter, total - 1),
+            es[rows, np.argmax(ef, axis=1)],
+        ))
+        ask = "What is the total project duration?"
+        rationales = _rationale_table((
+            "The project duration is the length of the longest path through the network.",
+            "Adding every duration treats all activities as sequential; parallel paths overlap.",
+            "This is the length of a shorter path; the duration is set by the longest one.",
+            "This is when the last critical activity starts; its own duration is left out.",
+        ), count)
+        # A single chain: the sum of the durations is the answer
+        serial = options[:, 1] == total
+        options[serial, 1] = durations[serial].max(axis=1)
+        rationales[serial, 1] = "This is the longest single activity; the duration is set by the longest path."
+        # Every activity is critical, so there is no shorter path to offer
+        rationales[~np.isfinite(shorter), 2] = _NUDGED_RATIONALE
+    elif kind == "float":
+        options = np.column_stack((
+            target_float,
+            free[rows, target],
+            lf[rows, target] - es[rows, target],
+            es[rows, target],
+        ))
+        rationales = _rationale_table((
+            "Total float = LS − ES (or LF − EF): how long the activity can slip without delaying the project.",
+            "This is the free float: slip that doesn't delay any successor's early start.",
+            "LF − ES leaves out the activity's own duration.",
+            "This is the activity's early start, not its float.",
+        ), count)
+        options[same_float, 1] = lf[rows, target][same_float]
+        rationales[same_float, 1] = "This is the activity's late finish, not its float."
+    else:
+        delay = target_float + rng.integers(1, 4, count)
+        options = np.column_stack((
+            total + np.maximum(0, delay - target_float),
+            total + delay,
+            total,
+            total + np.maximum(0, delay - free[rows, target]),
+        ))
+        rationales = _rationale_table((
+            "The finish moves by the part of the delay that exceeds the activity's total float.",
+            "Adding the whole delay treats the activity as if it were on the critical path.",
+            "The delay is longer than the activity's float, so the project finish does move.",
+            "Free float only protects the successors' early starts; total float governs the project finish.",
+        ), count)
+        # Where free float is zero the free-float slip is the whole delay, so column 1 makes way
+        new_start, no_free = es[rows, target] + delay, ~same_float & (free[rows, target] == 0)
+        for c, swap in ((3, same_float), (1, no_free)):
+            options[swap, c] = new_start[swap]
+            rationales[swap, c] = "This is when the delayed activity now starts, not when the project finishes."
+    options, nudged = _distinct(options, 0, 1.0)
+    rationales[nudged] = _NUDGED_RATIONALE
+
+    stems, explanations = [], []
+    for r in range(count):
+        x = target[r] + 1
+        critical = _listed([str(j + 1) for j in np.flatnonzero(slack[r] == 0)])
+        passes = (f"A forward pass gives a project duration of {_days(total[r])}; "
+                  f"the critical activities (zero total float) are {critical}.")
+        network = _network_text(durations, links, r)
+        if kind == "duration":
+            stems.append(f"{network} {ask}")
+            explanations.append(passes)
+        elif kind == "float":
+            stems.append(f"{network} What is the total float of Activity {x}?")
+            explanations.append(
+                f"{passes} Activity {x} has ES {es[r, target[r]]:.0f}, EF {ef[r, target[r]]:.0f}, "
+                f"LS {ls[r, target[r]]:.0f} and LF {lf[r, target[r]]:.0f}, so its total float is "
+                f"LS − ES = {_days(target_float[r])}."
+            )
+        else:
+            stems.append(
+                f"{network} If Activity {x} is delayed by {_days(delay[r])}, what is the new project duration?"
+            )
+            explanations.append(
+                f"{passes} Activity {x} has {_days(target_float[r])} of total float, so delaying it by "
+                f"{_days(delay[r])} moves the finish by {_days(options[r, 0] - total[r])}, to {_days(options[r, 0])}."
+            )
+    return _assemble(stems, options, _days, rationales, explanations, rng)
+
+
+# ---------- Serving ----------
+
+_GENERATORS = {"evm": evm_questions, "cpm": cpm_questions}
+
+
+class NumericQuestionEngine:
+    """Per-process reservoirs of locally built questions, refilled a vectorized batch at a time."""
+
+    def __init__(self, batch: int = NUMERIC_BATCH, seed=None):
+        self.batch = batch
+        self.rng = np.random.default_rng(seed)
+        self._ready = {}
+        # numpy Generators are not thread-safe, and sessions share this engine
+        self._lock = threading.Lock()
+
+    def take(self, family: str, level: str) -> dict:
+        with self._lock:
+            ready = self._ready.get((family, level))
+            if not ready:
+                ready = self._ready[(family, level)] = _GENERATORS[family](level, self.batch, self.rng)
+            return ready.pop()
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> NumericQuestionEngine:
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = NumericQuestionEngine()
+    return _engine
+
+
+@metrics.timed("take_numeric")
+def take_numeric(topic: str, level: str):
+    """A locally built question for an arithmetic topic, or None to use the usual sources."""
+    family = numeric_family(topic)
+    if family is None or random.random() >= NUMERIC_SHARE:
+        return None
+    qd = get_engine().take(family, level)
+    qd["category"] = topic.strip()
+    return render_question(qd)
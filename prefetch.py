@@ -0,0 +1,215 @@
+import os
+import uuid
+import queue
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from dedup import SeenQuestions
+from groq_client import client_scope
+from question_parser import StemWatcher
+from quiz_engine import generate_question, generate_question_batch
+
+PREFETCH_DEPTH = int(os.getenv("PREFETCH_DEPTH", "3"))
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "4"))
+# Workers reserved for questions a learner is waiting on, so they never queue behind background refills
+FOREGROUND_WORKERS = int(os.getenv("FOREGROUND_WORKERS", "4"))
+# Stop refilling after this many failed jobs in a row (bad key, API outage) until the selection changes
+PREFETCH_MAX_FAILURES = 3
+# Questions requested per LLM completion; 1 disables batch mode
+GENERATION_BATCH_SIZE = max(1, int(os.getenv("GENERATION_BATCH_SIZE", "4")))
+# Questions generated per bank bucket when it runs low
+BANK_REFILL_BATCH = int(os.getenv("QUESTION_BANK_REFILL_BATCH", "3"))
+
+metrics.describe("quiz_generation_failures_total", "Foreground requests that ended in an error shown to the learner.")
+metrics.describe("quiz_bank_refill_failures_total", "Background bank refills that raised, by track.")
+
+logger = logging.getLogger(__name__)
+
+# Imported modules survive Streamlit reruns, so these pools are shared by every session in the process
+_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+_foreground_executor = ThreadPoolExecutor(max_workers=FOREGROUND_WORKERS, thread_name_prefix="foreground")
+
+# Buckets with a refill already in flight, so many sessions hitting one low bucket don't each start one
+_refilling = set()
+_refilling_lock = threading.Lock()
+
+
+def buffer_key(track_key: str, topic: str, level: str) -> tuple:
+    return (track_key, (topic or "").strip().lower(), level)
+
+
+def _generate_into(inbox, epoch: int, client_id: str, track_key: str, topic: str, level: str, count: int,
+                   watcher=None, foreground: bool = False):
+    # Calls are queued under the session's id so one busy session can't starve the others, and a
+    # learner's own request goes ahead of every session's speculative ones
+    with client_scope(client_id, foreground):
+        if count == 1:
+            inbox.put((epoch, level, generate_question(track_key, topic, level, watcher)))
+            return
+        # Batch items are pushed as they stream in, so the first one is usable before the rest arrive
+        for qd in generate_question_batch(track_key, topic, level, count, watcher):
+            inbox.put((epoch, level, qd))
+
+
+def _fits(item: tuple, pick: tuple) -> bool:
+    level, qd = item
+    return level == pick[1] and (qd.get("category") or "").strip().lower() == pick[0].strip().lower()
+
+
+class PrefetchBuffer:
+    """Per-session queue of parsed questions for one (track, topic, difficulty) selection.
+
+    The selection is what the learner asked for, so a blank topic or Adaptive difficulty stays blank
+    in the key. Each job generates for one concrete (category, level) pick, and every buffered question
+    keeps its level, so the scheduler choosing a new pick doesn't throw away what is buffered.
+    """
+
+    def __init__(self, depth: int = PREFETCH_DEPTH, batch_size: int = GENERATION_BATCH_SIZE):
+        self.depth = depth
+        self.batch_size = batch_size
+        self.client_id = uuid.uuid4().hex
+        self.key = None
+        self.topic = ""
+        # Workers tag results with the epoch they were started in; bumping it discards stale ones
+        self.epoch = 0
+        self.inbox = queue.SimpleQueue()
+        # (level, question), oldest first
+        self.ready = deque()
+        self.pending = []
+        self.failures = 0
+        # Job whose first result the learner is waiting on, and its stem preview
+        self.foreground = None
+        self.watcher = None
+
+    def select(self, track_key: str, topic: str, level: str):
+        key = buffer_key(track_key, topic, level)
+        if key == self.key:
+            return
+        # Selection changed: anything buffered was generated for the old one
+        for fut in self.pending:
+            fut.cancel()
+        self.pending = []
+        self.ready.clear()
+        self.failures = 0
+        self.foreground = None
+        self.watcher = None
+        self.epoch += 1
+        self.key = key
+        self.topic = (topic or "").strip()
+
+    def _pick(self, pick) -> tuple:
+        # Without a pick, generate for the selection as given
+        return pick or (self.topic, self.key[2])
+
+    def _harvest(self):
+        while True:
+            try:
+                epoch, level, qd = self.inbox.get_nowait()
+            except queue.Empty:
+                break
+            if epoch == self.epoch:
+                self.ready.append((level, qd))
+                self.failures = 0
+        still_running = []
+        for fut in self.pending:
+            if not fut.done():
+                still_running.append(fut)
+            elif not fut.cancelled() and fut.exception() is not None:
+                self.failures += 1
+        self.pending = still_running
+
+    def _submit(self, topic: str, level: str, watcher=None, foreground: bool = False):
+        fut = (_foreground_executor if foreground else _executor).submit(
+            _generate_into, self.inbox, self.epoch, self.client_id, self.key[0], topic, level,
+            self.batch_size, watcher, foreground
+        )
+        self.pending.append(fut)
+        return fut
+
+    def fill(self, pick: tuple = None):
+        """Top the buffer up to `depth`; new jobs generate for `pick`, (category, level), when given."""
+        if self.key is None:
+            return
+        self._harvest()
+        if self.failures >= PREFETCH_MAX_FAILURES:
+            return
+        topic, level = self._pick(pick)
+        while len(self.ready) + len(self.pending) * self.batch_size < self.depth:
+            self._submit(topic, level)
+
+    def pop(self, track_key: str, topic: str, level: str, seen: SeenQuestions = None, prefer: tuple = None):
+        """(question, its level), or None; one generated for the `prefer` pick comes first, else the oldest."""
+        self.select(track_key, topic, level)
+        self._harvest()
+        order = list(range(len(self.ready)))
+        if prefer is not None:
+            order.sort(key=lambda i: not _fits(self.ready[i], prefer))
+        taken, used = None, set()
+        for i in order:
+            used.add(i)
+            item_level, qd = self.ready[i]
+            # Buffered items also land in the bank, so the learner may already have been served them
+            # (or a reworded copy of one); those are dropped
+            if seen is None or not seen.has(qd):
+                taken = (qd, item_level)
+                break
+        if used:
+            self.ready = deque(item for i, item in enumerate(self.ready) if i not in used)
+        return taken
+
+    def request_now(self, track_key: str, topic: str, level: str, pick: tuple = None):
+        """Start a job for a learner who is waiting, without blocking; pick the result up with poll()."""
+        self.select(track_key, topic, level)
+        if self.foreground is None or self.foreground.done():
+            self.watcher = StemWatcher()
+            self.foreground = self._submit(*self._pick(pick), self.watcher, foreground=True)
+
+    def poll(self, track_key: str, topic: str, level: str, seen: SeenQuestions = None, pick: tuple = None):
+        """(question, its level) if one has arrived, None if still waiting; re-raises a failed request."""
+        taken = self.pop(track_key, topic, level, seen, prefer=pick)
+        if taken is not None:
+            self.foreground = None
+            return taken
+        fut = self.foreground
+        if fut is None:
+            # Selection changed since the request; start over for the new one
+            self.request_now(track_key, topic, level, pick)
+        elif fut.done() and not self.pending:
+            self.foreground = None
+            metrics.inc("quiz_generation_failures_total", track=track_key)
+            fut.result()  # re-raises the generation error, if any
+            raise ValueError("Generation returned no usable question")
+        return None
+
+
+def _refill_bucket(bucket: tuple, category: str, count: int):
+    track_key, _, level = bucket
+    try:
+        # Background refills share one fair-queue slot instead of competing with live sessions
+        with client_scope("bank-refill"):
+            if GENERATION_BATCH_SIZE > 1:
+                # One completion for the whole refill; generate_question_batch banks each item
+                for _ in generate_question_batch(track_key, category, level, count):
+                    pass
+                return
+            for _ in range(count):
+                generate_question(track_key, category, level)
+    except Exception:
+        # Nobody is waiting on a refill, so nothing is shown; the next low bucket tries again
+        logger.warning("Refilling bank bucket %s failed", bucket, exc_info=True)
+        metrics.inc("quiz_bank_refill_failures_total", track=track_key)
+    finally:
+        with _refilling_lock:
+            _refilling.discard(bucket)
+
+
+def replenish(track_key: str, category: str, level: str, count: int = BANK_REFILL_BATCH):
+    bucket = (track_key, category.strip().lower(), level)
+    with _refilling_lock:
+        if bucket in _refilling:
+            return
+        _refilling.add(bucket)
+    _executor.submit(_refill_bucket, bucket, category.strip(), count)
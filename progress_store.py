@@ -0,0 +1,223 @@
+import os
+import time
+import queue
+import atexit
+import sqlite3
+import threading
+
+import metrics
+
+PROGRESS_DB_PATH = os.getenv("PROGRESS_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "progress.sqlite3"))
+# The writer thread commits whatever has queued up after this long, or as soon as a batch is full
+PROGRESS_FLUSH_INTERVAL = float(os.getenv("PROGRESS_FLUSH_INTERVAL", "0.5"))
+PROGRESS_BATCH = int(os.getenv("PROGRESS_BATCH", "500"))
+
+# A topic is a weak area once it has this many answers and accuracy (percent) below the threshold
+WEAK_MIN_ANSWERED = 5
+WEAK_ACCURACY = 70.0
+
+metrics.describe("quiz_progress_answers_written_total", "Answer events committed to the progress store.")
+metrics.describe("quiz_progress_write_errors_total", "Batches of answer events the progress store failed to commit.")
+
+# `answers` is the event log; `topic_stats` is kept up to date in the same transaction as each batch
+# so dashboards read a few rollup rows per learner instead of scanning their answers
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    id           INTEGER PRIMARY KEY,
+    learner      TEXT NOT NULL,
+    exam         TEXT NOT NULL,
+    topic        TEXT NOT NULL COLLATE NOCASE,
+    difficulty   TEXT NOT NULL,
+    question_id  TEXT,
+    chosen       TEXT,
+    correct      TEXT,
+    is_correct   INTEGER NOT NULL,
+    time_sec     REAL,
+    answered_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_answers_learner_time ON answers (learner, answered_at);
+CREATE INDEX IF NOT EXISTS idx_answers_learner_bucket ON answers (learner, exam, topic, difficulty);
+
+CREATE TABLE IF NOT EXISTS topic_stats (
+    learner     TEXT NOT NULL,
+    exam        TEXT NOT NULL,
+    topic       TEXT NOT NULL COLLATE NOCASE,
+    difficulty  TEXT NOT NULL,
+    answered    INTEGER NOT NULL,
+    correct     INTEGER NOT NULL,
+    time_total  REAL NOT NULL,
+    timed       INTEGER NOT NULL,
+    last_at     REAL NOT NULL,
+    PRIMARY KEY (learner, exam, topic, difficulty)
+) WITHOUT ROWID;
+"""
+
+_INSERT_ANSWER = (
+    "INSERT INTO answers (learner, exam, topic, difficulty, question_id, chosen, correct, is_correct, time_sec, "
+    "answered_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+_UPSERT_STATS = """
+INSERT INTO topic_stats (learner, exam, topic, difficulty, answered, correct, time_total, timed, last_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (learner, exam, topic, difficulty) DO UPDATE SET
+    answered = answered + excluded.answered,
+    correct = correct + excluded.correct,
+    time_total = time_total + excluded.time_total,
+    timed = timed + excluded.timed,
+    last_at = MAX(last_at, excluded.last_at)
+"""
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # With WAL, NORMAL only risks the last commits on power loss, never corruption
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def _rollup(rows: list) -> list:
+    """Fold a batch of answer rows into one topic_stats delta per (learner, exam, topic, difficulty)."""
+    deltas = {}
+    for learner, exam, topic, difficulty, _, _, _, is_correct, time_sec, answered_at in rows:
+        # Topics compare case-insensitively in the table, so fold them the same way here
+        key = (learner, exam, topic.lower(), difficulty)
+        d = deltas.get(key)
+        if d is None:
+            d = deltas[key] = [learner, exam, topic, difficulty, 0, 0, 0.0, 0, 0.0]
+        d[4] += 1
+        d[5] += is_correct
+        if time_sec is not None:
+            d[6] += time_sec
+            d[7] += 1
+        d[8] = max(d[8], answered_at)
+    return list(deltas.values())
+
+
+def _stats(answered, correct, time_total, timed) -> dict:
+    return {
+        "answered": answered,
+        "correct": correct,
+        "accuracy": round(100 * correct / answered, 1) if answered else 0.0,
+        "avg_time": round(time_total / timed, 1) if timed else None,
+    }
+
+
+class ProgressStore:
+    """Durable log of every answer, per learner, with per-topic rollups for dashboards.
+
+    `record` only queues the event; a writer thread commits queued events in batches, so the page
+    never waits on disk. Reads go through their own connection and, with WAL, never wait on the writer.
+    """
+
+    def __init__(self, path: str = PROGRESS_DB_PATH, flush_interval: float = PROGRESS_FLUSH_INTERVAL,
+                 batch_size: int = PROGRESS_BATCH):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._conn = _connect(path)
+        self._conn.executescript(_SCHEMA)
+        threading.Thread(target=self._write_forever, daemon=True, name="progress-writer").start()
+
+    # ---------- Writing ----------
+
+    def record(self, learner: str, entry: dict, answered_at: float = None):
+        """Queue one answer in the shape SessionHistory.append takes."""
+        self._queue.put((
+            learner, entry.get("exam", ""), (entry.get("topic") or "").strip(), entry.get("difficulty", ""),
+            entry.get("id"), entry.get("chosen"), entry.get("correct"), int(bool(entry.get("is_correct"))),
+            entry.get("time_sec"), answered_at or time.time(),
+        ))
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until everything queued so far is committed; False if that took longer than `timeout`."""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def _next_batch(self) -> tuple:
+        """(answer rows, flush events) once a batch is full, the interval has passed, or a flush asks for it."""
+        rows, waiters = [], []
+        item = self._queue.get()
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            if isinstance(item, threading.Event):
+                waiters.append(item)
+                return rows, waiters
+            rows.append(item)
+            timeout = deadline - time.monotonic()
+            if len(rows) >= self.batch_size or timeout <= 0:
+                return rows, waiters
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                return rows, waiters
+
+    def _write_forever(self):
+        conn = _connect(self.path)
+        while True:
+            rows, waiters = self._next_batch()
+            if rows:
+                try:
+                    with metrics.span("progress_write"), conn:
+                        conn.executemany(_INSERT_ANSWER, rows)
+                        conn.executemany(_UPSERT_STATS, _rollup(rows))
+                    metrics.inc("quiz_progress_answers_written_total", len(rows))
+                except sqlite3.Error:
+                    # Progress is a record for the learner; losing a batch must not take the quiz down
+                    metrics.inc("quiz_progress_write_errors_total")
+            for done in waiters:
+                done.set()
+
+    # ---------- Reading ----------
+
+    def _stats_where(self, learner: str, exam: str = None) -> tuple:
+        clauses, params = ["learner = ?"], [learner]
+        if exam:
+            clauses.append("exam = ?")
+            params.append(exam)
+        return " AND ".join(clauses), params
+
+    def summary(self, learner: str, exam: str = None) -> dict:
+        where, params = self._stats_where(learner, exam)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT SUM(answered), SUM(correct), SUM(time_total), SUM(timed) FROM topic_stats WHERE {where}",
+                params
+            ).fetchone()
+        return _stats(*(v or 0 for v in row))
+
+    def accuracy_by_topic(self, learner: str, exam: str = None) -> list:
+        """Answers, accuracy (percent) and average time per topic, most practised first."""
+        where, params = self._stats_where(learner, exam)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT topic, SUM(answered), SUM(correct), SUM(time_total), SUM(timed) FROM topic_stats "
+                f"WHERE {where} GROUP BY topic ORDER BY SUM(answered) DESC, topic",
+                params
+            ).fetchall()
+        return [dict(topic=topic, **_stats(*sums)) for topic, *sums in rows]
+
+    def weak_areas(self, learner: str, exam: str = None, min_answered: int = WEAK_MIN_ANSWERED,
+                   threshold: float = WEAK_ACCURACY, limit: int = 5) -> list:
+        """Practised topics below the accuracy threshold, weakest first."""
+        weak = [t for t in self.accuracy_by_topic(learner, exam)
+                if t["answered"] >= min_answered and t["accuracy"] < threshold]
+        return sorted(weak, key=lambda t: (t["accuracy"], -t["answered"]))[:limit]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_progress_store() -> ProgressStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ProgressStore()
+                # Commit what is still queued when the server shuts down
+                atexit.register(_store.flush, 5.0)
+    return _store
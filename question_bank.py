@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+BANK_PATH = os.getenv("QUESTION_BANK_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "question_bank.sqlite3"))
+SEED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "questions.json")
+
+# A bucket "runs low" for a learner when fewer than this many unseen questions remain in it
+BANK_LOW_WATER = int(os.getenv("QUESTION_BANK_LOW_WATER", "5"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    id          TEXT PRIMARY KEY,
+    track       TEXT NOT NULL,
+    category    TEXT NOT NULL COLLATE NOCASE,
+    difficulty  TEXT NOT NULL,
+    payload     TEXT NOT NULL,
+    created_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_questions_bucket ON questions (track, category, difficulty);
+CREATE INDEX IF NOT EXISTS idx_questions_track_difficulty ON questions (track, difficulty);
+"""
+
+
+def question_id(qd: dict) -> str:
+    stem = " ".join(str(qd.get("question", "")).lower().split())
+    return hashlib.sha1(stem.encode("utf-8")).hexdigest()[:16]
+
+
+class QuestionBank:
+    """On-disk store of validated questions, bucketed by (track, category, difficulty)."""
+
+    def __init__(self, path: str = BANK_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def add(self, track: str, category: str, difficulty: str, qd: dict) -> str:
+        qid = qd.get("id") or question_id(qd)
+        # Rendered HTML is per-shuffle and cheap to rebuild, so only the source text is stored
+        payload = {k: v for k, v in qd.items() if k not in ("id", "rendered")}
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO questions (id, track, category, difficulty, payload, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (qid, track, category.strip(), difficulty, json.dumps(payload), time.time())
+            )
+        return qid
+
+    def _bucket_where(self, track, category, difficulty, seen):
+        clauses, params = ["track = ?", "difficulty = ?"], [track, difficulty]
+        if category:
+            clauses.append("category = ?")
+            params.append(category.strip())
+        if seen:
+            clauses.append(f"id NOT IN ({','.join('?' * len(seen))})")
+            params.extend(seen)
+        return " AND ".join(clauses), params
+
+    def take(self, track: str, category: str, difficulty: str, seen=()):
+        where, params = self._bucket_where(track, category, difficulty, list(seen))
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT id, payload FROM questions WHERE {where} ORDER BY RANDOM() LIMIT 1", params
+            ).fetchone()
+        if row is None:
+            return None
+        qd = json.loads(row[1])
+        qd["id"] = row[0]
+        return qd
+
+    def get(self, qid: str):
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM questions WHERE id = ?", (qid,)).fetchone()
+        if row is None:
+            return None
+        qd = json.loads(row[0])
+        qd["id"] = qid
+        return qd
+
+    def update_details(self, qid: str, explanation: str, rationales: dict):
+        """Store second-phase text on a banked question; `rationales` use the letters it was banked with."""
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT payload FROM questions WHERE id = ?", (qid,)).fetchone()
+            if row is None:
+                return
+            payload = dict(json.loads(row[0]), explanation=explanation, rationales=rationales)
+            self._conn.execute("UPDATE questions SET payload = ? WHERE id = ?", (json.dumps(payload), qid))
+
+    def count_unseen(self, track: str, category: str, difficulty: str, seen=()) -> int:
+        where, params = self._bucket_where(track, category, difficulty, list(seen))
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM questions WHERE {where}", params).fetchone()[0]
+
+    def stems(self, track: str, category: str) -> list:
+        """(id, question stem) for every difficulty in a bucket, for building the similarity index."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, payload FROM questions WHERE track = ? AND category = ?", (track, category.strip())
+            ).fetchall()
+        return [(qid, json.loads(payload).get("question", "")) for qid, payload in rows]
+
+    def load_seed_file(self, path: str = SEED_PATH):
+        if not os.path.exists(path):
+            return
+        with open(path, encoding="utf-8") as f:
+            items = json.load(f)
+        for item in items:
+            meta = {k: item.pop(k, None) for k in ("track", "category", "difficulty")}
+            item.setdefault("rationales", {"A": "", "B": "", "C": "", "D": ""})
+            self.add(meta["track"] or "PMP", meta["category"] or "General", meta["difficulty"] or "Easy", item)
+
+
+_bank = None
+_bank_lock = threading.Lock()
+
+
+def get_bank() -> QuestionBank:
+    global _bank
+    if _bank is None:
+        with _bank_lock:
+            if _bank is None:
+                bank = QuestionBank()
+                bank.load_seed_file()
+                _bank = bank
+    return _bank
@@ -0,0 +1,162 @@
+import os
+import mmap
+import random
+import struct
+import threading
+
+from question_parser import LETTERS
+
+QUESTION_PACK_PATH = os.getenv("QUESTION_PACK_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "questions.pack"))
+# Random draws per pull before giving up on a cell whose questions the learner has mostly seen
+PACK_DRAW_TRIES = 8
+
+# Layout, all little-endian:
+#   header     magic, cell/question/string counts, and the byte offset of each section below
+#   cells      one fixed-width row per (track, category, difficulty): three string ids, first question, count
+#   questions  one fixed-width row per question: a string id per field, grouped by cell
+#   offsets    n_strings + 1 u64 offsets into the string data; string i is data[offsets[i]:offsets[i + 1]]
+#   strings    UTF-8 text, each distinct string stored once
+MAGIC = b"QPACK001"
+_HEADER = struct.Struct("<8sIIIQQQQ")
+_CELL = struct.Struct("<5I")
+_QUESTION_FIELDS = ("id", "category", "question", *(f"choice_{L}" for L in LETTERS), "correct", "explanation",
+                    *(f"rationale_{L}" for L in LETTERS))
+_QUESTION = struct.Struct(f"<{len(_QUESTION_FIELDS)}I")
+_OFFSET = struct.Struct("<Q")
+
+
+def cell_key(track: str, category: str, difficulty: str) -> tuple:
+    return (track, category.strip().lower(), difficulty)
+
+
+def write_pack(path: str, cells: dict):
+    """Write {(track, category, difficulty): [question dicts with "id"]} as a pack, replacing `path` atomically."""
+    strings, string_ids = [], {}
+
+    def sid(text) -> int:
+        text = str(text or "")
+        if text not in string_ids:
+            string_ids[text] = len(strings)
+            strings.append(text.encode("utf-8"))
+        return string_ids[text]
+
+    cell_rows, question_rows = [], []
+    for (track, category, difficulty) in sorted(cells, key=lambda k: cell_key(*k)):
+        questions = cells[(track, category, difficulty)]
+        cell_rows.append((sid(track), sid(category), sid(difficulty), len(question_rows), len(questions)))
+        for qd in questions:
+            rationales = qd.get("rationales") or {}
+            question_rows.append((
+                sid(qd["id"]), sid(category), sid(qd["question"]), *(sid(qd["choices"][L]) for L in LETTERS),
+                sid(qd["correct"]), sid(qd.get("explanation")), *(sid(rationales.get(L)) for L in LETTERS),
+            ))
+
+    cells_at = _HEADER.size
+    questions_at = cells_at + len(cell_rows) * _CELL.size
+    offsets_at = questions_at + len(question_rows) * _QUESTION.size
+    strings_at = offsets_at + (len(strings) + 1) * _OFFSET.size
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, len(cell_rows), len(question_rows), len(strings),
+                             cells_at, questions_at, offsets_at, strings_at))
+        f.writelines(_CELL.pack(*row) for row in cell_rows)
+        f.writelines(_QUESTION.pack(*row) for row in question_rows)
+        offset = 0
+        for data in strings:
+            f.write(_OFFSET.pack(offset))
+            offset += len(data)
+        f.write(_OFFSET.pack(offset))
+        f.writelines(strings)
+    os.replace(tmp, path)
+
+
+class QuestionPack:
+    """Read-only view of a pack file through mmap.
+
+    Only the small cell table is read up front; a question is decoded from its fixed-width row when
+    it is drawn, so every server process shares the OS page cache instead of holding the corpus.
+    """
+
+    def __init__(self, path: str = QUESTION_PACK_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n_cells, self.n_questions, self.n_strings, cells_at, self._questions_at, self._offsets_at, \
+            self._strings_at = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a question pack")
+        # cell key -> (first question, count); (track, difficulty) -> cells, for a blank topic
+        self.cells = {}
+        self._by_level = {}
+        for i in range(n_cells):
+            track, category, difficulty, first, count = _CELL.unpack_from(self._mm, cells_at + i * _CELL.size)
+            track, difficulty = self.string(track), self.string(difficulty)
+            span = (first, count)
+            self.cells[cell_key(track, self.string(category), difficulty)] = span
+            self._by_level.setdefault((track, difficulty), []).append(span)
+
+    def string(self, sid: int) -> str:
+        start, end = struct.unpack_from("<QQ", self._mm, self._offsets_at + sid * _OFFSET.size)
+        return self._mm[self._strings_at + start:self._strings_at + end].decode("utf-8")
+
+    def _row(self, i: int) -> tuple:
+        return _QUESTION.unpack_from(self._mm, self._questions_at + i * _QUESTION.size)
+
+    def question(self, i: int) -> dict:
+        row = dict(zip(_QUESTION_FIELDS, map(self.string, self._row(i))))
+        return {
+            "id": row["id"],
+            "category": row["category"],
+            "question": row["question"],
+            "choices": {L: row[f"choice_{L}"] for L in LETTERS},
+            "correct": row["correct"],
+            "explanation": row["explanation"],
+            "rationales": {L: row[f"rationale_{L}"] for L in LETTERS},
+        }
+
+    def _spans(self, track: str, category: str, difficulty: str) -> list:
+        if category and category.strip():
+            span = self.cells.get(cell_key(track, category, difficulty))
+            return [span] if span else []
+        return self._by_level.get((track, difficulty), [])
+
+    def count(self, track: str, category: str, difficulty: str) -> int:
+        """Questions for a selection; a blank category counts every category of the track."""
+        return sum(count for _, count in self._spans(track, category, difficulty))
+
+    def take(self, track: str, category: str, difficulty: str, exclude=()):
+        """A random question for the selection whose id is not in `exclude`, or None."""
+        spans = self._spans(track, category, difficulty)
+        total = sum(count for _, count in spans)
+        for _ in range(min(PACK_DRAW_TRIES, total)):
+            # Uniform over the selection's questions: pick a position, then find its cell
+            pos = random.randrange(total)
+            for first, count in spans:
+                if pos < count:
+                    break
+                pos -= count
+            i = first + pos
+            # Check the id before decoding the rest of the row
+            if self.string(self._row(i)[0]) not in exclude:
+                return self.question(i)
+        return None
+
+    def __len__(self):
+        return self.n_questions
+
+
+_pack = None
+_pack_lock = threading.Lock()
+_pack_loaded = False
+
+
+def get_pack():
+    """The process-wide pack, or None when no pack file has been built."""
+    global _pack, _pack_loaded
+    if not _pack_loaded:
+        with _pack_lock:
+            if not _pack_loaded:
+                if os.path.exists(QUESTION_PACK_PATH):
+                    _pack = QuestionPack(QUESTION_PACK_PATH)
+                _pack_loaded = True
+    return _pack
@@ -0,0 +1,304 @@
+import re
+import json
+
+LETTERS = ("A", "B", "C", "D")
+# Candidate cut points tried when closing a truncated completion; bounds repair to a few json.loads calls
+MAX_TRUNCATION_CUTS = 8
+
+_CODE_FENCE_RE = re.compile(r"```(?:json)?|```")
+_LETTER_RE = re.compile(r"^(?:(?:option|answer|choice)\s+)?\(?([A-Da-d])\)?(?:[.):\s-]|$)", re.IGNORECASE)
+_SMART_QUOTES = "\u201c\u201d\u201e"
+_STRING_END_RE = re.compile(r"\s*(?:[,:}\]]|$)")
+_STRING_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+
+class QuestionFormatError(ValueError):
+    """A completion that can't be turned into a usable question without asking the model again.
+
+    `fields` lists only what is unrecoverable; `partial` holds the normalized fields that were fine.
+    """
+
+    def __init__(self, fields: list, partial: dict = None):
+        super().__init__(f"Unusable question fields: {', '.join(fields)}")
+        self.fields = fields
+        self.partial = partial or {}
+
+
+def iter_json_objects(chunks):
+    """Yield the text of each top-level {...} object as soon as its closing brace streams in.
+
+    Single pass over the stream; brace depth and string/escape state carry across chunk
+    boundaries, so braces inside strings and chatter between objects are ignored.
+    """
+    pieces = []
+    depth, in_string, escaped = 0, False, False
+    for chunk in chunks:
+        start = 0 if depth else None
+        for i, ch in enumerate(chunk):
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif ch == "\\":
+                    escaped = True
+                elif ch == '"':
+                    in_string = False
+            elif ch == '"':
+                in_string = depth > 0
+            elif ch == "{":
+                if depth == 0:
+                    start = i
+                depth += 1
+            elif ch == "}" and depth:
+                depth -= 1
+                if depth == 0:
+                    pieces.append(chunk[start:i + 1])
+                    yield "".join(pieces)
+                    pieces, start = [], None
+        if depth and start is not None:
+            pieces.append(chunk[start:])
+
+
+class StemWatcher:
+    """Pulls the "question" value out of a JSON completion while it is still streaming."""
+
+    _KEY = re.compile(r'"question"\s*:\s*"')
+    _ESCAPES = {"n": " ", "t": " ", "r": "", '"': '"', "\\": "\\", "/": "/"}
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.stem = ""
+        self.done = False
+        self._head = ""
+        self._in_value = False
+        self._escape = None
+
+    def feed(self, chunk: str):
+        if self.done:
+            return
+        if not self._in_value:
+            self._head += chunk
+            m = self._KEY.search(self._head)
+            if not m:
+                # Keep a short tail in case the key is split across chunks
+                self._head = self._head[-32:]
+                return
+            chunk, self._head, self._in_value = self._head[m.end():], "", True
+        out = []
+        for ch in chunk:
+            if self._escape is not None:
+                if self._escape.startswith("u"):
+                    self._escape += ch
+                    if len(self._escape) == 5:
+                        out.append(chr(int(self._escape[1:], 16)))
+                        self._escape = None
+                elif ch == "u":
+                    self._escape = "u"
+                else:
+                    out.append(self._ESCAPES.get(ch, ch))
+                    self._escape = None
+            elif ch == "\\":
+                self._escape = ""
+            elif ch == '"':
+                self.done = True
+                break
+            else:
+                out.append(ch)
+        self.stem += "".join(out)
+
+
+def _drop_trailing_comma(out: list):
+    i = len(out) - 1
+    while i >= 0 and out[i].isspace():
+        i -= 1
+    if i >= 0 and out[i] == ",":
+        del out[i:]
+
+
+def repair_json(text: str):
+    """Best-effort parse of one slightly broken JSON object; returns None if it can't be saved.
+
+    One pass rewrites smart-quote delimiters, unescaped quotes and raw newlines inside strings,
+    trailing commas and mismatched closers. If the text was cut off, the open string and containers are closed, falling
+    back to the last few safe cut points (after a comma or a closed value) until something parses.
+    """
+    out, stack, cuts = [], [], []
+    in_string = escaped = smart = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                out.append(ch)
+                escaped = False
+            elif ch == "\\":
+                out.append(ch)
+                escaped = True
+            elif ch == '"' or (smart and ch in _SMART_QUOTES):
+                # An unescaped quote only ends the string if JSON structure follows it;
+                # otherwise it is a quote mark inside the text
+                if (ch == '"') == (not smart) and _STRING_END_RE.match(text, i + 1):
+                    out.append('"')
+                    in_string = False
+                else:
+                    out.append('\\"')
+            else:
+                out.append(_STRING_ESCAPES.get(ch, ch))
+            continue
+        if ch == '"' or ch in _SMART_QUOTES:
+            in_string, smart = True, ch != '"'
+            out.append('"')
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            out.append(ch)
+            cuts.append((len(out), tuple(stack)))
+        elif ch in "}]":
+            if not stack:
+                continue
+            _drop_trailing_comma(out)
+            out.append(stack.pop())
+            if not stack:
+                break  # object complete; anything after it is chatter
+            cuts.append((len(out), tuple(stack)))
+        elif ch == ",":
+            cuts.append((len(out), tuple(stack)))
+            out.append(ch)
+        else:
+            out.append(ch)
+
+    if in_string:
+        if escaped:
+            out.pop()
+        out.append('"')
+    _drop_trailing_comma(out)
+    attempts = ["".join(out) + "".join(reversed(stack))]
+    if stack:
+        for pos, open_stack in reversed(cuts[-MAX_TRUNCATION_CUTS:]):
+            attempts.append("".join(out[:pos]) + "".join(reversed(open_stack)))
+    for candidate in attempts:
+        try:
+            data = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(data, dict):
+            return data
+    return None
+
+
+def extract_json_object(raw_text: str) -> dict:
+    """Find the question object in a completion, tolerating chatter, code fences and broken JSON."""
+    text = _CODE_FENCE_RE.sub("", str(raw_text))
+    fallback = None
+    for candidate in iter_json_objects([text]):
+        try:
+            data = json.loads(candidate)
+        except ValueError:
+            data = repair_json(candidate)
+        if isinstance(data, dict):
+            if "question" in data or "choices" in data:
+                return data
+            if fallback is None:
+                fallback = data
+    if fallback is not None:
+        return fallback
+    # No balanced object at all: most likely the completion was cut off
+    start = text.find("{")
+    data = repair_json(text[start:]) if start != -1 else None
+    if data is None:
+        raise ValueError("Failed to extract JSON")
+    return data
+
+
+def _normalize_letter(value, choices: dict):
+    if isinstance(value, str):
+        v = value.strip()
+        # The model sometimes answers with the choice text instead of its letter
+        for letter, text in choices.items():
+            if v and v.lower() == text.lower():
+                return letter
+        m = _LETTER_RE.match(v)
+        if m:
+            return m.group(1).upper()
+    return None
+
+
+def _keyed_by_letter(raw) -> dict:
+    if isinstance(raw, list):
+        return {letter: value for letter, value in zip(LETTERS, raw)}
+    if isinstance(raw, dict):
+        keyed = {}
+        for key, value in raw.items():
+            letter = _normalize_letter(str(key), {})
+            if letter and letter not in keyed:
+                keyed[letter] = value
+        return keyed
+    return {}
+
+
+def _normalize_choices(raw):
+    keyed = _keyed_by_letter(raw)
+    choices = {}
+    for letter in LETTERS:
+        text = str(keyed.get(letter) or "").strip()
+        # "A": "A. Option text" -> "Option text"
+        text = re.sub(rf"^{letter}[.)]\s+", "", text)
+        if not text:
+            return None
+        choices[letter] = text
+    return choices
+
+
+def normalize_question(data) -> dict:
+    """Validate against the generate_prompt schema, fixing what can be fixed locally.
+
+    Missing explanation/rationales are filled with blanks, choices may come as a list or with
+    "A."-style prefixes, and `correct` may be "b", "Option B" or the choice text. A missing stem,
+    choice set or answer key raises QuestionFormatError naming just those fields.
+    """
+    if isinstance(data, dict) and "question" not in data and len(data) == 1:
+        # Unwrap {"item": {...}}-style wrappers
+        inner = next(iter(data.values()))
+        if isinstance(inner, dict):
+            data = inner
+    if not isinstance(data, dict):
+        raise QuestionFormatError(["question", "choices", "correct"])
+
+    partial, bad = {}, []
+    question = data.get("question")
+    if isinstance(question, str) and question.strip():
+        partial["question"] = question.strip()
+    else:
+        bad.append("question")
+    choices = _normalize_choices(data.get("choices"))
+    if choices:
+        partial["choices"] = choices
+    else:
+        bad.append("choices")
+
+    explanation = data.get("explanation")
+    partial["explanation"] = explanation.strip() if isinstance(explanation, str) else ""
+    rationales = _keyed_by_letter(data.get("rationales"))
+    partial["rationales"] = {letter: str(rationales.get(letter) or "").strip() for letter in LETTERS}
+
+    correct = _normalize_letter(data.get("correct"), choices or {}) if choices else None
+    if correct:
+        partial["correct"] = correct
+    else:
+        bad.append("correct")
+
+    if bad:
+        raise QuestionFormatError(bad, partial)
+    return partial
+
+
+def normalize_details(data) -> dict:
+    """Validate a second-phase {"explanation", "rationales"} object; raises QuestionFormatError if it has no explanation."""
+    if not isinstance(data, dict):
+        raise QuestionFormatError(["explanation"])
+    explanation = data.get("explanation")
+    if not isinstance(explanation, str) or not explanation.strip():
+        raise QuestionFormatError(["explanation"])
+    rationales = _keyed_by_letter(data.get("rationales"))
+    return {
+        "explanation": explanation.strip(),
+        "rationales": {letter: str(rationales.get(letter) or "").strip() for letter in LETTERS},
+    }
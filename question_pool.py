@@ -0,0 +1,107 @@
+import os
+import time
+import threading
+from collections import OrderedDict, deque
+
+import metrics
+
+# In-memory tier in front of the SQLite bank: recently generated questions, shared by every session
+QUESTION_POOL_SIZE = int(os.getenv("QUESTION_POOL_SIZE", "50"))        # questions kept per bucket
+QUESTION_POOL_BUCKETS = int(os.getenv("QUESTION_POOL_BUCKETS", "256"))  # buckets kept, least recently used dropped
+QUESTION_POOL_TTL = float(os.getenv("QUESTION_POOL_TTL", "3600"))       # seconds a question stays servable
+
+metrics.describe("quiz_question_pool_lookups_total", "Shared question pool lookups, by result (hit or miss).")
+metrics.describe("quiz_question_pool_evictions_total", "Questions dropped from the shared pool, by reason.")
+
+
+def pool_key(track_key: str, topic: str, level: str) -> tuple:
+    return (track_key, (topic or "").strip().lower(), level)
+
+
+class QuestionPool:
+    """Process-wide pools of validated questions keyed by (track, normalized topic, difficulty).
+
+    Questions are not consumed when served: every session may get each one once, which its own
+    SeenQuestions enforces. Buckets are evicted least-recently-used and questions expire after a TTL.
+    """
+
+    def __init__(self, size: int = QUESTION_POOL_SIZE, buckets: int = QUESTION_POOL_BUCKETS,
+                 ttl: float = QUESTION_POOL_TTL):
+        self.size = size
+        self.max_buckets = buckets
+        self.ttl = ttl
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _bucket(self, key: tuple) -> deque:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = deque(maxlen=self.size)
+            while len(self._buckets) > self.max_buckets:
+                _, dropped = self._buckets.popitem(last=False)
+                metrics.inc("quiz_question_pool_evictions_total", len(dropped), reason="lru")
+        self._buckets.move_to_end(key)
+        return bucket
+
+    def add(self, track_key: str, category: str, level: str, qd: dict):
+        """Offer a freshly generated question to learners of its category and to random-topic learners."""
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            for key in {pool_key(track_key, category, level), pool_key(track_key, "", level)}:
+                bucket = self._bucket(key)
+                if len(bucket) == bucket.maxlen:
+                    metrics.inc("quiz_question_pool_evictions_total", reason="full")
+                bucket.append((expires, qd))
+
+    def _expire(self, bucket: deque, now: float):
+        # Entries are appended in expiry order, so expired ones are always at the left
+        while bucket and bucket[0][0] <= now:
+            bucket.popleft()
+            metrics.inc("quiz_question_pool_evictions_total", reason="ttl")
+
+    def take(self, track_key: str, topic: str, level: str, seen=None):
+        """Newest question in the bucket this learner hasn't seen (or seen a reworded copy of), else None."""
+        key = pool_key(track_key, topic, level)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            candidates = []
+            if bucket is not None:
+                self._buckets.move_to_end(key)
+                self._expire(bucket, time.monotonic())
+                candidates = [qd for _, qd in reversed(bucket) if seen is None or qd.get("id") not in seen]
+        # Near-duplicate checks hash the stem, so run them outside the lock and only as far as needed
+        for qd in candidates:
+            if seen is None or not seen.has(qd):
+                self._record(True)
+                # Sessions store and annotate what they are served; give each its own dict
+                return dict(qd)
+        self._record(False)
+        return None
+
+    def _record(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        metrics.inc("quiz_question_pool_lookups_total", result="hit" if hit else "miss")
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> QuestionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = QuestionPool()
+    return _pool
@@ -0,0 +1,703 @@
+import os
+import json
+import time
+import uuid
+import random
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from functools import lru_cache
+
+import metrics
+from groq_client import call_groq, client_scope, current_client, stream_groq
+from dedup import SeenQuestions, get_shared_index
+from question_bank import get_bank, question_id
+from question_pack import get_pack
+from question_pool import get_pool
+from question_parser import (
+    QuestionFormatError, StemWatcher, extract_json_object, iter_json_objects, normalize_details, normalize_question,
+    repair_json
+)
+from sanitize import render_question
+
+metrics.describe("quiz_parse_failures_total", "Completions or batch items that could not be used as a question, by kind.")
+
+# Bank draws rejected as near-repeats of something the learner saw before giving up on the bank
+BANK_REPEAT_TRIES = 3
+
+# Full regenerations allowed when the stem or choices come back unusable
+PARSE_RETRIES = 1
+
+# Generate the stem, choices and key first and fetch the explanation and rationales in a second call,
+# so a question can be shown before its (much longer) rationale text is written
+TWO_PHASE_GENERATION = os.getenv("TWO_PHASE_GENERATION", "1") != "0"
+DETAILS_WORKERS = int(os.getenv("DETAILS_WORKERS", "4"))
+# Seconds the result screen waits for a question's explanation before showing it without one
+DETAILS_TIMEOUT = float(os.getenv("DETAILS_TIMEOUT", "20"))
+# Questions per second-phase completion when many are asked for at once (e.g. a finished mock exam)
+DETAILS_BATCH = 8
+# A question whose second phase failed isn't asked for again until this many seconds have passed
+DETAILS_RETRY_AFTER = float(os.getenv("DETAILS_RETRY_AFTER", "60"))
+# Finished second phases remembered per process, for questions the bank doesn't hold (near-duplicates)
+DETAILS_MEMORY = 4096
+
+metrics.describe("quiz_details_total", "Second-phase explanation requests, by result.")
+
+
+# ---------- LLM plumbing ----------
+@metrics.timed("shuffle_answers")
+def shuffle_answers(data: dict) -> dict:
+    choices = data.get("choices", {}) or {}
+    correct_letter = data.get("correct")
+    rationales = data.get("rationales", {}) or {}
+
+    original_items = list(choices.items())
+    random.shuffle(original_items)
+
+    new_labels = ["A", "B", "C", "D"]
+    new_choices, new_rationales = {}, {}
+    new_correct_letter = "A"
+
+    for i, (old_label, text) in enumerate(original_items):
+        nl = new_labels[i]
+        new_choices[nl] = text
+        new_rationales[nl] = rationales.get(old_label, "")
+        if old_label == correct_letter:
+            new_correct_letter = nl
+
+    data["choices"] = new_choices
+    data["rationales"] = new_rationales
+    data["correct"] = new_correct_letter
+    return data
+
+def difficulty_instructions(level: str) -> str:
+    if level == "Easy":
+        return ("Prefer foundational knowledge, definitions, and straightforward scenarios. "
+                "Avoid deep ambiguity. One clearly best answer.")
+    if level == "Hard":
+        return ("Use complex, realistic scenarios with competing constraints and multiple plausible options. "
+                "Require judgment to select the best right answer. Distractors must be strong.")
+    return ("Use situational questions with moderate complexity that test application of concepts, "
+            "stakeholder analysis, sequencing, and change control without excess ambiguity.")
+
+# ---------- Exam configs ----------
+EXAM_TRACKS = {
+    "PMP": {
+        "display": "PMP",
+        "topic_label": "Topic",
+        "topic_placeholder": "Type a PMP topic (or leave blank for random)",
+        "default_categories": [
+            "Project Integration Management",
+            "Project Scope Management",
+            "Project Schedule Management",
+            "Critical Path analysis",
+            "Project Cost Management",
+            "Earned Value Management",
+            "Project Quality Management",
+            "Project Resource Management",
+            "Project Communications Management",
+            "Project Risk Management",
+            "Project Procurement Management",
+            "Project Stakeholder Management",
+            "Agile and Hybrid approaches",
+            "Change control",
+            "Leadership and team development",
+            "Conflict resolution",
+            "Governance and compliance"
+        ],
+        "prompt_variants": [
+            "Generate a PMP exam-style scenario question from the domain: {selected}.",
+            "Write a realistic PMP scenario-based question focused on: {selected}.",
+            "Create a unique PMP exam question related to: {selected}."
+        ],
+        "scope_rule": "The scenario must align ONLY with PMP content and the selected domain.",
+        # Full mock exam: question count and (domain, weight, categories) per the exam content outline
+        "exam_questions": 180,
+        "exam_domains": [
+            ("People", 0.42, [
+                "Project Resource Management",
+                "Project Communications Management",
+                "Project Stakeholder Management",
+                "Leadership and team development",
+                "Conflict resolution"
+            ]),
+            ("Process", 0.50, [
+                "Project Integration Management",
+                "Project Scope Management",
+                "Project Schedule Management",
+                "Critical Path analysis",
+                "Project Cost Management",
+                "Earned Value Management",
+                "Project Quality Management",
+                "Project Risk Management",
+                "Project Procurement Management",
+                "Agile and Hybrid approaches",
+                "Change control"
+            ]),
+            ("Business Environment", 0.08, [
+                "Governance and compliance"
+            ])
+        ]
+    },
+    "CAPM": {
+        "display": "CAPM",
+        "topic_label": "Topic",
+        "topic_placeholder": "Type a CAPM topic (or leave blank for random)",
+        "default_categories": [
+            "Project Integration Management fundamentals",
+            "Project Scope Management fundamentals",
+            "Project Schedule Management fundamentals",
+            "Project Cost Management fundamentals",
+            "Project Quality Management fundamentals",
+            "Project Resource Management fundamentals",
+            "Project Communications Management fundamentals",
+            "Project Risk Management fundamentals",
+            "Project Procurement Management fundamentals",
+            "Project Stakeholder Management fundamentals",
+            "Work Breakdown Structure concepts",
+            "Requirements and scope baseline",
+            "Schedule basics and sequencing",
+            "Cost baseline and budgeting basics",
+            "Quality assurance versus quality control",
+            "Risk register basics and responses",
+            "Change control fundamentals",
+            "Issue management fundamentals",
+            "Basic governance and roles",
+            "Agile and Hybrid fundamentals"
+        ],
+        "prompt_variants": [
+            "Generate a CAPM exam-style question focused on: {selected}.",
+            "Write a CAPM knowledge check question about: {selected}.",
+            "Create a CAPM practice question related to: {selected}."
+        ],
+        "scope_rule": "The question must align ONLY with CAPM-level concepts and the selected topic.",
+        "exam_questions": 150,
+        "exam_domains": [
+            ("Project Management Fundamentals and Core Concepts", 0.36, [
+                "Project Integration Management fundamentals",
+                "Project Quality Management fundamentals",
+                "Project Resource Management fundamentals",
+                "Project Communications Management fundamentals",
+                "Project Risk Management fundamentals",
+                "Project Stakeholder Management fundamentals",
+                "Quality assurance versus quality control",
+                "Risk register basics and responses",
+                "Issue management fundamentals",
+                "Basic governance and roles"
+            ]),
+            ("Predictive, Plan-Based Methodologies", 0.17, [
+                "Project Schedule Management fundamentals",
+                "Project Cost Management fundamentals",
+                "Project Procurement Management fundamentals",
+                "Work Breakdown Structure concepts",
+                "Schedule basics and sequencing",
+                "Cost baseline and budgeting basics",
+                "Change control fundamentals"
+            ]),
+            ("Agile Frameworks/Methodologies", 0.20, [
+                "Agile and Hybrid fundamentals"
+            ]),
+            ("Business Analysis Frameworks", 0.27, [
+                "Project Scope Management fundamentals",
+                "Requirements and scope baseline"
+            ])
+        ]
+    },
+    "DASM": {
+        "display": "DASM",
+        "topic_label": "Focus Area",
+        "topic_placeholder": "Type a Scrum or Disciplined Agile focus area (or leave blank for random)",
+        "default_categories": [
+            "Scrum roles, events, and artifacts",
+            "Sprint Planning, Daily Scrum, Sprint Review, Sprint Retrospective",
+            "Backlog refinement and prioritization",
+            "Definition of Done and acceptance criteria",
+            "Servant leadership behaviors",
+            "Facilitation and coaching techniques",
+            "Impediment removal and escalation",
+            "Team norms and working agreements",
+            "Agile estimation such as story points and relative sizing",
+            "Flow concepts and limiting work in progress",
+            "Disciplined Agile mindset and principles",
+            "Choosing and tailoring an approach based on context",
+            "Agile metrics such as velocity and cycle time",
+            "Conflict resolution in Agile teams"
+        ],
+        "prompt_variants": [
+            "Generate a Scrum and Disciplined Agile question focused on: {selected}.",
+            "Write a scenario-based question for a Scrum Master candidate about: {selected}.",
+            "Create a knowledge check question aligned to Scrum and Disciplined Agile on: {selected}."
+        ],
+        "scope_rule": "The scenario must align ONLY with Scrum and Disciplined Agile content and the selected focus area.",
+        # No published domain split: categories are weighted evenly
+        "exam_questions": 50,
+        "exam_domains": None
+    },
+    "PMI-ACP": {
+        "display": "PMI-ACP",
+        "topic_label": "Domain",
+        "topic_placeholder": "Type a PMI-ACP domain or technique (or leave blank for random)",
+        "default_categories": [
+            "Agile principles and mindset",
+            "Value-driven delivery",
+            "Stakeholder engagement in Agile",
+            "Adaptive planning",
+            "Problem detection and resolution",
+            "Continuous improvement",
+            "Agile project estimation",
+            "Risk management in Agile environments",
+            "Team performance and collaboration",
+            "Agile coaching and facilitation",
+            "Scaling Agile considerations",
+            "Hybrid delivery considerations",
+            "Agile metrics and information radiators"
+        ],
+        "prompt_variants": [
+            "Generate a PMI-ACP style scenario question focused on: {selected}.",
+            "Write a realistic Agile scenario question aligned to PMI-ACP on: {selected}.",
+            "Create a PMI-ACP exam-style question related to: {selected}."
+        ],
+        "scope_rule": "The scenario must align ONLY with PMI-ACP and Agile practices relevant to the selected domain.",
+        "exam_questions": 120,
+        "exam_domains": [
+            ("Mindset", 0.28, [
+                "Agile principles and mindset",
+                "Continuous improvement",
+                "Scaling Agile considerations",
+                "Hybrid delivery considerations"
+            ]),
+            ("Leadership", 0.25, [
+                "Stakeholder engagement in Agile",
+                "Team performance and collaboration",
+                "Agile coaching and facilitation"
+            ]),
+            ("Product", 0.19, [
+                "Value-driven delivery",
+                "Adaptive planning",
+                "Agile project estimation"
+            ]),
+            ("Delivery", 0.28, [
+                "Problem detection and resolution",
+                "Risk management in Agile environments",
+                "Agile metrics and information radiators"
+            ])
+        ]
+    }
+}
+
+def get_track_config(track_key: str) -> dict:
+    return EXAM_TRACKS.get(track_key, EXAM_TRACKS["PMP"])
+
+def pick_category(track_key: str, topic: str) -> str:
+    if topic and topic.strip():
+        return topic.strip()
+    return random.choice(get_track_config(track_key)["default_categories"])
+
+# ---------- Prompt generation ----------
+QUESTION_SCHEMA = """{
+  "question": "Your question here",
+  "choices": {
+    "A": "Option A",
+    "B": "Option B",
+    "C": "Option C",
+    "D": "Option D"
+  },
+  "correct": "B",
+  "explanation": "Reasoning only. Do not mention which option is correct.",
+  "rationales": {
+    "A": "Reason for A.",
+    "B": "Reason for B.",
+    "C": "Reason for C.",
+    "D": "Reason for D."
+  }
+}"""
+
+DETAILS_SCHEMA = """{
+  "explanation": "Reasoning only. Do not mention which option is correct.",
+  "rationales": {
+    "A": "Reason for A.",
+    "B": "Reason for B.",
+    "C": "Reason for C.",
+    "D": "Reason for D."
+  }
+}"""
+
+# Appended to first-phase requests; the system prompt keeps the full schema so its cached prefix is shared
+KEY_ONLY_RULE = 'Include only "question", "choices" and "correct"; the explanation and rationales are requested separately.'
+
+@lru_cache(maxsize=None)
+def system_prompt(track_key: str, level: str) -> str:
+    """Everything that is fixed for a (track, difficulty), assembled once.
+
+    Kept byte-identical across calls and sent first so the provider can reuse its cached prefix;
+    anything that varies per call belongs in the user message.
+    """
+    cfg = get_track_config(track_key)
+    return f"""You write {cfg["display"]} exam questions.
+Avoid repetitive structures such as 'You are a project manager and you have a problem.'
+Vary scenario type, tone, setting, and narrative style. Make the structure different from previous typical exam questions.
+Difficulty guidance: {difficulty_instructions(level)}
+
+Every question is a JSON object in this schema:
+{QUESTION_SCHEMA}
+
+Rules:
+- Return ONLY valid JSON, with no prose or code fences.
+- 'correct' must be A, B, C, or D.
+- Explanation must NOT refer to the correct letter.
+- {cfg["scope_rule"]}
+- Each scenario must align ONLY with the domain or focus area it was asked for."""
+
+def _messages(track_key: str, level: str, request: str) -> list:
+    return [
+        {"role": "system", "content": system_prompt(track_key, level)},
+        {"role": "user", "content": f"{request}\nSession: {uuid.uuid4()}"},
+    ]
+
+@metrics.timed("generate_prompt")
+def generate_prompt(track_key: str, topic: str, level: str) -> list:
+    cfg = get_track_config(track_key)
+    selected = pick_category(track_key, topic)
+    topic_prompt = random.choice(cfg["prompt_variants"]).format(selected=selected)
+    request = f"{topic_prompt}\nReturn a single JSON object."
+    if TWO_PHASE_GENERATION:
+        request += f"\n{KEY_ONLY_RULE}"
+    return _messages(track_key, level, request)
+
+@metrics.timed("generate_batch_prompt")
+def generate_batch_prompt(track_key: str, categories: list, level: str) -> list:
+    topic_lines = "\n".join(f"{i}. {c}" for i, c in enumerate(categories, start=1))
+    request = f"""Write {len(categories)} separate exam questions, one for each of these domains or focus areas, in this order:
+{topic_lines}
+No two questions in the set may share a scenario or structure.
+Return a JSON array of {len(categories)} objects."""
+    if TWO_PHASE_GENERATION:
+        request += f"\n{KEY_ONLY_RULE}"
+    return _messages(track_key, level, request)
+
+@metrics.timed("generate_details_prompt")
+def generate_details_prompt(track_key: str, level: str, questions: list) -> list:
+    items = [{"question": q["question"], "choices": q["choices"], "correct": q["correct"]} for q in questions]
+    return _messages(track_key, level, f"""For each of these {len(items)} questions, in order, explain why the keyed answer is best and give a rationale for every option:
+{json.dumps(items, indent=2)}
+Return a JSON array of {len(items)} objects in this schema:
+{DETAILS_SCHEMA}""")
+
+@metrics.timed("parse_question")
+def parse_question(raw_text):
+    data = normalize_question(extract_json_object(raw_text))
+    return shuffle_answers(data)
+
+def _parse_keyless(raw_text):
+    """The parsed question, or the QuestionFormatError when only its answer key is missing."""
+    try:
+        return parse_question(raw_text)
+    except QuestionFormatError as e:
+        if e.fields != ["correct"]:
+            raise
+        return e
+
+def check_completion(raw_text):
+    # validate() hook for call_groq: a missing answer key is still usable, see recover_answer_key.
+    # What it parsed comes back from call_groq, so a completion is parsed (and timed) once
+    try:
+        return _parse_keyless(raw_text)
+    except QuestionFormatError:
+        metrics.inc("quiz_parse_failures_total", kind="rejected_completion")
+        raise
+
+def recover_answer_key(partial: dict) -> dict:
+    prompt = f"""
+Here is a multiple-choice exam question whose answer key is missing:
+{json.dumps({"question": partial["question"], "choices": partial["choices"]}, indent=2)}
+
+Return ONLY valid JSON in this schema: {{"correct": "B"}}
+'correct' must be A, B, C, or D and name the single best answer.
+"""
+    data = extract_json_object(call_groq(prompt))
+    return normalize_question(dict(partial, correct=data.get("correct")))
+
+def _recover_key(parsed) -> dict:
+    if not isinstance(parsed, QuestionFormatError):
+        return parsed
+    metrics.inc("quiz_parse_failures_total", kind="missing_answer_key")
+    # Only the answer key is unusable: ask for just that rather than a whole new question
+    return shuffle_answers(recover_answer_key(parsed.partial))
+
+# ---------- Second phase: explanation and rationales ----------
+_details_executor = ThreadPoolExecutor(max_workers=DETAILS_WORKERS, thread_name_prefix="details")
+# Stem id -> Future of the question's details, while its second phase is in flight
+_pending_details = {}
+# Stem id -> (monotonic finish time, Future) once it has finished, oldest first; under _pending_lock
+_finished_details = OrderedDict()
+_pending_lock = threading.Lock()
+
+def needs_details(qd: dict) -> bool:
+    return not qd.get("explanation")
+
+def _by_choice_text(choices: dict, rationales: dict) -> dict:
+    # Keyed by option text rather than letter, so the same details fit any later shuffle of the choices
+    return {text: rationales.get(L, "") for L, text in choices.items()}
+
+def join_details(qd: dict, details: dict) -> dict:
+    """Copy second-phase text onto qd under the letters its choices have now, and re-render it."""
+    qd["explanation"] = details["explanation"]
+    qd["rationales"] = {L: details["rationales"].get(text, "") for L, text in qd["choices"].items()}
+    return render_question(qd)
+
+def _finished(key: str):
+    """The finished Future for a stem id, if it succeeded or failed within DETAILS_RETRY_AFTER; under _pending_lock."""
+    finished_at, fut = _finished_details.get(key, (0.0, None))
+    if fut is not None and fut.exception() is not None and time.monotonic() - finished_at > DETAILS_RETRY_AFTER:
+        return None
+    return fut
+
+def _register_details(questions: list) -> list:
+    """(question, Future) for each question whose second phase isn't in flight, done, or recently failed."""
+    pending = []
+    with _pending_lock:
+        for qd in questions:
+            key = question_id(qd)
+            if key not in _pending_details and _finished(key) is None:
+                _pending_details[key] = Future()
+                pending.append((qd, _pending_details[key]))
+    return pending
+
+def _fetch_details(client_id: str, track_key: str, level: str, pending: list):
+    questions = [qd for qd, _ in pending]
+    try:
+        with client_scope(client_id):
+            raw_output = call_groq(generate_details_prompt(track_key, level, questions))
+        found = []
+        for obj_text in iter_json_objects([raw_output]):
+            try:
+                found.append(normalize_details(json.loads(obj_text)))
+            except ValueError:
+                found.append(None)
+        for (qd, fut), data in zip(pending, found):
+            if data is None:
+                continue
+            details = {"explanation": data["explanation"], "rationales": _by_choice_text(qd["choices"], data["rationales"])}
+            # qd is the object that was banked and pooled, so its letters are the banked ones
+            join_details(qd, details)
+            if not qd.get("duplicate_of"):
+                get_bank().update_details(qd["id"], qd["explanation"], qd["rationales"])
+            fut.set_result(details)
+            metrics.inc("quiz_details_total", result="ok")
+        for _, fut in pending:
+            if not fut.done():
+                fut.set_exception(ValueError("No usable explanation for this question"))
+                metrics.inc("quiz_details_total", result="missing")
+    except Exception as e:
+        for _, fut in pending:
+            if not fut.done():
+                fut.set_exception(e)
+                metrics.inc("quiz_details_total", result="error")
+    finally:
+        # Kept for later lookups of questions the bank doesn't hold, and so a failure isn't retried
+        # on every rerun of the page showing it
+        with _pending_lock:
+            for qd, fut in pending:
+                key = question_id(qd)
+                _pending_details.pop(key, None)
+                _finished_details.pop(key, None)
+                _finished_details[key] = (time.monotonic(), fut)
+            while len(_finished_details) > DETAILS_MEMORY:
+                _finished_details.popitem(last=False)
+
+def _submit_details(track_key: str, level: str, pending: list):
+    if pending:
+        # Runs under the caller's fair-queue slot, so a session's second phases count against it
+        _details_executor.submit(_fetch_details, current_client.get(), track_key, level, pending)
+
+def request_details(track_key: str, level: str, questions: list):
+    """Start the second phase for questions without an explanation; one completion covers the whole list."""
+    _submit_details(track_key, level, _register_details([qd for qd in questions if needs_details(qd)]))
+
+def _stored_details(qd: dict):
+    stored = get_bank().get(qd["id"]) if qd.get("id") else None
+    if stored and stored.get("question") == qd["question"] and not needs_details(stored):
+        return {"explanation": stored["explanation"],
+                "rationales": _by_choice_text(stored["choices"], stored.get("rationales") or {})}
+    return None
+
+def complete_questions(questions: list, track_key: str, level: str, timeout: float = DETAILS_TIMEOUT) -> list:
+    """complete_question for many questions under one deadline of `timeout` seconds in total.
+
+    Every missing second phase is looked up or requested first, then all of them are waited on
+    together; questions whose text hasn't arrived by the deadline are returned without it.
+    """
+    waiting, missing = [], []
+    for qd in questions:
+        if not needs_details(qd):
+            continue
+        with _pending_lock:
+            key = question_id(qd)
+            fut = _pending_details.get(key) or _finished(key)
+        if fut is not None:
+            # In flight, or finished: succeeded, or failed too recently to ask again
+            waiting.append((qd, fut))
+            continue
+        details = _stored_details(qd)
+        if details:
+            join_details(qd, details)
+        else:
+            missing.append(qd)
+    # Nothing in flight or stored (an earlier attempt failed a while ago): ask now
+    for k in range(0, len(missing), DETAILS_BATCH):
+        pending = _register_details(missing[k:k + DETAILS_BATCH])
+        _submit_details(track_key, level, pending)
+        waiting.extend(pending)
+    if any(not fut.done() for _, fut in waiting):
+        with metrics.span("details_wait"):
+            wait([fut for _, fut in waiting], timeout)
+    for qd, fut in waiting:
+        if fut.done() and fut.exception() is None:
+            join_details(qd, fut.result())
+    return questions
+
+def complete_question(qd: dict, track_key: str, level: str, timeout: float = DETAILS_TIMEOUT) -> dict:
+    """qd with its explanation and rationales joined on, waiting up to `timeout` for the second phase.
+
+    Returns qd unchanged if they don't arrive in time; the caller shows the question without them.
+    """
+    return complete_questions([qd], track_key, level, timeout)[0]
+
+def _watched(chunks, watcher):
+    for chunk in chunks:
+        if watcher is not None:
+            watcher.feed(chunk)
+        yield chunk
+
+def _bank_question(track_key: str, category: str, level: str, qd: dict) -> dict:
+    qd["category"] = category
+    qd["id"] = question_id(qd)
+    bank = get_bank()
+    index = get_shared_index(track_key, category, lambda: bank.stems(track_key, category))
+    duplicate_of = index.find_similar(qd["question"])
+    if duplicate_of is not None:
+        # A reworded copy of a banked question: it keeps its own id, so per-question stats don't merge
+        # two stems, and is linked to the original instead of banked. Learners' seen sets compare
+        # stems as well as ids, so whichever of the two they get first keeps them from the other
+        qd["duplicate_of"] = duplicate_of
+    else:
+        # Every validated question goes into the bank so later sessions can reuse it
+        bank.add(track_key, category, level, qd)
+        index.add(qd["id"], qd["question"])
+    # ...and into the in-memory pool, so sessions on the same selection get it without a bank query
+    render_question(qd)
+    get_pool().add(track_key, category, level, qd)
+    return qd
+
+def generate_question(track_key: str, topic: str, level: str, watcher: StemWatcher = None) -> dict:
+    category = pick_category(track_key, topic)
+    prompt = generate_prompt(track_key, category, level)
+    for attempt in range(PARSE_RETRIES + 1):
+        if watcher is not None:
+            # Stream so the caller can show the stem before the choices and rationales arrive
+            watcher.reset()
+            raw_output = "".join(_watched(stream_groq(prompt), watcher))
+        try:
+            if watcher is not None:
+                parsed = _parse_keyless(raw_output)
+            else:
+                # Hedged dispatch only accepts a completion that is usable, and returns it parsed;
+                # when no model's completion passes, the last rejection is raised here
+                parsed = call_groq(prompt, validate=check_completion)
+            qd = _recover_key(parsed)
+            break
+        except ValueError:
+            metrics.inc("quiz_parse_failures_total", kind="completion")
+            if attempt == PARSE_RETRIES:
+                raise
+    qd = _bank_question(track_key, category, level, qd)
+    request_details(track_key, level, [qd])
+    return qd
+
+@metrics.timed("parse_question", mode="batch")
+def _parse_batch_object(obj_text: str) -> list:
+    """Normalized questions in one streamed batch object, with None in place of unusable items.
+
+    An item missing only its answer key comes back as its QuestionFormatError, for _recover_key.
+    """
+    try:
+        data = json.loads(obj_text)
+    except ValueError:
+        data = repair_json(obj_text)
+    if not isinstance(data, dict):
+        metrics.inc("quiz_parse_failures_total", kind="batch_item")
+        return []
+    # Tolerate a wrapper object such as {"questions": [...]}
+    items = data.get("questions") if isinstance(data.get("questions"), list) else [data]
+    questions = []
+    for item in items:
+        try:
+            questions.append(normalize_question(item))
+        except QuestionFormatError as e:
+            if e.fields == ["correct"]:
+                questions.append(e)
+                continue
+            metrics.inc("quiz_parse_failures_total", kind="batch_item")
+            questions.append(None)
+    return questions
+
+def generate_question_batch(track_key: str, topic: str, level: str, count: int, watcher: StemWatcher = None,
+                            categories: list = None):
+    """Ask for `count` questions in one completion and yield each one as soon as it has streamed in.
+
+    Items that fail to parse or are missing fields are skipped; the rest of the batch is kept. An item
+    missing only its answer key gets one from a short follow-up call, as a single question does.
+    `categories` fixes the category of each item instead of picking from `topic`.
+    """
+    categories = categories or [pick_category(track_key, topic) for _ in range(count)]
+    prompt = generate_batch_prompt(track_key, categories, level)
+    produced = 0
+    # Items are registered as they are yielded and their explanations fetched in one call once the stream ends
+    pending = []
+    try:
+        for i, obj_text in enumerate(iter_json_objects(_watched(stream_groq(prompt), watcher))):
+            for j, qd in enumerate(_parse_batch_object(obj_text)):
+                if qd is None:
+                    continue
+                try:
+                    qd = _recover_key(qd)
+                except Exception:
+                    metrics.inc("quiz_parse_failures_total", kind="batch_item")
+                    continue
+                category = categories[min(i + j, len(categories) - 1)]
+                produced += 1
+                qd = _bank_question(track_key, category, level, shuffle_answers(qd))
+                if needs_details(qd):
+                    pending.extend(_register_details([qd]))
+                yield qd
+        if not produced:
+            raise ValueError("Batch generation returned no valid questions")
+    finally:
+        _submit_details(track_key, level, pending)
+
+def _take_unseen(source, track_key: str, topic: str, level: str, seen: SeenQuestions = None):
+    """A stored question from `source` (the bank or the pack) this learner hasn't seen, re-shuffled and rendered."""
+    category = pick_category(track_key, topic)
+    exclude = set(seen.ids) if seen is not None else set()
+    for _ in range(BANK_REPEAT_TRIES):
+        qd = source.take(track_key, category, level, exclude)
+        if qd is None or seen is None or not seen.has(qd):
+            break
+        exclude.add(qd["id"])
+    else:
+        return None
+    if qd is None:
+        return None
+    qd.setdefault("category", category)
+    # Re-shuffle so a reused question does not always keep the same letter order
+    return render_question(shuffle_answers(qd))
+
+def take_from_bank(track_key: str, topic: str, level: str, seen: SeenQuestions = None):
+    return _take_unseen(get_bank(), track_key, topic, level, seen)
+
+def take_from_pack(track_key: str, topic: str, level: str, seen: SeenQuestions = None):
+    """A vetted question from the prebuilt pack (see build_pack.py), or None without a pack or an unseen match."""
+    pack = get_pack()
+    if pack is None:
+        return None
+    return _take_unseen(pack, track_key, topic, level, seen)
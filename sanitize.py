@@ -0,0 +1,55 @@
+import re
+
+# Compiled once at import. Underscore pairs must be stripped before asterisk pairs
+# (overlapping markup like "*a_b* c_" depends on it), so those stay two passes.
+_UNDERSCORE_PAIR_RE = re.compile(r'_(.+?)_')
+_ASTERISK_PAIR_RE = re.compile(r'\*(.+?)\*')
+_INLINE_EMPHASIS_RE = re.compile(r'(?<=\w)[_*](?=\w)')
+_ANSWER_LEAK_RE = re.compile(
+    r'(?i)\bthe\s+correct\s+answer\s+is\s+[A-D]\b[:.\s-]*'
+    r'|\b(?:answer|option)\s+[A-D]\s+(?:is|was)\s+correct[:.\s-]*'
+)
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# html.escape(quote=False) plus MathJax-safe dollars, as one translate pass
+_INLINE_TABLE = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", "$": "&#36;"})
+_PLAIN_TABLE = str.maketrans({"$": "$\u200B"})
+
+
+def _strip_emphasis(s: str) -> str:
+    s = _UNDERSCORE_PAIR_RE.sub(r'\1', s)
+    s = _ASTERISK_PAIR_RE.sub(r'\1', s)
+    return _INLINE_EMPHASIS_RE.sub(' ', s)
+
+def safe_inline(text: str) -> str:
+    return _strip_emphasis(str(text)).translate(_INLINE_TABLE)
+
+def safe_plain(text: str) -> str:
+    return _strip_emphasis(str(text)).translate(_PLAIN_TABLE)
+
+def sanitize_explanation(raw_text: str) -> str:
+    if not isinstance(raw_text, str):
+        raw_text = str(raw_text)
+    txt = _ANSWER_LEAK_RE.sub('', raw_text)
+    return _WHITESPACE_RE.sub(' ', txt).strip()
+
+def render_question(qd: dict) -> dict:
+    """Sanitize every displayed field once and keep the result on the question as qd["rendered"].
+
+    Must run after shuffle_answers, since the rendered choices and rationales are keyed by letter.
+    """
+    choices = qd.get("choices", {}) or {}
+    rationales = qd.get("rationales", {}) or {}
+    qd["rendered"] = {
+        "question": safe_inline(qd.get("question", "")),
+        "choices": {L: safe_inline(txt) for L, txt in choices.items()},
+        "labels": {L: safe_plain(txt) for L, txt in choices.items()},
+        "explanation": safe_inline(sanitize_explanation(qd.get("explanation", ""))),
+        "rationales": {L: safe_inline(sanitize_explanation(rationales.get(L, ""))) for L in choices},
+    }
+    return qd
+
+def rendered(qd: dict) -> dict:
+    if "rendered" not in qd:
+        render_question(qd)
+    return qd["rendered"]
@@ -0,0 +1,135 @@
+import os
+import random
+
+from quiz_engine import get_track_config
+
+# Difficulty option that hands the level choice to the scheduler
+ADAPTIVE = "Adaptive"
+LEVELS = ("Easy", "Moderate", "Hard")
+
+# Correct answers slower than this only count as half-learned
+SLOW_ANSWER_SEC = float(os.getenv("ADAPTIVE_SLOW_ANSWER_SEC", "90"))
+# How much a long-unpractised category is pulled forward, relative to weakness (spaced repetition)
+SPACING_WEIGHT = float(os.getenv("ADAPTIVE_SPACING_WEIGHT", "0.3"))
+# Questions after which a category counts as fully "due" again
+SPACING_HORIZON = 10
+
+# Evidence weight of (a correct answer, a wrong answer) at each level: getting an Easy question
+# right says less about mastery than a Hard one, and missing a Hard one says less than missing an Easy one
+EVIDENCE = {"Easy": (0.6, 1.0), "Moderate": (1.0, 1.0), "Hard": (1.0, 0.6)}
+
+
+class CategoryState:
+    """Beta(alpha, beta) posterior on answering this category correctly, plus when it was last practised."""
+
+    __slots__ = ("alpha", "beta", "last_step")
+
+    def __init__(self):
+        self.alpha = 1.0
+        self.beta = 1.0
+        self.last_step = None
+
+    @property
+    def mastery(self) -> float:
+        return self.alpha / (self.alpha + self.beta)
+
+    @property
+    def answers(self) -> float:
+        return self.alpha + self.beta - 2.0
+
+
+class AdaptiveScheduler:
+    """Per-session Thompson-sampling scheduler over a track's categories.
+
+    Picks the category whose sampled mastery is lowest, nudged toward ones not practised recently,
+    and a difficulty matched to the estimated mastery. Each answer is an O(1) update.
+    """
+
+    def __init__(self, rng: random.Random = None):
+        self.rng = rng or random.Random()
+        self.states = {}
+        self.step = 0
+        # Next blank-topic category per track, sampled ahead of time so predict() can report the real next pick
+        self.upcoming = {}
+
+    def _state(self, track_key: str, category: str) -> CategoryState:
+        key = (track_key, category.strip().lower())
+        state = self.states.get(key)
+        if state is None:
+            state = self.states[key] = CategoryState()
+        return state
+
+    def observe(self, track_key: str, category: str, level: str, is_correct: bool, time_sec=None):
+        credit = 0.0
+        if is_correct:
+            credit = 1.0 if time_sec is None or time_sec <= SLOW_ANSWER_SEC else 0.5
+        w_right, w_wrong = EVIDENCE.get(level, (1.0, 1.0))
+        state = self._state(track_key, category)
+        state.alpha += w_right * credit
+        state.beta += w_wrong * (1.0 - credit)
+        self.step += 1
+        state.last_step = self.step
+        # A pick sampled before this answer doesn't reflect it; the next one is drawn afresh
+        self.upcoming.pop(track_key, None)
+
+    def _priority(self, state: CategoryState, mastery: float) -> float:
+        if state.last_step is None:
+            due = 1.0
+        else:
+            due = min(1.0, (self.step - state.last_step) / SPACING_HORIZON)
+        return (1.0 - mastery) + SPACING_WEIGHT * due
+
+    def _sampled_priority(self, track_key: str, category: str) -> float:
+        state = self._state(track_key, category)
+        return self._priority(state, self.rng.betavariate(state.alpha, state.beta))
+
+    def _expected_priority(self, track_key: str, category: str) -> float:
+        state = self._state(track_key, category)
+        return self._priority(state, state.mastery)
+
+    def level_for(self, track_key: str, category: str) -> str:
+        state = self._state(track_key, category)
+        if state.answers < 2:
+            return "Moderate"
+        if state.mastery < 0.5:
+            return "Easy"
+        if state.mastery < 0.8:
+            return "Moderate"
+        return "Hard"
+
+    def _sample_category(self, track_key: str) -> str:
+        categories = get_track_config(track_key)["default_categories"]
+        # Thompson sampling: unexplored and uncertain categories get their turn without a separate rule
+        return max(categories, key=lambda c: self._sampled_priority(track_key, c))
+
+    def _upcoming(self, track_key: str) -> str:
+        category = self.upcoming.get(track_key)
+        if category is None:
+            category = self.upcoming[track_key] = self._sample_category(track_key)
+        return category
+
+    def next_pick(self, track_key: str, topic: str = "", level: str = None) -> tuple:
+        """(category, level) for the next question; a typed topic or fixed level is kept as given."""
+        if topic and topic.strip():
+            category = topic.strip()
+        else:
+            # The sample predict() already reported, if any, so pre-warmed work is for this pick
+            category = self._upcoming(track_key)
+            del self.upcoming[track_key]
+        return category, level or self.level_for(track_key, category)
+
+    def predict(self, track_key: str, topic: str = "", level: str = None, k: int = 2) -> list:
+        """The next pick, then the likeliest others by posterior mean; used to pre-warm generation.
+
+        The next pick is sampled now and kept, so next_pick() returns the same category.
+        """
+        if topic and topic.strip():
+            categories = [topic.strip()]
+        else:
+            upcoming = self._upcoming(track_key)
+            others = sorted(
+                (c for c in get_track_config(track_key)["default_categories"] if c != upcoming),
+                key=lambda c: self._expected_priority(track_key, c), reverse=True
+            )
+            categories = [upcoming, *others][:k]
+        return [(c, level or self.level_for(track_key, c)) for c in categories]